@@ -0,0 +1,72 @@
+"""Архив старых заданий: в горячей таблице tasks остаются последние TASK_ARCHIVE_AFTER_DAYS дней.
+
+Архиватор переносит задания с task_date раньше порога в tasks_archive пачками
+по id: INSERT ... SELECT и DELETE одних и тех же строк в одной транзакции,
+поэтому прерванный перенос безопасно продолжить. /today, выполнение заданий и
+первые страницы истории читают только горячую таблицу; история после неё
+дочитывает архив, выгрузки и счётчики админки видят обе таблицы. Прогресс
+берётся из дневных срезов, поэтому перенос работает только при
+PROGRESS_ROLLUP_ENABLED — иначе итоги потеряли бы архивные задания.
+"""
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import delete, insert, select, union_all
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import Task, TaskArchive
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["id", "exercise_id", "custom_text", "sent_at", "task_date", "status", "user_id"]
+
+
+def _columns(model):
+    return [getattr(model, name).label(name) for name in COLUMNS]
+
+
+def all_tasks(where: Optional[Callable] = None):
+    """Горячие и архивные задания одним подзапросом; where(model) — условия, применяемые к каждой таблице."""
+    parts = []
+    for model in (Task, TaskArchive):
+        query = select(*_columns(model))
+        if where is not None:
+            query = query.where(*where(model))
+        parts.append(query)
+    return union_all(*parts).subquery("all_tasks")
+
+
+def archive_cutoff(now: Optional[datetime] = None) -> date:
+    return (now or datetime.now(timezone.utc)).date() - timedelta(days=settings.task_archive_after_days)
+
+
+def archive_tasks(db: Session, before: date, batch_size: Optional[int] = None) -> int:
+    """Переносит задания с task_date < before в tasks_archive; возвращает число перенесённых."""
+    batch_size = batch_size or settings.task_archive_batch_size
+    moved = 0
+    while True:
+        # старые строки — с наименьшими id, поэтому обход по первичному ключу находит их сразу
+        ids = db.scalars(select(Task.id).where(Task.task_date < before).order_by(Task.id).limit(batch_size)).all()
+        if not ids:
+            return moved
+        db.execute(
+            insert(TaskArchive).from_select(
+                [getattr(TaskArchive, name) for name in COLUMNS], select(*_columns(Task)).where(Task.id.in_(ids))
+            )
+        )
+        db.execute(delete(Task).where(Task.id.in_(ids)), execution_options={"synchronize_session": False})
+        db.commit()
+        moved += len(ids)
+        logger.info("archived %s tasks (task_date < %s)", moved, before)
+
+
+def archive_old_tasks(db: Session) -> int:
+    """Плановый перенос по настройкам; без дневных срезов прогресса ничего не делает."""
+    if settings.task_archive_after_days <= 0:
+        return 0
+    if not settings.progress_rollup_enabled:
+        logger.warning("TASK_ARCHIVE_AFTER_DAYS requires PROGRESS_ROLLUP_ENABLED, archiving skipped")
+        return 0
+    return archive_tasks(db, archive_cutoff())
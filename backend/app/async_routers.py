@@ -0,0 +1,68 @@
+"""Асинхронные версии пользовательских маршрутов (DB_ASYNC_MODE).
+
+Подключаются раньше основного роутера и перекрывают его маршруты с теми же
+путями; остальные эндпоинты продолжают работать через синхронный router.
+"""
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import get_async_db
+from . import http_cache, schemas
+from .user_cache import CachedUser
+from .security import get_current_user_async
+from .pagination import NEXT_CURSOR_HEADER, decode_task_cursor
+from .delivery import local_today
+from .progress import utc_day
+from .query_budget import query_budget
+from .routers import PROGRESS, TASK, TASKS, page_limit
+from . import async_services as services
+
+router = APIRouter(prefix="/api")
+
+
+@router.get("/tasks/today", response_model=schemas.TaskResponse)
+@query_budget(8)
+async def get_today(request: Request, user: CachedUser = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    key = ("today", user.id, await services.get_tasks_version(db, user.id), local_today(user.timezone))
+    etag, cached = http_cache.lookup(request, key)
+    if cached:
+        return cached
+    return http_cache.store(key, etag, TASK, await services.get_or_create_today_task(db, user))
+
+
+@router.get("/tasks", response_model=list[schemas.TaskResponse])
+@query_budget(4)
+async def list_tasks(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = Depends(page_limit),
+    user: CachedUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    key = ("tasks", user.id, await services.get_tasks_version(db, user.id), limit, cursor)
+    etag, cached = http_cache.lookup(request, key)
+    if cached:
+        return cached
+    tasks, next_cursor = await services.list_tasks_page(db, user.id, limit, decode_task_cursor(cursor))
+    return http_cache.store(key, etag, TASKS, tasks, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+
+
+@router.post("/tasks/complete/{task_id}", response_model=schemas.CompleteTaskResponse)
+@query_budget(4)
+async def complete_task(task_id: int, user: CachedUser = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    task = await services.mark_task_completed(db, user.id, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return {"success": True, "task": task}
+
+
+@router.get("/progress", response_model=schemas.ProgressResponse)
+@query_budget(3)
+async def progress(request: Request, user: CachedUser = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    key = ("progress", user.id, await services.get_tasks_version(db, user.id), utc_day(datetime.now(timezone.utc)))
+    etag, cached = http_cache.lookup(request, key)
+    if cached:
+        return cached
+    return http_cache.store(key, etag, PROGRESS, await services.get_progress(db, user.id))
@@ -0,0 +1,111 @@
+"""Асинхронные версии функций services.py, нужных async-маршрутам (режим DB_ASYNC_MODE).
+
+Запросы и правила те же, что в синхронном модуле; работа с каталогом
+упражнений (включая подгрузку текстов заданий) и дневными срезами прогресса
+переиспользуется через run_sync.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .database import dialect_insert
+from .delivery import local_today
+from .metrics import TASKS_GENERATED, count
+from .models import User, Task, TaskArchive, TaskStatus
+from .progress import bump_rollup, progress_result, rollup_progress_query, tasks_progress_query, utc_day
+from .exercises_store import catalog, load_exercises
+from .services import DEFAULT_TASKS, advance_exercise_cursor, bump_tasks_version, task_content, task_history_query, task_page
+
+
+async def get_today_task(db: AsyncSession, user) -> Optional[Task]:
+    today = local_today(user.timezone)
+    task = (await db.scalars(select(Task).where(Task.user_id == user.id, Task.task_date == today))).first()
+    if task:
+        await db.run_sync(catalog.resolve, [task])
+    return task
+
+
+async def get_or_create_today_task(db: AsyncSession, user, text: Optional[str] = None) -> Task:
+    task = await get_today_task(db, user)
+    if task:
+        return task
+    user_id = user.id
+    cursor = await db.scalar(advance_exercise_cursor(user_id))
+    if text:
+        exercise = text
+    else:
+        exercises = await db.run_sync(load_exercises) or DEFAULT_TASKS
+        exercise = exercises[(cursor - 1) % len(exercises)]
+    now = datetime.now(timezone.utc)
+    task = (await db.scalars(
+        dialect_insert(db, Task)
+        .values(
+            user_id=user_id, sent_at=now, task_date=local_today(user.timezone, now), status=TaskStatus.pending.value,
+            **task_content(exercise),
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "task_date"])
+        .returning(Task)
+    )).first()
+    if task is None:
+        await db.rollback()
+        return await get_today_task(db, user)
+    if settings.progress_rollup_enabled:
+        await db.run_sync(bump_rollup, [(user_id, now.date(), 1, 0)])
+    await db.commit()
+    count(TASKS_GENERATED, "on_demand")
+    return task
+
+
+async def create_daily_task(db: AsyncSession, user: User, text: Optional[str] = None) -> Task:
+    return await get_or_create_today_task(db, user, text)
+
+
+async def mark_task_completed(db: AsyncSession, user_id: int, task_id: int) -> Optional[Task]:
+    task = (await db.execute(select(Task).where(Task.id == task_id, Task.user_id == user_id))).scalar_one_or_none()
+    if not task:
+        return None
+    if task.status != TaskStatus.completed.value:
+        result = await db.execute(
+            update(Task)
+            .where(Task.id == task.id, Task.status != TaskStatus.completed.value)
+            .values(status=TaskStatus.completed.value)
+        )
+        if result.rowcount:
+            await db.execute(bump_tasks_version([user_id]))
+            if settings.progress_rollup_enabled:
+                await db.run_sync(bump_rollup, [(user_id, utc_day(task.sent_at), 0, 1)])
+        await db.commit()
+        await db.refresh(task)
+    await db.run_sync(catalog.resolve, [task])
+    return task
+
+
+async def get_tasks_version(db: AsyncSession, user_id: int) -> int:
+    return await db.scalar(select(User.tasks_version).where(User.id == user_id)) or 0
+
+
+async def get_progress(db: AsyncSession, user_id: int):
+    if settings.progress_rollup_enabled:
+        query = rollup_progress_query(user_id)
+    else:
+        query = tasks_progress_query(user_id)
+    return progress_result((await db.execute(query)).one())
+
+
+async def list_tasks_for_user(db: AsyncSession, user_id: int, limit: Optional[int] = None, cursor=None):
+    tasks = list(await db.scalars(task_history_query(user_id, limit, cursor)))
+    if limit is None or len(tasks) < limit:
+        tasks += await db.scalars(task_history_query(user_id, limit and limit - len(tasks), cursor, TaskArchive))
+    await db.run_sync(catalog.resolve, tasks)
+    return tasks
+
+
+async def list_tasks_page(db: AsyncSession, user_id: int, limit: int, cursor=None):
+    tasks = list(await db.scalars(task_history_query(user_id, limit + 1, cursor)))
+    if len(tasks) <= limit:
+        tasks += await db.scalars(task_history_query(user_id, limit + 1 - len(tasks), cursor, TaskArchive))
+    await db.run_sync(catalog.resolve, tasks)
+    return task_page(tasks, limit)
\ No newline at end of file
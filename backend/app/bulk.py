@@ -0,0 +1,157 @@
+"""Массовые операции админки: выдать задания, назначить свой текст, отметить выполненными.
+
+Работа идёт пачками по bulk_chunk_size: каждая пачка — несколько set-based
+запросов и свой commit, поэтому транзакции короткие и не держат блокировки на
+всю выборку. Прогресс пишется в bulk_jobs после каждой пачки. Небольшие
+выборки выполняются прямо в запросе, большие — фоном, а клиент опрашивает
+задание по id.
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, or_, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .delivery import local_today
+from .exercises_store import load_exercises
+from .models import BulkJob, BulkJobStatus, Task, TaskStatus, User
+from .progress import bump_rollup, utc_day
+from .scheduler import DAILY_MESSAGE_TEMPLATE
+from .schemas import UserSelection
+from .services import DEFAULT_TASKS, bump_tasks_version, create_daily_tasks_bulk, user_filters
+
+logger = logging.getLogger(__name__)
+
+# Шаг работы: сколько объектов пройдено и сколько из них изменено
+Work = Callable[[Session], Iterator[Tuple[int, int]]]
+
+
+def _selection_filters(db: Session, selection: UserSelection) -> list:
+    return user_filters(
+        db, selection.role, selection.telegram_linked, selection.created_from, selection.created_to, selection.q
+    )
+
+
+def count_selected(db: Session, selection: UserSelection) -> int:
+    query = select(func.count(User.id)).where(*_selection_filters(db, selection))
+    if selection.user_ids is not None:
+        query = query.where(User.id.in_(set(selection.user_ids)))
+    return db.scalar(query)
+
+
+def _user_chunks(db: Session, selection: UserSelection, chunk_size: int) -> Iterator[list]:
+    """Пачки лёгких строк пользователей: keyset по id, для явного списка — по его отсортированным кускам."""
+    columns = select(User.id, User.telegram_id, User.exercise_cursor, User.timezone).where(
+        *_selection_filters(db, selection)
+    )
+    if selection.user_ids is not None:
+        ids = sorted(set(selection.user_ids))
+        for start in range(0, len(ids), chunk_size):
+            yield db.execute(columns.where(User.id.in_(ids[start:start + chunk_size])).order_by(User.id)).all()
+        return
+    last_id = 0
+    while True:
+        users = db.execute(columns.where(User.id > last_id).order_by(User.id).limit(chunk_size)).all()
+        if not users:
+            return
+        yield users
+        last_id = users[-1].id
+
+
+def generate_today_work(selection: UserSelection, notify: bool, text: Optional[str] = None,
+                        replace_pending: bool = False) -> Work:
+    """Сегодняшние задания выбранным пользователям; с text — у всех этот текст вместо упражнения из ротации."""
+    template = DAILY_MESSAGE_TEMPLATE if notify and settings.telegram_bot_token else None
+
+    def work(db: Session) -> Iterator[Tuple[int, int]]:
+        exercises = [text] if text else (load_exercises(db) or DEFAULT_TASKS)
+        for users in _user_chunks(db, selection, settings.bulk_chunk_size):
+            created = create_daily_tasks_bulk(db, users, exercises, template, source="bulk")
+            affected = len(created)
+            if text and replace_pending:
+                affected += _replace_pending_text(db, users, {u.id for u, _ in created}, text)
+            yield len(users), affected
+
+    return work
+
+
+def _replace_pending_text(db: Session, users: list, skip: set, text: str) -> int:
+    now = datetime.now(timezone.utc)
+    keys = [(u.id, local_today(u.timezone, now)) for u in users if u.id not in skip]
+    if not keys:
+        return 0
+    changed = db.scalars(
+        update(Task)
+        .where(
+            tuple_(Task.user_id, Task.task_date).in_(keys),
+            Task.status == TaskStatus.pending.value,
+            or_(Task.custom_text.is_(None), Task.custom_text != text),
+        )
+        .values(custom_text=text, exercise_id=None)
+        .returning(Task.user_id),
+        execution_options={"synchronize_session": False},
+    ).all()
+    if changed:
+        db.execute(bump_tasks_version(set(changed)))
+    db.commit()
+    return len(changed)
+
+
+def complete_tasks_work(task_ids: List[int]) -> Work:
+    def work(db: Session) -> Iterator[Tuple[int, int]]:
+        ids = sorted(set(task_ids))
+        for start in range(0, len(ids), settings.bulk_chunk_size):
+            chunk = ids[start:start + settings.bulk_chunk_size]
+            # условный UPDATE: уже выполненные не трогаем и не считаем в срезах второй раз
+            done = db.execute(
+                update(Task)
+                .where(Task.id.in_(chunk), Task.status != TaskStatus.completed.value)
+                .values(status=TaskStatus.completed.value)
+                .returning(Task.user_id, Task.sent_at),
+                execution_options={"synchronize_session": False},
+            ).all()
+            if done:
+                db.execute(bump_tasks_version({row.user_id for row in done}))
+                if settings.progress_rollup_enabled:
+                    per_day = Counter((row.user_id, utc_day(row.sent_at)) for row in done)
+                    bump_rollup(db, [(user_id, day, 0, n) for (user_id, day), n in per_day.items()])
+            db.commit()
+            yield len(chunk), len(done)
+
+    return work
+
+
+def create_job(db: Session, kind: str, total: int, created_by: Optional[int] = None) -> BulkJob:
+    job = BulkJob(kind=kind, total=total, created_by=created_by, status=BulkJobStatus.pending.value)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def _set_job(db: Session, job_id: int, **values) -> None:
+    db.execute(update(BulkJob).where(BulkJob.id == job_id).values(**values))
+    db.commit()
+
+
+def run_job(session_factory: Callable[[], Session], job_id: int, work: Work) -> None:
+    """Выполняет работу в своей сессии, обновляя прогресс задания после каждой пачки."""
+    with session_factory() as db:
+        _set_job(db, job_id, status=BulkJobStatus.running.value)
+        try:
+            for processed, affected in work(db):
+                _set_job(
+                    db, job_id, processed=BulkJob.processed + processed, affected=BulkJob.affected + affected
+                )
+        except Exception as e:
+            logger.exception("bulk job %s failed", job_id)
+            db.rollback()
+            _set_job(
+                db, job_id, status=BulkJobStatus.failed.value, error=f"{type(e).__name__}: {e}"[:512],
+                finished_at=datetime.now(timezone.utc),
+            )
+            return
+        _set_job(db, job_id, status=BulkJobStatus.done.value, finished_at=datetime.now(timezone.utc))
@@ -9,9 +9,56 @@ class Settings(BaseSettings):
     admin_email: str = Field(alias="ADMIN_EMAIL")
     admin_password: str = Field(alias="ADMIN_PASSWORD")
     telegram_bot_token: str | None = Field(default=None, alias="TELEGRAM_BOT_TOKEN")
+    # час доставки и пояс по умолчанию для новых пользователей; у каждого их можно поменять
     bot_daily_hour: int = Field(default=9, alias="BOT_DAILY_HOUR")
+    default_timezone: str = Field(default="Europe/Moscow", alias="DEFAULT_TIMEZONE")
     next_public_api_url: str | None = Field(default=None, alias="NEXT_PUBLIC_API_URL")
     bot_internal_token: str | None = Field(default=None, alias="BOT_INTERNAL_TOKEN")
+    bot_update_retention_hours: float = Field(default=24.0, alias="BOT_UPDATE_RETENTION_HOURS")
+    bcrypt_rounds: int = Field(default=12, alias="BCRYPT_ROUNDS")
+    password_pool_workers: int = Field(default=2, alias="PASSWORD_POOL_WORKERS")
+    password_pool_max_pending: int = Field(default=32, alias="PASSWORD_POOL_MAX_PENDING")
+    user_cache_size: int = Field(default=10000, alias="USER_CACHE_SIZE")
+    user_cache_ttl_seconds: float = Field(default=60.0, alias="USER_CACHE_TTL_SECONDS")
+    exercise_catalog_check_seconds: float = Field(default=5.0, alias="EXERCISE_CATALOG_CHECK_SECONDS")
+    progress_rollup_enabled: bool = Field(default=False, alias="PROGRESS_ROLLUP_ENABLED")
+    db_async_mode: bool = Field(default=False, alias="DB_ASYNC_MODE")
+    db_pool_size: int = Field(default=5, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(default=10, alias="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(default=30.0, alias="DB_POOL_TIMEOUT")
+    db_pool_recycle: int = Field(default=1800, alias="DB_POOL_RECYCLE")
+    # сколько соединений пула открыть на старте воркера, чтобы первые запросы не ждали подключения
+    db_pool_warmup: int = Field(default=0, alias="DB_POOL_WARMUP")
+    # false — схему, админа и каталог создаёт разовый `python -m app.manage init-db`, а не каждый воркер
+    db_init_on_startup: bool = Field(default=True, alias="DB_INIT_ON_STARTUP")
+    metrics_enabled: bool = Field(default=True, alias="METRICS_ENABLED")
+    # бюджет SQL-запросов на маршрут (app/query_budget.py): off | warn | raise; explain — планы на Postgres
+    query_budget_mode: str = Field(default="off", alias="QUERY_BUDGET_MODE")
+    query_budget_explain: bool = Field(default=False, alias="QUERY_BUDGET_EXPLAIN")
+    # сколько сериализованных ответов GET держать в памяти процесса (0 — только ETag/304)
+    response_cache_size: int = Field(default=10000, alias="RESPONSE_CACHE_SIZE")
+    history_page_size: int = Field(default=100, alias="HISTORY_PAGE_SIZE")
+    history_max_page_size: int = Field(default=500, alias="HISTORY_MAX_PAGE_SIZE")
+    # массовые операции админки: до bulk_inline_limit объектов — прямо в запросе, больше — фоновым заданием
+    bulk_chunk_size: int = Field(default=1000, alias="BULK_CHUNK_SIZE")
+    bulk_inline_limit: int = Field(default=1000, alias="BULK_INLINE_LIMIT")
+    # задания старше стольких дней архиватор переносит в tasks_archive (0 — не переносить; нужен PROGRESS_ROLLUP_ENABLED)
+    task_archive_after_days: int = Field(default=0, alias="TASK_ARCHIVE_AFTER_DAYS")
+    task_archive_batch_size: int = Field(default=5000, alias="TASK_ARCHIVE_BATCH_SIZE")
+    scheduler_batch_size: int = Field(default=1000, alias="SCHEDULER_BATCH_SIZE")
+    # leader — разовые задачи выполняет держатель аренды в БД, рассылка делится на шарды между процессами;
+    # local — всё в каждом процессе (один воркер); off — планировщик в этом процессе не запускается
+    scheduler_mode: str = Field(default="leader", alias="SCHEDULER_MODE")
+    scheduler_shards: int = Field(default=4, alias="SCHEDULER_SHARDS")
+    scheduler_lease_seconds: float = Field(default=120.0, alias="SCHEDULER_LEASE_SECONDS")
+    telegram_send_concurrency: int = Field(default=20, alias="TELEGRAM_SEND_CONCURRENCY")
+    telegram_api_url: str = Field(default="https://api.telegram.org", alias="TELEGRAM_API_URL")
+    # Лимиты Telegram: ~30 сообщений/с на бота и 1 сообщение/с в один чат
+    telegram_global_rate: float = Field(default=30.0, alias="TELEGRAM_GLOBAL_RATE")
+    telegram_per_chat_rate: float = Field(default=1.0, alias="TELEGRAM_PER_CHAT_RATE")
+    telegram_max_attempts: int = Field(default=8, alias="TELEGRAM_MAX_ATTEMPTS")
+    telegram_retry_base_seconds: float = Field(default=1.0, alias="TELEGRAM_RETRY_BASE_SECONDS")
+    telegram_drain_linger_seconds: float = Field(default=30.0, alias="TELEGRAM_DRAIN_LINGER_SECONDS")
 
     class Config:
         env_file = ".env"
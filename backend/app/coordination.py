@@ -0,0 +1,176 @@
+"""Координация планировщика между процессами через БД.
+
+Лидерство — строка в scheduler_leases: роль получает тот, у кого аренда истекла
+или кто уже её держит (один INSERT ... ON CONFLICT DO UPDATE ... WHERE, одинаково
+в Postgres и SQLite). Большие задачи делятся на шарды по диапазонам users.id;
+шард забирается условным UPDATE, а после каждой пачки сохраняется last_user_id,
+поэтому упавший процесс теряет аренду, и другой продолжает с места остановки.
+"""
+import math
+import os
+import socket
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from .database import dialect_insert
+from .models import SchedulerLease, SchedulerRun, SchedulerShard, User
+
+# Идентификатор процесса-владельца аренды: хост, pid и случайный хвост на случай переиспользования pid
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def acquire_lease(db: Session, name: str, holder: str, seconds: float) -> bool:
+    """Берёт или продлевает аренду name; False — её держит другой живой процесс."""
+    now = _now()
+    stmt = dialect_insert(db, SchedulerLease).values(name=name, holder=holder, expires_at=now + timedelta(seconds=seconds))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"holder": stmt.excluded.holder, "expires_at": stmt.excluded.expires_at},
+        where=or_(SchedulerLease.holder == holder, SchedulerLease.expires_at < now),
+    ).returning(SchedulerLease.holder)
+    acquired = db.execute(stmt).first() is not None
+    db.commit()
+    return acquired
+
+
+def release_lease(db: Session, name: str, holder: str) -> None:
+    db.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == name, SchedulerLease.holder == holder)
+        .values(expires_at=_now())
+    )
+    db.commit()
+
+
+@dataclass
+class ShardClaim:
+    run_key: str
+    shard: int
+    last_user_id: int
+    end_id: Optional[int]
+
+
+class ShardedRun:
+    """Запуск, разбитый на шарды по users.id; обрабатывать его могут несколько процессов сразу."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        run_key: str,
+        shards: int,
+        lease_seconds: float,
+        holder: str = PROCESS_ID,
+    ):
+        self.session_factory = session_factory
+        self.run_key = run_key
+        self.shards = max(1, shards)
+        self.lease_seconds = lease_seconds
+        self.holder = holder
+
+    def plan(self) -> None:
+        """Создаёт запуск и его шарды; первый пришедший процесс фиксирует разбиение, остальные его переиспользуют."""
+        with self.session_factory() as db:
+            max_id = db.scalar(select(func.max(User.id))) or 0
+            db.execute(
+                dialect_insert(db, SchedulerRun)
+                .values(run_key=self.run_key, shards=self.shards, max_user_id=max_id)
+                .on_conflict_do_nothing(index_elements=["run_key"])
+            )
+            run = db.execute(
+                select(SchedulerRun.shards, SchedulerRun.max_user_id).where(SchedulerRun.run_key == self.run_key)
+            ).one()
+            step = max(1, math.ceil(run.max_user_id / run.shards))
+            rows = []
+            for shard in range(run.shards):
+                start_id = shard * step
+                end_id = None if shard == run.shards - 1 else start_id + step
+                rows.append({
+                    "run_key": self.run_key, "shard": shard, "start_id": start_id, "end_id": end_id,
+                    "last_user_id": start_id, "done": False,
+                })
+            db.execute(
+                dialect_insert(db, SchedulerShard).values(rows).on_conflict_do_nothing(index_elements=["run_key", "shard"])
+            )
+            db.commit()
+
+    def exists(self) -> bool:
+        with self.session_factory() as db:
+            return db.get(SchedulerRun, self.run_key) is not None
+
+    def claim(self) -> Optional[ShardClaim]:
+        """Забирает свободный шард (без владельца или с истёкшей арендой); None — работы не осталось."""
+        with self.session_factory() as db:
+            now = _now()
+            free = or_(SchedulerShard.owner.is_(None), SchedulerShard.lease_expires_at < now)
+            candidates = db.scalars(
+                select(SchedulerShard.shard)
+                .where(SchedulerShard.run_key == self.run_key, SchedulerShard.done.is_(False), free)
+                .order_by(SchedulerShard.shard)
+            ).all()
+            for shard in candidates:
+                result = db.execute(
+                    update(SchedulerShard)
+                    .where(
+                        SchedulerShard.run_key == self.run_key,
+                        SchedulerShard.shard == shard,
+                        SchedulerShard.done.is_(False),
+                        free,
+                    )
+                    .values(owner=self.holder, lease_expires_at=now + timedelta(seconds=self.lease_seconds))
+                )
+                db.commit()
+                if result.rowcount:
+                    row = db.get(SchedulerShard, (self.run_key, shard))
+                    return ShardClaim(self.run_key, shard, row.last_user_id, row.end_id)
+        return None
+
+    def _update_owned(self, db: Session, claim: ShardClaim, **values) -> bool:
+        result = db.execute(
+            update(SchedulerShard)
+            .where(
+                SchedulerShard.run_key == claim.run_key,
+                SchedulerShard.shard == claim.shard,
+                SchedulerShard.owner == self.holder,
+            )
+            .values(**values)
+        )
+        db.commit()
+        return bool(result.rowcount)
+
+    def checkpoint(self, db: Session, claim: ShardClaim, last_user_id: int) -> bool:
+        """Сохраняет прогресс и продлевает аренду; False — шард уже перехватил другой процесс."""
+        claim.last_user_id = last_user_id
+        return self._update_owned(
+            db, claim, last_user_id=last_user_id, lease_expires_at=_now() + timedelta(seconds=self.lease_seconds)
+        )
+
+    def finish(self, claim: ShardClaim) -> None:
+        with self.session_factory() as db:
+            self._update_owned(db, claim, done=True, owner=None, lease_expires_at=None)
+
+    def pending(self) -> int:
+        with self.session_factory() as db:
+            return db.scalar(
+                select(func.count())
+                .select_from(SchedulerShard)
+                .where(SchedulerShard.run_key == self.run_key, SchedulerShard.done.is_(False))
+            )
+
+
+def prune_runs(db: Session, prefix: str, older_than: datetime) -> int:
+    """Удаляет запуски с run_key на prefix, созданные раньше older_than, вместе с их шардами."""
+    keys = select(SchedulerRun.run_key).where(SchedulerRun.run_key.startswith(prefix), SchedulerRun.created_at < older_than)
+    # шарды удаляем явно: SQLite без PRAGMA foreign_keys не выполняет ON DELETE CASCADE
+    db.execute(delete(SchedulerShard).where(SchedulerShard.run_key.in_(keys)))
+    result = db.execute(delete(SchedulerRun).where(SchedulerRun.run_key.in_(keys)))
+    db.commit()
+    return result.rowcount
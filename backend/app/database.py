@@ -1,5 +1,7 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
 from .config import settings
 
 
@@ -7,9 +9,62 @@ class Base(DeclarativeBase):
     pass
 
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def pool_options(url: str) -> dict:
+    """Настройки пула из конфига; у SQLite свой пул, размер ему не задаём."""
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+
+
+def async_database_url(url: str) -> str:
+    """postgresql+psycopg2://... -> postgresql+asyncpg://..., sqlite -> sqlite+aiosqlite."""
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS[parsed.get_backend_name()]).render_as_string(hide_password=False)
+
+
+engine = create_engine(settings.database_url, pool_pre_ping=True, **pool_options(settings.database_url))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронный движок создаётся только в режиме DB_ASYNC_MODE
+async_engine = None
+AsyncSessionLocal: async_sessionmaker[AsyncSession] | None = None
+if settings.db_async_mode:
+    async_engine = create_async_engine(
+        async_database_url(settings.database_url), pool_pre_ping=True, **pool_options(settings.database_url)
+    )
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def warm_pool(bind, size: int) -> int:
+    """Открывает до size соединений пула и возвращает их в пул; сколько открыто."""
+    connections = []
+    try:
+        for _ in range(min(size, settings.db_pool_size)):
+            connections.append(bind.connect())
+    finally:
+        for conn in connections:
+            conn.close()
+    return len(connections)
+
+
+async def warm_async_pool(bind, size: int) -> int:
+    connections = []
+    try:
+        for _ in range(min(size, settings.db_pool_size)):
+            connections.append(await bind.connect())
+    finally:
+        for conn in connections:
+            await conn.close()
+    return len(connections)
+
 
 def get_db():
     db = SessionLocal()
@@ -17,3 +72,20 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def dialect_insert(db: Session, table):
+    """INSERT с поддержкой ON CONFLICT для текущего диалекта (Postgres или SQLite)."""
+    name = db.get_bind().dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"upsert is not supported for {name}")
+    return insert(table)
@@ -0,0 +1,38 @@
+"""Часовые пояса пользователей: их «сегодня» и момент следующей утренней доставки."""
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from .config import settings
+
+
+@lru_cache(maxsize=1024)
+def user_zone(name: Optional[str]) -> ZoneInfo:
+    """ZoneInfo по имени из профиля; неизвестный или пустой пояс — пояс по умолчанию."""
+    try:
+        return ZoneInfo(name or settings.default_timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(settings.default_timezone)
+
+
+def is_valid_timezone(name: str) -> bool:
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def local_today(tz_name: Optional[str], now: Optional[datetime] = None) -> date:
+    return (now or datetime.now(timezone.utc)).astimezone(user_zone(tz_name)).date()
+
+
+def next_delivery_at(tz_name: Optional[str], hour: int, after: Optional[datetime] = None) -> datetime:
+    """Ближайший момент строго после after, когда у пользователя наступает hour:00 по местному времени (в UTC)."""
+    zone = user_zone(tz_name)
+    local = (after or datetime.now(timezone.utc)).astimezone(zone)
+    candidate = datetime.combine(local.date(), time(hour), tzinfo=zone)
+    if candidate <= local:
+        candidate = datetime.combine(local.date() + timedelta(days=1), time(hour), tzinfo=zone)
+    return candidate.astimezone(timezone.utc)
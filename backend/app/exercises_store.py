@@ -1,6 +1,17 @@
 import json
 import os
-from typing import List
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import CatalogVersion, Exercise
 
 DEFAULT_EXERCISES = [
     "5 минут дыхательной практики: вдох 4, задержка 4, выдох 6",
@@ -10,38 +21,183 @@ DEFAULT_EXERCISES = [
     "Напишите другу тёплое сообщение",
 ]
 
-STORE_PATH = os.path.join(os.path.dirname(__file__), "exercises.json")
+# Старое файловое хранилище: при первом запуске его содержимое переносится в БД
+LEGACY_STORE_PATH = os.path.join(os.path.dirname(__file__), "exercises.json")
+
+CATALOG_NAME = "exercises"
+
 
+@dataclass(frozen=True)
+class ExerciseItem:
+    id: int
+    text: str
 
-def load_exercises() -> List[str]:
-    if not os.path.exists(STORE_PATH):
-        save_exercises(DEFAULT_EXERCISES)
+
+def _legacy_exercises() -> List[str]:
+    if not os.path.exists(LEGACY_STORE_PATH):
         return DEFAULT_EXERCISES
     try:
-        with open(STORE_PATH, "r", encoding="utf-8") as f:
+        with open(LEGACY_STORE_PATH, "r", encoding="utf-8") as f:
             data = json.load(f)
-            if isinstance(data, list):
-                return [str(x) for x in data]
-            return DEFAULT_EXERCISES
     except Exception:
         return DEFAULT_EXERCISES
+    if isinstance(data, list) and data:
+        return [str(x) for x in data]
+    return DEFAULT_EXERCISES
+
+
+def ensure_catalog(db: Session) -> bool:
+    """Создаёт строку версии и начальный набор упражнений, если каталога ещё нет.
+
+    Пишет в транзакции вызывающего через SAVEPOINT, commit — за ним; при гонке
+    откатывается только savepoint, а не чужие изменения в сессии.
+    True — каталог засеян этим вызовом.
+    """
+    if db.get(CatalogVersion, CATALOG_NAME) is not None:
+        return False
+    try:
+        with db.begin_nested():
+            db.add(CatalogVersion(name=CATALOG_NAME, version=1))
+            db.flush()
+            db.execute(insert(Exercise), [{"text": text} for text in _legacy_exercises()])
+    except IntegrityError:
+        # каталог параллельно засеял другой воркер
+        return False
+    return True
+
+
+def _bump_version(db: Session) -> None:
+    db.execute(
+        update(CatalogVersion)
+        .where(CatalogVersion.name == CATALOG_NAME)
+        .values(version=CatalogVersion.version + 1)
+    )
+
+
+class ExerciseCatalog:
+    """Кэш каталога упражнений в памяти процесса.
+
+    Чтение обслуживается из памяти; не чаще раза в check_interval секунд
+    воркер сверяет счётчик в catalog_versions и перечитывает каталог,
+    если его изменил другой процесс. Тексты заданий (tasks.exercise_id)
+    тоже берутся отсюда, включая архивные упражнения.
+    """
+
+    def __init__(self, check_interval: Optional[float] = None):
+        self.check_interval = settings.exercise_catalog_check_seconds if check_interval is None else check_interval
+        self._items: List[ExerciseItem] = []
+        self._texts: Dict[int, str] = {}
+        self._version: Optional[int] = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def items(self, db: Session) -> List[ExerciseItem]:
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return self._items
+        # Не ждём чужое перечитывание: в async-маршруте (AsyncSession.run_sync) все корутины
+        # идут в потоке event loop, и ожидание блокировки, взятой корутиной на await, его остановит.
+        if not self._lock.acquire(blocking=False):
+            return self._items if self._version is not None else self._refresh(db)
+        try:
+            if time.monotonic() - self._checked_at >= self.check_interval:
+                return self._refresh(db)
+            return self._items
+        finally:
+            self._lock.release()
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._version
+
+    def invalidate(self) -> None:
+        self._checked_at = float("-inf")
+
+    def _refresh(self, db: Session, force: bool = False) -> List[ExerciseItem]:
+        version = db.scalar(select(CatalogVersion.version).where(CatalogVersion.name == CATALOG_NAME))
+        if version is None and ensure_catalog(db):
+            # засеяли в транзакции вызывающего: до его commit строк не видят другие сессии,
+            # поэтому ротацию и версию не кэшируем — следующая сверка прочитает закоммиченный каталог.
+            # Тексты по id безопасны: любое изменение каталога потом перечитает их целиком.
+            rows = self._rows(db)
+            self._texts = {r.id: r.text for r in rows}
+            return [ExerciseItem(r.id, r.text) for r in rows if r.archived_at is None]
+        if version is None:
+            version = db.scalar(select(CatalogVersion.version).where(CatalogVersion.name == CATALOG_NAME))
+        if force or version != self._version:
+            rows = self._rows(db)
+            self._items = [ExerciseItem(r.id, r.text) for r in rows if r.archived_at is None]
+            self._texts = {r.id: r.text for r in rows}
+            self._version = version
+        self._checked_at = time.monotonic()
+        return self._items
+
+    @staticmethod
+    def _rows(db: Session):
+        return db.execute(select(Exercise.id, Exercise.text, Exercise.archived_at).order_by(Exercise.id)).all()
+
+    def text_of(self, exercise_id: Optional[int]) -> str:
+        """Текст из памяти, без запросов к БД: недостающие тексты заранее подгружает resolve()."""
+        if exercise_id is None:
+            return ""
+        return self._texts.get(exercise_id, "")
+
+    def resolve(self, db: Session, tasks) -> None:
+        """Подгружает тексты упражнений, на которые ссылаются tasks, до сериализации ответа.
+
+        Промах бывает, если упражнение добавил другой воркер после нашей сверки:
+        каталог перечитывается в сессии вызывающего, async-маршруты зовут это
+        через AsyncSession.run_sync — без блокирующего I/O в event loop.
+        """
+        if any(t.custom_text is None and t.exercise_id is not None and t.exercise_id not in self._texts for t in tasks):
+            # без self._lock: в async-маршруте ожидание чужого потока остановило бы event loop,
+            # а повторное перечитывание лишь присвоит те же данные
+            self._refresh(db, force=True)
+
+    def add(self, db: Session, text: str) -> List[ExerciseItem]:
+        ensure_catalog(db)
+        db.add(Exercise(text=text))
+        _bump_version(db)
+        db.commit()
+        self.invalidate()
+        return self.items(db)
+
+    def remove(self, db: Session, exercise_id: int) -> Optional[List[ExerciseItem]]:
+        exercise = db.get(Exercise, exercise_id)
+        if exercise is None or exercise.archived_at is not None:
+            return None
+        # строка остаётся: её текст нужен заданиям, которые на неё ссылаются
+        exercise.archived_at = datetime.now(timezone.utc)
+        _bump_version(db)
+        db.commit()
+        self.invalidate()
+        return self.items(db)
+
+
+catalog = ExerciseCatalog()
+
+
+def list_exercises(db: Session) -> List[ExerciseItem]:
+    return catalog.items(db)
+
+
+def load_exercises(db: Session) -> List[ExerciseItem]:
+    """Упражнения в порядке ротации (без архивных)."""
+    return catalog.items(db)
 
 
-def save_exercises(items: List[str]) -> None:
-    with open(STORE_PATH, "w", encoding="utf-8") as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
+def add_exercise(db: Session, text: str) -> List[ExerciseItem]:
+    return catalog.add(db, text)
 
 
-def add_exercise(text: str) -> List[str]:
-    items = load_exercises()
-    items.append(text)
-    save_exercises(items)
-    return items
+def remove_exercise(db: Session, exercise_id: int) -> Optional[List[ExerciseItem]]:
+    return catalog.remove(db, exercise_id)
 
 
-def remove_exercise(index: int) -> List[str]:
-    items = load_exercises()
-    if 0 <= index < len(items):
-        items.pop(index)
-        save_exercises(items)
-    return items
+def add_archived_exercises(db: Session, texts: List[str]) -> None:
+    """Архивные упражнения для текстов старых заданий: в ротацию не попадают, но дают заданиям exercise_id."""
+    now = datetime.now(timezone.utc)
+    db.execute(insert(Exercise), [{"text": text, "archived_at": now} for text in texts])
+    _bump_version(db)
+    db.commit()
+    catalog.invalidate()
+    catalog.items(db)
@@ -0,0 +1,262 @@
+"""Выгрузка для аналитики: задания с пользователями, пользователи со счётчиками, статистика по упражнениям.
+
+Задания читаются из tasks и архива tasks_archive вместе. Строки идут курсором
+на стороне сервера (stream_results) пачками по chunk_size и сразу превращаются
+в CSV или row group Parquet, поэтому память не растёт с размером таблиц. Агрегаты (users, exercises) считает сама БД.
+Parquet требует pyarrow; он импортируется только при такой выгрузке.
+
+Из консоли, в файл:
+    python -m app.export tasks --format parquet --output tasks.parquet
+"""
+import argparse
+import csv
+import io
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Float, case, cast, func, select
+from sqlalchemy.orm import Session
+
+from .archive import all_tasks
+from .models import Exercise, TaskStatus, User
+
+FORMATS = ("csv", "parquet")
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+
+
+class ExportUnavailable(Exception):
+    """Формат не поддерживается в этой сборке (нет pyarrow)."""
+
+
+@dataclass
+class Dataset:
+    # (имя колонки, тип для Parquet: int64 / float64 / bool / string / date / timestamp)
+    columns: List[Tuple[str, str]]
+    query: Callable[[Optional[date], Optional[date]], object]
+
+
+def _completion_rate(completed, total):
+    return func.round(cast(completed, Float) / func.nullif(total, 0), 4)
+
+
+def _task_text(tasks):
+    # текст задания: свой или упражнения из каталога (каталог крошечный, join дешёвый)
+    return func.coalesce(tasks.c.custom_text, Exercise.text)
+
+
+def _tasks(since: Optional[date], until: Optional[date]):
+    """Горячие и архивные задания за период одним подзапросом."""
+
+    def period(model) -> list:
+        conditions = []
+        if since is not None:
+            conditions.append(model.task_date >= since)
+        if until is not None:
+            conditions.append(model.task_date < until)
+        return conditions
+
+    return all_tasks(period)
+
+
+def _tasks_query(since, until):
+    tasks = _tasks(since, until)
+    return (
+        select(
+            tasks.c.id, tasks.c.user_id, User.email, User.telegram_id.is_not(None).label("telegram_linked"),
+            tasks.c.task_date, tasks.c.sent_at, tasks.c.status, _task_text(tasks).label("text"),
+        )
+        .join(User, User.id == tasks.c.user_id)
+        .outerjoin(Exercise, Exercise.id == tasks.c.exercise_id)
+        .order_by(tasks.c.id)
+    )
+
+
+def _users_query(since, until):
+    tasks = _tasks(since, until)
+    done = tasks.c.status == TaskStatus.completed.value
+    counts = (
+        select(
+            tasks.c.user_id,
+            func.count(tasks.c.id).label("task_count"),
+            func.count(case((done, 1))).label("completed_count"),
+        )
+        .group_by(tasks.c.user_id)
+        .subquery()
+    )
+    task_count = func.coalesce(counts.c.task_count, 0)
+    completed_count = func.coalesce(counts.c.completed_count, 0)
+    return (
+        select(
+            User.id, User.name, User.email, User.role, User.telegram_id.is_not(None).label("telegram_linked"),
+            User.timezone, User.created_at,
+            task_count.label("task_count"), completed_count.label("completed_count"),
+            _completion_rate(completed_count, task_count).label("completion_rate"),
+        )
+        .outerjoin(counts, counts.c.user_id == User.id)
+        .order_by(User.id)
+    )
+
+
+def _exercises_query(since, until):
+    tasks = _tasks(since, until)
+    text = _task_text(tasks)
+    total = func.count(tasks.c.id)
+    completed = func.count(case((tasks.c.status == TaskStatus.completed.value, 1)))
+    return (
+        select(
+            text.label("exercise"),
+            total.label("tasks"),
+            completed.label("completed"),
+            _completion_rate(completed, total).label("completion_rate"),
+            func.count(func.distinct(tasks.c.user_id)).label("users"),
+            func.min(tasks.c.task_date).label("first_day"),
+            func.max(tasks.c.task_date).label("last_day"),
+        )
+        .select_from(tasks)
+        .outerjoin(Exercise, Exercise.id == tasks.c.exercise_id)
+        .group_by(text)
+        .order_by(total.desc(), text)
+    )
+
+
+DATASETS = {
+    "tasks": Dataset(
+        [("id", "int64"), ("user_id", "int64"), ("email", "string"), ("telegram_linked", "bool"),
+         ("task_date", "date"), ("sent_at", "timestamp"), ("status", "string"), ("text", "string")],
+        _tasks_query,
+    ),
+    "users": Dataset(
+        [("id", "int64"), ("name", "string"), ("email", "string"), ("role", "string"), ("telegram_linked", "bool"),
+         ("timezone", "string"), ("created_at", "timestamp"), ("task_count", "int64"),
+         ("completed_count", "int64"), ("completion_rate", "float64")],
+        _users_query,
+    ),
+    "exercises": Dataset(
+        [("exercise", "string"), ("tasks", "int64"), ("completed", "int64"), ("completion_rate", "float64"),
+         ("users", "int64"), ("first_day", "date"), ("last_day", "date")],
+        _exercises_query,
+    ),
+}
+
+
+def iter_rows(db: Session, dataset: str, since: Optional[date] = None, until: Optional[date] = None,
+              chunk_size: int = 5000) -> Iterator[list]:
+    """Пачки строк датасета; на Postgres — серверный курсор, а не fetchall."""
+    result = db.execute(
+        DATASETS[dataset].query(since, until).execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    for partition in result.partitions():
+        yield partition
+
+
+def csv_chunks(columns: List[Tuple[str, str]], partitions: Iterator[list]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for rows in partitions:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ExportUnavailable("Parquet export requires pyarrow") from e
+    return pyarrow
+
+
+def parquet_available() -> bool:
+    try:
+        _arrow()
+    except ExportUnavailable:
+        return False
+    return True
+
+
+class _ChunkSink:
+    """Файлоподобный приёмник для ParquetWriter: накопленные байты забираются после каждой row group."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def parquet_chunks(columns: List[Tuple[str, str]], partitions: Iterator[list]) -> Iterator[bytes]:
+    """Одна row group на пачку строк; байты отдаются сразу, файл целиком в памяти не собирается."""
+    pa = _arrow()
+    types = {
+        "int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_(), "string": pa.string(),
+        "date": pa.date32(), "timestamp": pa.timestamp("us", tz="UTC"),
+    }
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    sink = _ChunkSink()
+    writer = pa.parquet.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+    try:
+        for rows in partitions:
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array([row[i] for row in rows], type=schema.field(i).type) for i in range(len(columns))],
+                schema=schema,
+            )
+            writer.write_batch(batch)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(db: Session, dataset: str, fmt: str, since: Optional[date] = None, until: Optional[date] = None,
+                  chunk_size: int = 5000):
+    columns = DATASETS[dataset].columns
+    partitions = iter_rows(db, dataset, since, until, chunk_size)
+    if fmt == "parquet":
+        return parquet_chunks(columns, partitions)
+    return (chunk.encode() for chunk in csv_chunks(columns, partitions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка заданий и статистики в CSV или Parquet")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--since", type=date.fromisoformat)
+    parser.add_argument("--until", type=date.fromisoformat)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    from .database import SessionLocal
+
+    with SessionLocal() as db, open(args.output, "wb") as out:
+        for chunk in export_chunks(db, args.dataset, args.format, args.since, args.until, args.chunk_size):
+            out.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Пробы для оркестратора и балансировщика.
+
+/healthz — процесс жив и отвечает (без обращения к БД), годится для liveness.
+/readyz — воркер закончил старт, БД отвечает и схема создана (init-db выполнен);
+до этого и после начала остановки — 503, чтобы балансировщик не слал трафик.
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .database import get_db
+from .models import Exercise
+from .query_budget import query_budget
+
+router = APIRouter()
+
+_ready = False
+
+
+def set_ready(ready: bool) -> None:
+    global _ready
+    _ready = ready
+
+
+@router.get("/healthz")
+@query_budget(0)
+async def healthz():
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+@query_budget(1)
+def readyz(db: Session = Depends(get_db)):
+    if not _ready:
+        raise HTTPException(status_code=503, detail="Starting up")
+    try:
+        db.execute(select(Exercise.id).limit(1))
+    except SQLAlchemyError:
+        raise HTTPException(status_code=503, detail="Database is not ready")
+    return {"status": "ready"}
@@ -0,0 +1,107 @@
+"""ETag/304 и кэш сериализованных ответов для часто опрашиваемых GET.
+
+Ключ ответа — дешёвая версия данных: users.tasks_version (растёт в той же
+транзакции, что и любое изменение заданий пользователя) плюс дата, от которой
+зависит ответ, или версия каталога упражнений. Совпал If-None-Match — 304 без
+запросов к заданиям и без сериализации; иначе готовое тело берётся из кэша
+процесса. Старые версии не нужно удалять явно: их ключи больше не запрашиваются
+и вытесняются LRU, поэтому кэш согласован и при нескольких воркерах.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from .config import settings
+
+CACHE_CONTROL = "private, no-cache"
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    body: bytes
+    headers: dict = field(default_factory=dict)
+
+
+class ResponseCache:
+    """Интерфейс кэша тел ответов; базовая реализация ничего не хранит.
+
+    Другое хранилище (например, общее на все воркеры) подключается через set_response_cache().
+    """
+
+    def get(self, key: tuple) -> Optional[CachedBody]:
+        return None
+
+    def put(self, key: tuple, value: CachedBody) -> None:
+        pass
+
+
+class MemoryResponseCache(ResponseCache):
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[tuple, CachedBody]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[CachedBody]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: tuple, value: CachedBody) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+response_cache: ResponseCache = (
+    MemoryResponseCache(settings.response_cache_size) if settings.response_cache_size > 0 else ResponseCache()
+)
+
+
+def set_response_cache(cache: ResponseCache) -> None:
+    global response_cache
+    response_cache = cache
+
+
+def make_etag(key: tuple) -> str:
+    return '"' + hashlib.blake2b(repr(key).encode(), digest_size=12).hexdigest() + '"'
+
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates or "*" in candidates
+
+
+def lookup(request: Request, key: tuple) -> Tuple[str, Optional[Response]]:
+    """ETag для ключа и готовый ответ (304 или тело из кэша), если считать заново не нужно."""
+    etag = make_etag(key)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _matches(request, etag):
+        return etag, Response(status_code=304, headers=headers)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return etag, Response(cached.body, media_type="application/json", headers={**headers, **cached.headers})
+    return etag, None
+
+
+def store(key: tuple, etag: str, adapter: TypeAdapter, value, headers: Optional[dict] = None) -> Response:
+    """Сериализует value по схеме ответа, кладёт тело в кэш и отдаёт его с ETag."""
+    body = adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    cached = CachedBody(body, headers or {})
+    response_cache.put(key, cached)
+    return Response(body, media_type="application/json", headers={"ETag": etag, "Cache-Control": CACHE_CONTROL, **cached.headers})
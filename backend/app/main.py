@@ -1,12 +1,24 @@
-from fastapi import FastAPI
+import logging
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import SQLAlchemyError
 
-from .database import Base, engine
+from .database import engine
+from . import database, health
 from .config import settings
 from .routers import router
+from .async_routers import router as async_router
 from .scheduler import init_scheduler
-from .services import ensure_admin
+from .manage import init_db
+from .exercises_store import list_exercises
 from .database import SessionLocal
+from .passwords import PasswordPoolBusy, password_pool
+from .pagination import NEXT_CURSOR_HEADER, InvalidCursor
+from . import metrics, query_budget
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Psychologist Bot API")
 
@@ -17,20 +29,62 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# /metrics и сбор метрик (METRICS_ENABLED)
+if settings.metrics_enabled:
+    metrics.install(app)
+
+# учёт SQL-запросов маршрутов против их бюджета (QUERY_BUDGET_MODE)
+if settings.query_budget_mode != "off":
+    query_budget.install(app)
+
+
+@app.exception_handler(PasswordPoolBusy)
+async def password_pool_busy_handler(request: Request, exc: PasswordPoolBusy):
+    return JSONResponse(status_code=503, content={"detail": "Server is busy, retry later"}, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": "Invalid cursor"})
+
 
 @app.on_event("startup")
 def on_startup():
-    Base.metadata.create_all(bind=engine)
-    # создать админа
-    db = SessionLocal()
+    # схема, админ (bcrypt) и каталог; при DB_INIT_ON_STARTUP=false — один раз через python -m app.manage init-db
+    if settings.db_init_on_startup:
+        init_db(engine, SessionLocal)
+    database.warm_pool(engine, settings.db_pool_warmup)
     try:
-        ensure_admin(db, settings.admin_email, settings.admin_password)
-    finally:
-        db.close()
+        # тексты заданий берутся из каталога: прогреваем его до первого запроса
+        with SessionLocal() as db:
+            list_exercises(db)
+    except SQLAlchemyError:
+        # схему ещё не создали: воркер поднимается, /readyz отвечает 503 до init-db
+        logger.warning("exercise catalog is not available, run python -m app.manage init-db")
     # планировщик
     init_scheduler()
 
 
+@app.on_event("startup")
+async def on_startup_async():
+    if database.async_engine is not None:
+        await database.warm_async_pool(database.async_engine, settings.db_pool_warmup)
+    health.set_ready(True)
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    health.set_ready(False)
+    password_pool.shutdown()
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
+
+
+if settings.db_async_mode:
+    # асинхронные маршруты регистрируются первыми и перекрывают синхронные
+    app.include_router(async_router)
 app.include_router(router)
+app.include_router(health.router)
@@ -0,0 +1,134 @@
+"""Служебные команды backend.
+
+    python -m app.manage init-db
+    python -m app.manage backfill-task-exercises [--chunk-size 10000] [--archive-min-tasks 100]
+    python -m app.manage backfill-user-search [--chunk-size 10000]
+
+init-db создаёт таблицы, админа и каталог упражнений; при DB_INIT_ON_STARTUP=false
+это делает только он (один раз перед запуском воркеров), а не каждый воркер.
+
+backfill-task-exercises переносит старые задания на ссылки в каталог: строки,
+чей текст совпадает с упражнением каталога, получают exercise_id, а копия
+текста обнуляется. Идёт диапазонами tasks.id с commit после каждого, поэтому
+её можно прервать и запустить снова. С --archive-min-tasks тексты удалённых
+раньше упражнений, встречающиеся хотя бы в N заданиях, заводятся в каталоге
+архивными строками и тоже становятся ссылками.
+
+backfill-user-search заполняет users.name_lower/email_lower для существующей
+базы — тем же str.lower, что и при записи пользователя, тоже диапазонами id.
+"""
+import argparse
+import logging
+from typing import Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import Base
+from .exercises_store import add_archived_exercises, ensure_catalog
+from .models import Exercise, Task, User
+from .services import ensure_admin
+
+logger = logging.getLogger(__name__)
+
+
+def init_db(bind, session_factory) -> None:
+    """Схема, админ и каталог упражнений; повторный запуск ничего не меняет."""
+    Base.metadata.create_all(bind=bind)
+    with session_factory() as db:
+        ensure_admin(db, settings.admin_email, settings.admin_password)
+        ensure_catalog(db)
+        db.commit()
+
+
+def archive_frequent_texts(db: Session, min_tasks: int) -> int:
+    """Архивные упражнения для частых текстов, которых нет в каталоге; возвращает число новых строк."""
+    texts = db.scalars(
+        select(Task.custom_text)
+        .where(Task.exercise_id.is_(None), Task.custom_text.is_not(None), Task.custom_text.not_in(select(Exercise.text)))
+        .group_by(Task.custom_text)
+        .having(func.count() >= min_tasks)
+    ).all()
+    if texts:
+        add_archived_exercises(db, texts)
+    return len(texts)
+
+
+def backfill_task_exercises(db: Session, chunk_size: int = 10000, archive_min_tasks: Optional[int] = None) -> int:
+    """Заменяет копии текстов упражнений ссылками exercise_id; возвращает число обновлённых заданий."""
+    ensure_catalog(db)
+    db.commit()
+    if archive_min_tasks:
+        archived = archive_frequent_texts(db, archive_min_tasks)
+        logger.info("archived %s legacy exercise texts", archived)
+    # при повторе текста в каталоге ссылаемся на самое раннее упражнение
+    exercise_id = select(func.min(Exercise.id)).where(Exercise.text == Task.custom_text).scalar_subquery()
+    max_id = db.scalar(select(func.max(Task.id))) or 0
+    updated = 0
+    for start in range(0, max_id, chunk_size):
+        result = db.execute(
+            update(Task)
+            .where(
+                Task.id > start,
+                Task.id <= start + chunk_size,
+                Task.exercise_id.is_(None),
+                Task.custom_text.in_(select(Exercise.text)),
+            )
+            .values(exercise_id=exercise_id, custom_text=None),
+            execution_options={"synchronize_session": False},
+        )
+        db.commit()
+        updated += result.rowcount
+        logger.info("backfill: tasks.id <= %s, %s updated", min(start + chunk_size, max_id), updated)
+    return updated
+
+
+def backfill_user_search(db: Session, chunk_size: int = 10000) -> int:
+    """Пересчитывает users.name_lower/email_lower из Python; возвращает число обновлённых строк."""
+    max_id = db.scalar(select(func.max(User.id))) or 0
+    updated = 0
+    for start in range(0, max_id, chunk_size):
+        rows = db.execute(
+            select(User.id, User.name, User.email).where(User.id > start, User.id <= start + chunk_size)
+        ).all()
+        if rows:
+            # ORM bulk UPDATE по первичному ключу: один executemany на диапазон
+            db.execute(update(User), [
+                {"id": row.id, "name_lower": row.name.lower(), "email_lower": row.email.lower()} for row in rows
+            ])
+            db.commit()
+            updated += len(rows)
+        logger.info("backfill: users.id <= %s, %s updated", min(start + chunk_size, max_id), updated)
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Служебные команды backend")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("init-db", help="таблицы, админ и каталог упражнений")
+    backfill = commands.add_parser("backfill-task-exercises", help="tasks.text → tasks.exercise_id пачками")
+    backfill.add_argument("--chunk-size", type=int, default=10000)
+    backfill.add_argument("--archive-min-tasks", type=int)
+    user_search = commands.add_parser("backfill-user-search", help="users.name_lower/email_lower для поиска в админке")
+    user_search.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    from .database import SessionLocal, engine
+
+    if args.command == "init-db":
+        init_db(engine, SessionLocal)
+        print("database initialized")
+        return
+    with SessionLocal() as db:
+        if args.command == "backfill-task-exercises":
+            updated = backfill_task_exercises(db, args.chunk_size, args.archive_min_tasks)
+            print(f"{updated} tasks now reference the exercise catalog")
+        elif args.command == "backfill-user-search":
+            updated = backfill_user_search(db, args.chunk_size)
+            print(f"{updated} users reindexed for search")
+
+
+if __name__ == "__main__":
+    main()
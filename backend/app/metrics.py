@@ -0,0 +1,189 @@
+"""Метрики Prometheus: HTTP, запросы к БД, пул соединений, bcrypt, планировщик, Telegram.
+
+METRICS_ENABLED=false выключает и /metrics, и сам сбор: хелперы count/timed становятся
+пустыми. При нескольких воркерах uvicorn задайте PROMETHEUS_MULTIPROC_DIR — /metrics
+соберёт значения всех процессов.
+
+Модуль импортируется и дочерними процессами пула паролей, поэтому сверху тянет
+только prometheus_client и config; база подключается в install().
+"""
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+from .config import settings
+
+ENABLED = settings.metrics_enabled
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса", ["method", "route", "status"]
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Время SQL-запроса (count — число запросов)", ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+DB_POOL_CONNECTIONS = Gauge("db_pool_connections", "Соединения пула БД", ["state"], multiprocess_mode="livesum")
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds", "bcrypt: хэширование и проверка, с ожиданием в очереди пула", ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+PASSWORD_POOL_REJECTED = Counter("password_pool_rejected_total", "Отказы пула паролей при переполненной очереди")
+SCHEDULER_JOB_SECONDS = Histogram(
+    "scheduler_job_duration_seconds", "Длительность задач планировщика", ["job"],
+    buckets=(0.01, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0),
+)
+TASKS_GENERATED = Counter("tasks_generated_total", "Созданные задания", ["source"])
+TELEGRAM_SENDS = Counter("telegram_send_total", "Попытки отправки в Telegram", ["result"])
+
+_DB_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+_NOOP = nullcontext()
+
+
+def count(metric, *labels: str, amount: float = 1) -> None:
+    if ENABLED and amount:
+        (metric.labels(*labels) if labels else metric).inc(amount)
+
+
+@contextmanager
+def _timed(metric, labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        (metric.labels(*labels) if labels else metric).observe(time.perf_counter() - started)
+
+
+def timed(metric, *labels: str):
+    """with timed(HISTOGRAM, "label"): ... — замер блока; при выключенных метриках ничего не делает."""
+    return _timed(metric, labels) if ENABLED else _NOOP
+
+
+def timed_job(name: str, fn):
+    def job(*args, **kwargs):
+        with timed(SCHEDULER_JOB_SECONDS, name):
+            return fn(*args, **kwargs)
+
+    job.__name__ = fn.__name__
+    return job
+
+
+# --- HTTP ---
+
+class MetricsMiddleware:
+    """ASGI-middleware: гистограмма по шаблону маршрута (/api/admin/users/{user_id}), а не по сырому пути."""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: dict = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "<unmatched>"
+        route = self._routes.get(endpoint)
+        if route is None:
+            for r in scope["app"].routes:
+                if getattr(r, "endpoint", None) is endpoint:
+                    route = self._routes[endpoint] = r.path
+                    break
+            else:
+                route = "<unmatched>"
+        return route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_SECONDS.labels(scope["method"], self._route(scope), str(status)).observe(
+                time.perf_counter() - started
+            )
+
+
+# --- БД ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+    DB_QUERY_SECONDS.labels(operation if operation in _DB_OPERATIONS else "OTHER").observe(time.perf_counter() - started)
+
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+class _PoolCollector:
+    """Состояние пулов читается в момент запроса /metrics — без хуков на checkout/checkin."""
+
+    def __init__(self, engines):
+        self.engines = engines
+
+    def update(self) -> None:
+        checked_out = idle = overflow = 0
+        for engine in self.engines:
+            pool = engine.pool
+            checked_out += getattr(pool, "checkedout", lambda: 0)()
+            idle += getattr(pool, "checkedin", lambda: 0)()
+            overflow += max(0, getattr(pool, "overflow", lambda: 0)())
+        DB_POOL_CONNECTIONS.labels("checked_out").set(checked_out)
+        DB_POOL_CONNECTIONS.labels("idle").set(idle)
+        DB_POOL_CONNECTIONS.labels("overflow").set(overflow)
+
+
+_pool_collector: _PoolCollector | None = None
+
+
+def install(app) -> None:
+    """Подключает middleware, /metrics и хуки SQLAlchemy; вызывается из main при METRICS_ENABLED."""
+    global _pool_collector
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from starlette.responses import Response
+
+    from . import database
+
+    # слушаем класс Engine: попадают и основной, и асинхронный (его sync_engine) движки
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    engines = [database.engine]
+    if database.async_engine is not None:
+        engines.append(database.async_engine.sync_engine)
+    _pool_collector = _PoolCollector(engines)
+
+    def metrics_endpoint(request):
+        return Response(render(), media_type=CONTENT_TYPE_LATEST)
+
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
+
+def render() -> bytes:
+    if _pool_collector is not None:
+        _pool_collector.update()
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
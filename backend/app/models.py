@@ -1,6 +1,9 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, func
-from sqlalchemy.orm import relationship, Mapped, mapped_column
+from datetime import date, datetime, timezone
+
+from sqlalchemy import Column, Integer, BigInteger, Boolean, String, Date, DateTime, ForeignKey, Enum, Index, UniqueConstraint, func
+from sqlalchemy.orm import relationship, Mapped, mapped_column, validates
 import enum
+from .config import settings
 from .database import Base
 
 
@@ -9,6 +12,13 @@ class UserRole(str, enum.Enum):
     admin = "admin"
 
 
+def _lowered(source: str):
+    """Значение по умолчанию для *_lower при INSERT через Core (сидер): str.lower() исходной колонки."""
+    def default(context):
+        return (context.get_current_parameters().get(source) or "").lower()
+    return default
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -16,25 +26,228 @@ class User(Base):
     telegram_id: Mapped[str | None] = mapped_column(String(64), unique=True, index=True)
     name: Mapped[str] = mapped_column(String(128))
     email: Mapped[str] = mapped_column(String(255), unique=True, index=True)
+    # копии name/email в нижнем регистре для поиска в админке: пишутся из Python (str.lower),
+    # потому что lower() в SQLite складывает регистр только у ASCII
+    name_lower: Mapped[str] = mapped_column(String(128), default=_lowered("name"))
+    email_lower: Mapped[str] = mapped_column(String(255), default=_lowered("email"))
     password_hash: Mapped[str | None] = mapped_column(String(255), nullable=True)
     role: Mapped[str] = mapped_column(String(16), default=UserRole.user.value)
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # сколько заданий уже выдано: номер следующего упражнения в ротации
+    exercise_cursor: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    # растёт при каждом изменении заданий пользователя: из него и даты строится ETag чтения /api/tasks*, /api/progress
+    tasks_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    timezone: Mapped[str] = mapped_column(String(64), default=lambda: settings.default_timezone)
+    daily_hour: Mapped[int] = mapped_column(Integer, default=lambda: settings.bot_daily_hour)
+    # ближайшая доставка задания (UTC, с точностью до минуты); тик планировщика берёт строки с next_delivery_at <= now
+    next_delivery_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
     tasks = relationship("Task", back_populates="user", cascade="all, delete-orphan")
 
+    @validates("name", "email")
+    def _sync_lower(self, key, value):
+        setattr(self, f"{key}_lower", value.lower() if value is not None else None)
+        return value
+
+
+# Индексы админского списка: префиксный поиск по name_lower/email_lower
+# (text_pattern_ops — чтобы LIKE 'abc%' шёл по индексу на Postgres при любой collation),
+# фильтры по роли и дате регистрации с keyset-пагинацией по id.
+Index("ix_users_email_lower", User.email_lower, postgresql_ops={"email_lower": "text_pattern_ops"})
+Index("ix_users_name_lower", User.name_lower, postgresql_ops={"name_lower": "text_pattern_ops"})
+Index("ix_users_role_id", User.role, User.id)
+Index("ix_users_created_at", User.created_at)
+Index("ix_users_next_delivery", User.next_delivery_at, User.id)
+
 
 class TaskStatus(str, enum.Enum):
     pending = "pending"
     completed = "completed"
 
 
-class Task(Base):
+def _task_date_default(context) -> date:
+    # день задания по умолчанию — UTC-дата sent_at (или сегодняшняя, если sent_at не задан)
+    sent_at = context.get_current_parameters().get("sent_at")
+    if sent_at is None:
+        return datetime.now(timezone.utc).date()
+    if sent_at.tzinfo is None:
+        return sent_at.date()
+    return sent_at.astimezone(timezone.utc).date()
+
+
+class _TaskText:
+    @property
+    def text(self) -> str:
+        """Текст задания: свой или из кэша каталога в памяти (его заполняет catalog.resolve в services)."""
+        if self.custom_text is not None:
+            return self.custom_text
+        from .exercises_store import catalog
+
+        return catalog.text_of(self.exercise_id)
+
+    @text.setter
+    def text(self, value: str) -> None:
+        self.custom_text = value
+        self.exercise_id = None
+
+
+class Task(_TaskText, Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # история пользователя читается keyset-страницами по (sent_at, id)
+        Index("ix_tasks_user_sent_id", "user_id", "sent_at", "id"),
+        # не больше одного задания в день: гонки создания решает сама БД
+        UniqueConstraint("user_id", "task_date", name="uq_tasks_user_task_date"),
+        # id не переиспользуются после удаления: перенесённые в tasks_archive строки сохраняют свои id
+        {"sqlite_autoincrement": True},
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    text: Mapped[str] = mapped_column(String(1024))
+    # упражнение из каталога; свой текст (колонка text) хранится только у заданий, назначенных админом
+    exercise_id: Mapped[int | None] = mapped_column(ForeignKey("exercises.id"), nullable=True)
+    custom_text: Mapped[str | None] = mapped_column("text", String(1024), nullable=True)
     sent_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+    task_date: Mapped[date] = mapped_column(Date, default=_task_date_default)
     status: Mapped[str] = mapped_column(String(16), default=TaskStatus.pending.value, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
 
     user = relationship("User", back_populates="tasks")
+
+
+class TaskArchive(_TaskText, Base):
+    """Задания старше TASK_ARCHIVE_AFTER_DAYS: перенесены из tasks архиватором с теми же id и полями."""
+
+    __tablename__ = "tasks_archive"
+    __table_args__ = (Index("ix_tasks_archive_user_sent_id", "user_id", "sent_at", "id"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    exercise_id: Mapped[int | None] = mapped_column(ForeignKey("exercises.id"), nullable=True)
+    custom_text: Mapped[str | None] = mapped_column("text", String(1024), nullable=True)
+    sent_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True))
+    task_date: Mapped[date] = mapped_column(Date)
+    status: Mapped[str] = mapped_column(String(16))
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+
+
+class Exercise(Base):
+    __tablename__ = "exercises"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    text: Mapped[str] = mapped_column(String(1024))
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # удалённое упражнение остаётся в каталоге: на него ссылаются старые задания, в ротацию оно не попадает
+    archived_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class CatalogVersion(Base):
+    """Счётчик версий справочников: воркеры сверяют его, чтобы сбросить свой кэш."""
+
+    __tablename__ = "catalog_versions"
+
+    name: Mapped[str] = mapped_column(String(32), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class UserDailyProgress(Base):
+    """Дневной срез прогресса пользователя: обновляется инкрементально при создании/выполнении заданий."""
+
+    __tablename__ = "user_daily_progress"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[Date] = mapped_column(Date, primary_key=True)
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    completed: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class OutboxStatus(str, enum.Enum):
+    pending = "pending"
+    sent = "sent"
+    failed = "failed"
+
+
+class OutboxMessage(Base):
+    """Исходящее сообщение Telegram: пишется в одной транзакции с заданием, шлёт диспетчер."""
+
+    __tablename__ = "telegram_outbox"
+    __table_args__ = (Index("ix_telegram_outbox_due", "status", "next_attempt_at"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    chat_id: Mapped[str] = mapped_column(String(64))
+    text: Mapped[str] = mapped_column(String(4096))
+    status: Mapped[str] = mapped_column(String(16), default=OutboxStatus.pending.value)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    last_error: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    sent_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class ProcessedUpdate(Base):
+    """update_id Telegram, уже взятый в обработку одним из процессов бота (webhook за балансировщиком)."""
+
+    __tablename__ = "bot_processed_updates"
+
+    update_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class SchedulerLease(Base):
+    """Аренда роли (лидер планировщика): держит тот, кто продлил её до истечения expires_at."""
+
+    __tablename__ = "scheduler_leases"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    holder: Mapped[str] = mapped_column(String(128))
+    expires_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True))
+
+
+class SchedulerRun(Base):
+    """Запуск шардированной задачи (например, рассылки за день): фиксирует разбиение на шарды."""
+
+    __tablename__ = "scheduler_runs"
+
+    run_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    shards: Mapped[int] = mapped_column(Integer)
+    max_user_id: Mapped[int] = mapped_column(Integer)
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class SchedulerShard(Base):
+    """Диапазон users.id в запуске: кто его обрабатывает и докуда дошёл (last_user_id)."""
+
+    __tablename__ = "scheduler_shards"
+
+    run_key: Mapped[str] = mapped_column(ForeignKey("scheduler_runs.run_key", ondelete="CASCADE"), primary_key=True)
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # (start_id, end_id]; у последнего шарда end_id пустой — до конца таблицы
+    start_id: Mapped[int] = mapped_column(Integer)
+    end_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    last_user_id: Mapped[int] = mapped_column(Integer)
+    owner: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    lease_expires_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    done: Mapped[bool] = mapped_column(Boolean, default=False)
+
+
+class BulkJobStatus(str, enum.Enum):
+    pending = "pending"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+class BulkJob(Base):
+    """Массовая операция админки: прогресс пишется после каждой пачки, его видно из любого воркера."""
+
+    __tablename__ = "bulk_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(32))
+    status: Mapped[str] = mapped_column(String(16), default=BulkJobStatus.pending.value)
+    # total — сколько объектов выбрано, processed — сколько уже пройдено, affected — сколько реально изменено
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    processed: Mapped[int] = mapped_column(Integer, default=0)
+    affected: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    created_by: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    finished_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
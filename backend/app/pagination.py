@@ -0,0 +1,50 @@
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+# Заголовок со ссылкой на следующую страницу: тело ответа остаётся обычным списком
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List]:
+    """Разбирает курсор из size значений; None — первая страница."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(cursor)
+    return values
+
+
+def decode_task_cursor(cursor: Optional[str]):
+    """Курсор истории заданий: (sent_at, id) последней отданной строки."""
+    values = decode_cursor(cursor, 2)
+    if values is None:
+        return None
+    try:
+        return datetime.fromisoformat(values[0]), int(values[1])
+    except (TypeError, ValueError):
+        raise InvalidCursor(cursor)
+
+
+def decode_id_cursor(cursor: Optional[str]) -> Optional[int]:
+    """Курсор по первичному ключу: id последней отданной строки."""
+    values = decode_cursor(cursor, 1)
+    if values is None:
+        return None
+    if not isinstance(values[0], int):
+        raise InvalidCursor(cursor)
+    return values[0]
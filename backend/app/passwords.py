@@ -0,0 +1,123 @@
+"""Хэширование паролей (bcrypt) в отдельном пуле процессов.
+
+bcrypt занимает ядро на сотни миллисекунд; в пуле процессов он не держит GIL
+и не занимает потоки FastAPI надолго. Очередь ограничена: когда она полна,
+вызов сразу падает с PasswordPoolBusy (роуты отвечают 503), а не копит ожидание.
+
+Модуль импортируется дочерними процессами, поэтому тянет только config и metrics;
+passlib загружается при первом хэшировании, а не на старте воркера.
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from .config import settings
+from .metrics import PASSWORD_HASH_SECONDS, PASSWORD_POOL_REJECTED, count, timed
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+_contexts: dict[int, "CryptContext"] = {}
+
+
+def _context(rounds: int) -> "CryptContext":
+    # bcrypt__rounds задаёт и целевую стоимость: хэш с другим числом раундов needs_update
+    context = _contexts.get(rounds)
+    if context is None:
+        from passlib.context import CryptContext
+
+        context = _contexts[rounds] = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+    return context
+
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify_and_update(password: str, password_hash: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return _context(rounds).verify_and_update(password, password_hash)
+
+
+class PasswordPoolBusy(Exception):
+    """Очередь на хэширование переполнена."""
+
+
+class PasswordPool:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn: fork из процесса с потоками uvicorn небезопасен
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._executor
+
+    def submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            count(PASSWORD_POOL_REJECTED)
+            raise PasswordPoolBusy()
+        if self.workers <= 0:
+            # пул выключен: считаем в вызывающем потоке, лимит очереди всё равно действует
+            future: Future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self._slots.release()
+            return future
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    async def run_async(self, fn, *args):
+        if self.workers <= 0:
+            # без пула считаем в потоке, а не в event loop
+            return await asyncio.to_thread(self.run, fn, *args)
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordPool(settings.password_pool_workers, settings.password_pool_max_pending)
+
+
+def hash_password(password: str) -> str:
+    with timed(PASSWORD_HASH_SECONDS, "hash"):
+        return password_pool.run(_hash, password, settings.bcrypt_rounds)
+
+
+def verify_and_update(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """Проверяет пароль; если хэш посчитан с другой стоимостью — возвращает новый хэш."""
+    with timed(PASSWORD_HASH_SECONDS, "verify"):
+        return password_pool.run(_verify_and_update, password, password_hash, settings.bcrypt_rounds)
+
+
+async def hash_password_async(password: str) -> str:
+    with timed(PASSWORD_HASH_SECONDS, "hash"):
+        return await password_pool.run_async(_hash, password, settings.bcrypt_rounds)
+
+
+async def verify_and_update_async(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    with timed(PASSWORD_HASH_SECONDS, "verify"):
+        return await password_pool.run_async(_verify_and_update, password, password_hash, settings.bcrypt_rounds)
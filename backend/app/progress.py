@@ -0,0 +1,114 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, func, select
+from sqlalchemy.orm import Session
+
+from .archive import all_tasks
+from .database import dialect_insert
+from .models import Task, TaskStatus, UserDailyProgress
+
+
+def period_starts(now: datetime) -> Tuple[datetime, datetime, datetime]:
+    """Начало текущего дня, недели (понедельник) и месяца в UTC."""
+    day = now.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return day, day - timedelta(days=day.weekday()), day.replace(day=1)
+
+
+def utc_day(moment: datetime) -> date:
+    """UTC-дата момента; SQLite отдаёт наивные datetime, они и так в UTC."""
+    if moment.tzinfo is None:
+        return moment.date()
+    return moment.astimezone(timezone.utc).date()
+
+
+def progress_result(row) -> dict:
+    total, completed, today, week, month = (int(v or 0) for v in row)
+    return {
+        "total": total,
+        "completed": completed,
+        "today_completed": today,
+        "week_completed": week,
+        "month_completed": month,
+    }
+
+
+def tasks_progress_query(user_id: int, now: Optional[datetime] = None):
+    """Весь прогресс одним запросом: условные агрегаты по диапазонам sent_at (индекс применим)."""
+    day, week, month = period_starts(now or datetime.now(timezone.utc))
+    done = Task.status == TaskStatus.completed.value
+
+    def done_since(start: datetime):
+        return func.count(case((and_(done, Task.sent_at >= start), 1)))
+
+    return select(
+        func.count(Task.id),
+        func.count(case((done, 1))),
+        func.count(case((and_(done, Task.sent_at >= day, Task.sent_at < day + timedelta(days=1)), 1))),
+        done_since(week),
+        done_since(month),
+    ).where(Task.user_id == user_id)
+
+
+def rollup_progress_query(user_id: int, now: Optional[datetime] = None):
+    """То же по дневным срезам: O(дней), а не O(заданий)."""
+    day, week, month = period_starts(now or datetime.now(timezone.utc))
+    p = UserDailyProgress
+
+    def done_since(start: date):
+        return func.sum(case((p.day >= start, p.completed), else_=0))
+
+    return select(
+        func.sum(p.total),
+        func.sum(p.completed),
+        func.sum(case((p.day == day.date(), p.completed), else_=0)),
+        done_since(week.date()),
+        done_since(month.date()),
+    ).where(p.user_id == user_id)
+
+
+def progress_from_tasks(db: Session, user_id: int, now: Optional[datetime] = None) -> dict:
+    return progress_result(db.execute(tasks_progress_query(user_id, now)).one())
+
+
+def progress_from_rollup(db: Session, user_id: int, now: Optional[datetime] = None) -> dict:
+    return progress_result(db.execute(rollup_progress_query(user_id, now)).one())
+
+
+def bump_rollup(db: Session, deltas: Iterable[Tuple[int, date, int, int]]) -> None:
+    """Прибавляет (user_id, day, +total, +completed) к срезам одним upsert, без commit."""
+    rows: List[dict] = [
+        {"user_id": user_id, "day": day, "total": total, "completed": completed}
+        for user_id, day, total, completed in deltas
+    ]
+    if not rows:
+        return
+    stmt = dialect_insert(db, UserDailyProgress)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserDailyProgress.user_id, UserDailyProgress.day],
+        set_={
+            "total": UserDailyProgress.total + stmt.excluded.total,
+            "completed": UserDailyProgress.completed + stmt.excluded.completed,
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def rebuild_rollup(db: Session, user_ids: Optional[List[int]] = None) -> None:
+    """Пересчитывает срезы по tasks и tasks_archive (при включении PROGRESS_ROLLUP_ENABLED на живой базе)."""
+    clear = delete(UserDailyProgress)
+    if user_ids is not None:
+        clear = clear.where(UserDailyProgress.user_id.in_(user_ids))
+    tasks = all_tasks(None if user_ids is None else lambda model: [model.user_id.in_(user_ids)])
+    day = func.date(tasks.c.sent_at)
+    source = select(
+        tasks.c.user_id,
+        day.label("day"),
+        func.count(tasks.c.id),
+        func.count(case((tasks.c.status == TaskStatus.completed.value, 1))),
+    ).group_by(tasks.c.user_id, day)
+    db.execute(clear)
+    db.execute(
+        UserDailyProgress.__table__.insert().from_select(["user_id", "day", "total", "completed"], source)
+    )
+    db.commit()
@@ -0,0 +1,217 @@
+"""Бюджет SQL-запросов на маршрут: сколько запросов к БД может сделать один HTTP-запрос.
+
+Маршрут объявляет бюджет декоратором под @router.get/...:
+
+    @router.get("/tasks/today")
+    @query_budget(4)
+    def get_today(...): ...
+
+При QUERY_BUDGET_MODE=warn|raise middleware записывает запросы, строки и время
+каждого HTTP-запроса (хуки SQLAlchemy на Engine) и сравнивает число запросов с
+бюджетом: warn пишет в лог, raise бросает QueryBudgetExceeded — так работают тесты.
+Фоновые задачи после отправки ответа в бюджет не входят.
+
+QUERY_BUDGET_EXPLAIN=true (только Postgres) дополнительно снимает EXPLAIN для
+каждого SELECT и считает нарушением Seq Scan по tasks и users, если маршрут не
+разрешил его явно (seq_scan=("users",)). Строки на Postgres — rowcount курсора,
+на SQLite известны только для INSERT/UPDATE/DELETE.
+"""
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Optional, Union
+
+from fastapi.routing import APIRoute
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# таблицы, полный просмотр которых на реальных объёмах недопустим
+WATCHED_TABLES = ("tasks", "users")
+_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+class QueryBudgetExceeded(Exception):
+    """Маршрут сделал больше запросов, чем объявил, или полный просмотр большой таблицы."""
+
+
+@dataclass(frozen=True)
+class Budget:
+    # число или функция без аргументов — для маршрутов, чья цена зависит от настроек (пачки bulk)
+    queries: Union[int, Callable[[], int]]
+    seq_scan: frozenset = frozenset()
+
+    def limit(self) -> int:
+        return self.queries() if callable(self.queries) else self.queries
+
+
+@dataclass
+class Query:
+    statement: str
+    rows: Optional[int]
+    seconds: float
+    plan: Optional[List[str]] = None
+
+
+@dataclass
+class QueryLog:
+    queries: List[Query] = field(default_factory=list)
+    # (таблица, запрос) для каждого найденного Seq Scan
+    seq_scans: List[tuple] = field(default_factory=list)
+    closed: bool = False
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def rows(self) -> int:
+        return sum(q.rows or 0 for q in self.queries)
+
+    @property
+    def seconds(self) -> float:
+        return sum(q.seconds for q in self.queries)
+
+
+_current: ContextVar[Optional[QueryLog]] = ContextVar("query_log", default=None)
+_explain = False
+
+
+def query_budget(queries: Union[int, Callable[[], int]], seq_scan: tuple = ()):
+    """Объявляет бюджет маршрута: не больше queries запросов, Seq Scan разрешён только по seq_scan."""
+    def decorator(endpoint):
+        endpoint.query_budget = Budget(queries, frozenset(seq_scan))
+        return endpoint
+
+    return decorator
+
+
+def budget_of(endpoint) -> Optional[Budget]:
+    return getattr(endpoint, "query_budget", None)
+
+
+@contextmanager
+def record() -> Iterator[QueryLog]:
+    """Записывает запросы блока кода в QueryLog (хуки должны быть подключены через listen())."""
+    log = QueryLog()
+    token = _current.set(log)
+    try:
+        yield log
+    finally:
+        log.closed = True
+        _current.reset(token)
+
+
+def _plan(conn, statement: str, parameters) -> List[str]:
+    # отдельный курсор: результат исходного запроса ещё не прочитан
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute("EXPLAIN " + statement, parameters)
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_budget_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    log = _current.get()
+    if log is None:
+        return
+    started = conn.info["query_budget_started"].pop()
+    if log.closed:
+        return
+    query = Query(statement, cursor.rowcount if cursor.rowcount >= 0 else None, time.perf_counter() - started)
+    if _explain and not executemany and conn.dialect.name == "postgresql" and statement.lstrip()[:6].upper() == "SELECT":
+        query.plan = _plan(conn, statement, parameters)
+        for table in _SEQ_SCAN.findall("\n".join(query.plan)):
+            if table in WATCHED_TABLES:
+                log.seq_scans.append((table, statement))
+    log.queries.append(query)
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and _current.get() is not None:
+        started = conn.info.get("query_budget_started")
+        if started:
+            started.pop()
+
+
+def listen(explain: bool = False) -> None:
+    """Подключает хуки ко всем движкам (и к sync_engine асинхронного)."""
+    global _explain
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    _explain = explain
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def check(route: str, budget: Optional[Budget], log: QueryLog) -> List[str]:
+    """Нарушения бюджета маршрута; пустой список — всё в порядке."""
+    if budget is None:
+        return [f"{route}: query budget is not declared ({log.count} queries)"]
+    problems = []
+    limit = budget.limit()
+    if log.count > limit:
+        statements = "\n  ".join(q.statement for q in log.queries)
+        problems.append(f"{route}: {log.count} queries, budget {limit}:\n  {statements}")
+    for table, statement in log.seq_scans:
+        if table not in budget.seq_scan:
+            problems.append(f"{route}: Seq Scan on {table}:\n  {statement}")
+    return problems
+
+
+class QueryBudgetMiddleware:
+    """ASGI-middleware: считает запросы каждого HTTP-запроса до отправки ответа и сверяет с бюджетом."""
+
+    def __init__(self, app, mode: str = "raise"):
+        self.app = app
+        self.mode = mode
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        log = QueryLog()
+        token = _current.set(log)
+
+        async def send_until_body_done(message):
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                # дальше — фоновые задачи, они живут вне бюджета маршрута
+                log.closed = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_until_body_done)
+        finally:
+            log.closed = True
+            _current.reset(token)
+        route = scope.get("route")
+        # бюджеты объявляют маршруты API; служебные (/metrics) не проверяются
+        if not isinstance(route, APIRoute):
+            return
+        problems = check(f"{scope['method']} {route.path}", budget_of(route.endpoint), log)
+        if not problems:
+            return
+        if self.mode == "raise":
+            raise QueryBudgetExceeded("\n".join(problems))
+        for problem in problems:
+            logger.warning("query budget: %s", problem)
+
+
+def install(app) -> None:
+    """Подключает хуки и middleware; вызывается из main при QUERY_BUDGET_MODE=warn|raise."""
+    listen(explain=settings.query_budget_explain)
+    app.add_middleware(QueryBudgetMiddleware, mode=settings.query_budget_mode)
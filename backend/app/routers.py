@@ -1,52 +1,118 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Header
+import math
+from datetime import date, datetime, timezone
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Request, Response, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 
 from .database import get_db
-from . import schemas
-from .models import User, Task
-from .security import verify_password, create_access_token, get_current_user, require_admin
-from .services import create_user, get_today_task, mark_task_completed, get_progress, list_tasks_for_user, create_daily_task, get_or_create_telegram_user
-from .exercises_store import load_exercises, add_exercise, remove_exercise
+from . import http_cache, schemas
+from .models import BulkJob, User, Task
+from .user_cache import CachedUser
+from .security import cached_user_by_id, create_access_token, get_current_user, require_admin, resolve_telegram_user
+from .passwords import hash_password_async, verify_and_update_async
+from .services import create_user, get_or_create_today_task, mark_task_completed, get_progress, list_tasks_page, iter_task_history, get_or_create_telegram_user, list_users_page, claim_bot_update, release_bot_update, update_delivery_settings, get_tasks_version
+from .pagination import NEXT_CURSOR_HEADER, decode_id_cursor, decode_task_cursor, encode_cursor
+from .database import SessionLocal
+from .exercises_store import catalog, list_exercises, add_exercise, remove_exercise
+from .delivery import local_today
+from .progress import utc_day
+from .export import DATASETS, FORMATS, MEDIA_TYPES, export_chunks, parquet_available
+from .bulk import complete_tasks_work, count_selected, create_job, generate_today_work, run_job
 from .config import settings
+from .query_budget import query_budget
 
 router = APIRouter(prefix="/api")
 
+# схемы ответов для кэшируемых GET: тело сериализуется один раз и отдаётся из http_cache
+TASK = TypeAdapter(schemas.TaskResponse)
+TASKS = TypeAdapter(list[schemas.TaskResponse])
+PROGRESS = TypeAdapter(schemas.ProgressResponse)
+EXERCISES = TypeAdapter(list[schemas.ExerciseResponse])
+
+
+def _user_by_email(db: Session, email: str) -> User | None:
+    return db.query(User).filter(User.email == email).first()
 
+
+# bcrypt ждём в пуле процессов через await: поток FastAPI на это время не занят,
+# запросы к БД (синхронная сессия) уходят в threadpool короткими вызовами
 @router.post("/users/register", response_model=schemas.UserResponse)
-def register_user(payload: schemas.UserRegisterRequest, db: Session = Depends(get_db)):
-    existing = db.query(User).filter(User.email == payload.email).first()
-    if existing:
+@query_budget(3)
+async def register_user(payload: schemas.UserRegisterRequest, db: Session = Depends(get_db)):
+    if await run_in_threadpool(_user_by_email, db, payload.email):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already used")
-    user = create_user(db, name=payload.name, email=payload.email, password=payload.password)
-    return user
+    password_hash = await hash_password_async(payload.password)
+    return await run_in_threadpool(create_user, db, name=payload.name, email=payload.email, password_hash=password_hash)
 
 
 @router.post("/auth/login", response_model=schemas.TokenResponse)
-def login(payload: schemas.LoginRequest, response: Response, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == payload.email).first()
-    if not user or not user.password_hash or not verify_password(payload.password, user.password_hash):
+@query_budget(3)
+async def login(payload: schemas.LoginRequest, response: Response, db: Session = Depends(get_db)):
+    user = await run_in_threadpool(_user_by_email, db, payload.email)
+    if not user or not user.password_hash:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect credentials")
-    token = create_access_token(subject=user.email)
+    valid, new_hash = await verify_and_update_async(payload.password, user.password_hash)
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect credentials")
+    if new_hash:
+        # стоимость bcrypt поменялась в конфиге — пересохраняем хэш при входе
+        user.password_hash = new_hash
+        await run_in_threadpool(db.commit)
+    token = create_access_token(subject=user.email, user_id=user.id, role=user.role)
     response.set_cookie("access_token", token, httponly=True, samesite="lax")
     return {"access_token": token, "token_type": "bearer"}
 
 
+@router.get("/me/delivery", response_model=schemas.DeliverySettingsResponse)
+@query_budget(2)
+def get_delivery_settings(user: CachedUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    return db.get(User, user.id)
+
+
+@router.put("/me/delivery", response_model=schemas.DeliverySettingsResponse)
+@query_budget(3)
+def put_delivery_settings(payload: schemas.DeliverySettings, user: CachedUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    return update_delivery_settings(db, user.id, payload.timezone, payload.daily_hour)
+
+
 @router.get("/tasks/today", response_model=schemas.TaskResponse)
-def get_today(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    task = get_today_task(db, user.id)
-    if not task:
-        # если задание ещё не создано сегодня — создадим
-        task = create_daily_task(db, user)
-    return task
+@query_budget(8)
+def get_today(request: Request, user: CachedUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    key = ("today", user.id, get_tasks_version(db, user.id), local_today(user.timezone))
+    etag, cached = http_cache.lookup(request, key)
+    if cached:
+        return cached
+    # если задание ещё не создано сегодня — создадим
+    return http_cache.store(key, etag, TASK, get_or_create_today_task(db, user))
+
+
+def page_limit(limit: int | None = Query(default=None, ge=1)) -> int:
+    return min(limit or settings.history_page_size, settings.history_max_page_size)
 
 
 @router.get("/tasks", response_model=list[schemas.TaskResponse])
-def list_tasks(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return list_tasks_for_user(db, user.id)
+@query_budget(4)
+def list_tasks(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = Depends(page_limit),
+    user: CachedUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    key = ("tasks", user.id, get_tasks_version(db, user.id), limit, cursor)
+    etag, cached = http_cache.lookup(request, key)
+    if cached:
+        return cached
+    tasks, next_cursor = list_tasks_page(db, user.id, limit, decode_task_cursor(cursor))
+    return http_cache.store(key, etag, TASKS, tasks, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
 
 
 @router.post("/tasks/complete/{task_id}", response_model=schemas.CompleteTaskResponse)
-def complete_task(task_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@query_budget(4)
+def complete_task(task_id: int, user: CachedUser = Depends(get_current_user), db: Session = Depends(get_db)):
     task = mark_task_completed(db, user.id, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -54,69 +120,259 @@ def complete_task(task_id: int, user: User = Depends(get_current_user), db: Sess
 
 
 @router.get("/progress", response_model=schemas.ProgressResponse)
-def progress(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return get_progress(db, user.id)
+@query_budget(3)
+def progress(request: Request, user: CachedUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    # периоды прогресса считаются по UTC-дням
+    key = ("progress", user.id, get_tasks_version(db, user.id), utc_day(datetime.now(timezone.utc)))
+    etag, cached = http_cache.lookup(request, key)
+    if cached:
+        return cached
+    return http_cache.store(key, etag, PROGRESS, get_progress(db, user.id))
 
 
 # Админ: пользователи, их задачи, упражнения
-@router.get("/admin/users", response_model=list[schemas.UserResponse])
-def admin_users(_: User = Depends(require_admin), db: Session = Depends(get_db)):
-    return db.query(User).all()
+@router.get("/admin/users", response_model=list[schemas.AdminUserResponse])
+@query_budget(3)
+def admin_users(
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Depends(page_limit),
+    role: str | None = None,
+    telegram_linked: bool | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    q: str | None = Query(default=None, min_length=1, max_length=255),
+    _: CachedUser = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    rows, next_after = list_users_page(
+        db,
+        limit,
+        after_id=decode_id_cursor(cursor),
+        role=role,
+        telegram_linked=telegram_linked,
+        created_from=created_from,
+        created_to=created_to,
+        q=q,
+    )
+    if next_after is not None:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([next_after])
+    return rows
 
 
 @router.get("/admin/users/{user_id}/tasks", response_model=list[schemas.TaskResponse])
-def admin_user_tasks(user_id: int, _: User = Depends(require_admin), db: Session = Depends(get_db)):
-    return list_tasks_for_user(db, user_id)
-
-
-@router.get("/admin/exercises", response_model=list[str])
-def admin_list_exercises(_: User = Depends(require_admin)):
-    return load_exercises()
-
-
-@router.post("/admin/exercises", response_model=list[str])
-def admin_add_exercise(text: str, _: User = Depends(require_admin)):
-    return add_exercise(text)
-
-
-@router.delete("/admin/exercises/{index}", response_model=list[str])
-def admin_delete_exercise(index: int, _: User = Depends(require_admin)):
-    return remove_exercise(index)
+@query_budget(3)
+def admin_user_tasks(
+    user_id: int,
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Depends(page_limit),
+    _: CachedUser = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    tasks, next_cursor = list_tasks_page(db, user_id, limit, decode_task_cursor(cursor))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return tasks
+
+
+@router.get("/admin/users/{user_id}/tasks/export")
+@query_budget(3)
+def admin_export_user_tasks(user_id: int, _: CachedUser = Depends(require_admin)):
+    """Вся история пользователя в NDJSON, построчно, без материализации списка."""
+
+    def rows():
+        # своя сессия: зависимость get_db закрывается раньше, чем ответ дочитан
+        db = SessionLocal()
+        try:
+            for chunk in iter_task_history(db, user_id):
+                yield "".join(schemas.TaskResponse.model_validate(task).model_dump_json() + "\n" for task in chunk)
+        finally:
+            db.close()
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+@router.get("/admin/export/{dataset}")
+@query_budget(2, seq_scan=("tasks", "users"))
+def admin_export(
+    dataset: str,
+    format: str = "csv",
+    since: date | None = None,
+    until: date | None = None,
+    _: CachedUser = Depends(require_admin),
+):
+    """Выгрузка tasks / users / exercises в CSV или Parquet потоком; since/until — по дню задания."""
+    if dataset not in DATASETS:
+        raise HTTPException(status_code=404, detail="Unknown dataset")
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail="Unknown format")
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+
+    def chunks():
+        db = SessionLocal()
+        try:
+            yield from export_chunks(db, dataset, format, since, until)
+        finally:
+            db.close()
+
+    filename = f"{dataset}.{format}"
+    return StreamingResponse(
+        chunks(), media_type=MEDIA_TYPES[format], headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/admin/exercises", response_model=list[schemas.ExerciseResponse])
+@query_budget(3)
+def admin_list_exercises(request: Request, _: CachedUser = Depends(require_admin), db: Session = Depends(get_db)):
+    items = list_exercises(db)
+    key = ("exercises", catalog.version)
+    etag, cached = http_cache.lookup(request, key)
+    if cached:
+        return cached
+    return http_cache.store(key, etag, EXERCISES, items)
+
+
+@router.post("/admin/exercises", response_model=list[schemas.ExerciseResponse])
+@query_budget(6)
+def admin_add_exercise(text: str, _: CachedUser = Depends(require_admin), db: Session = Depends(get_db)):
+    return add_exercise(db, text)
+
+
+@router.delete("/admin/exercises/{exercise_id}", response_model=list[schemas.ExerciseResponse])
+@query_budget(6)
+def admin_delete_exercise(exercise_id: int, _: CachedUser = Depends(require_admin), db: Session = Depends(get_db)):
+    items = remove_exercise(db, exercise_id)
+    if items is None:
+        raise HTTPException(status_code=404, detail="Exercise not found")
+    return items
 
 
 @router.post("/admin/generate_today/{user_id}")
-def admin_generate_today(user_id: int, _: User = Depends(require_admin), db: Session = Depends(get_db)):
+@query_budget(8)
+def admin_generate_today(user_id: int, _: CachedUser = Depends(require_admin), db: Session = Depends(get_db)):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    task = create_daily_task(db, user)
+    task = get_or_create_today_task(db, user)
     return {"task_id": task.id}
 
 
-@router.post("/bot/complete/{task_id}")
-def bot_complete_task(task_id: int, user_id: int, authorization: str | None = Header(default=None), db: Session = Depends(get_db)):
+def bulk_budget() -> int:
+    # inline-задание: запросы создания и статусов плюс ~5 на пачку; большие выборки уходят в фон
+    return 8 + 5 * math.ceil(settings.bulk_inline_limit / settings.bulk_chunk_size)
+
+
+def _start_bulk_job(kind: str, total: int, work, admin: CachedUser, db: Session, response: Response,
+                    background_tasks: BackgroundTasks) -> BulkJob:
+    job = create_job(db, kind, total, admin.id)
+    if total <= settings.bulk_inline_limit:
+        run_job(SessionLocal, job.id, work)
+        db.refresh(job)
+    else:
+        # большая выборка: отвечаем сразу, прогресс — в GET /admin/bulk/jobs/{id}
+        background_tasks.add_task(run_job, SessionLocal, job.id, work)
+        response.status_code = status.HTTP_202_ACCEPTED
+    return job
+
+
+@router.post("/admin/bulk/generate_today", response_model=schemas.BulkJobResponse)
+@query_budget(bulk_budget)
+def admin_bulk_generate_today(
+    payload: schemas.BulkGenerateRequest,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    admin: CachedUser = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    work = generate_today_work(payload, payload.notify)
+    return _start_bulk_job("generate_today", count_selected(db, payload), work, admin, db, response, background_tasks)
+
+
+@router.post("/admin/bulk/assign_text", response_model=schemas.BulkJobResponse)
+@query_budget(bulk_budget)
+def admin_bulk_assign_text(
+    payload: schemas.BulkAssignTextRequest,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    admin: CachedUser = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    work = generate_today_work(payload, payload.notify, text=payload.text, replace_pending=payload.replace_pending)
+    return _start_bulk_job("assign_text", count_selected(db, payload), work, admin, db, response, background_tasks)
+
+
+@router.post("/admin/bulk/complete", response_model=schemas.BulkJobResponse)
+@query_budget(bulk_budget)
+def admin_bulk_complete(
+    payload: schemas.BulkCompleteRequest,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    admin: CachedUser = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    work = complete_tasks_work(payload.task_ids)
+    return _start_bulk_job("complete", len(set(payload.task_ids)), work, admin, db, response, background_tasks)
+
+
+@router.get("/admin/bulk/jobs/{job_id}", response_model=schemas.BulkJobResponse)
+@query_budget(2)
+def admin_bulk_job(job_id: int, _: CachedUser = Depends(require_admin), db: Session = Depends(get_db)):
+    job = db.get(BulkJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def require_bot(authorization: str | None = Header(default=None)) -> None:
     if not settings.bot_internal_token or authorization != f"Bearer {settings.bot_internal_token}":
         raise HTTPException(status_code=401, detail="Unauthorized bot")
-    task = mark_task_completed(db, user_id, task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return {"success": True}
 
 
-@router.get("/bot/today")
-def bot_get_today(user_id: int, authorization: str | None = Header(default=None), db: Session = Depends(get_db)):
-    if not settings.bot_internal_token or authorization != f"Bearer {settings.bot_internal_token}":
-        raise HTTPException(status_code=401, detail="Unauthorized bot")
-    user = db.query(User).filter(User.id == user_id).first()
+def bot_user(telegram_id: str | None = None, user_id: int | None = None, db: Session = Depends(get_db)) -> CachedUser:
+    """Пользователь бота: по telegram_id через уникальный индекс или по уже известному боту user_id."""
+    if telegram_id is not None:
+        user = resolve_telegram_user(db, telegram_id)
+    elif user_id is not None:
+        user = cached_user_by_id(db, user_id)
+    else:
+        raise HTTPException(status_code=422, detail="telegram_id or user_id is required")
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    task = get_today_task(db, user.id)
+    return user
+
+
+@router.post("/bot/complete/{task_id}", dependencies=[Depends(require_bot)])
+@query_budget(4)
+def bot_complete_task(task_id: int, user: CachedUser = Depends(bot_user), db: Session = Depends(get_db)):
+    task = mark_task_completed(db, user.id, task_id)
     if not task:
-        task = create_daily_task(db, user)
-    return {"id": task.id, "text": task.text, "status": task.status}
+        raise HTTPException(status_code=404, detail="Task not found")
+    return {"success": True, "user_id": user.id}
+
+
+@router.get("/bot/today", dependencies=[Depends(require_bot)])
+@query_budget(8)
+def bot_get_today(user: CachedUser = Depends(bot_user), db: Session = Depends(get_db)):
+    task = get_or_create_today_task(db, user)
+    return {"id": task.id, "text": task.text, "status": task.status, "user_id": user.id}
+
+
+@router.post("/bot/updates/{update_id}/claim", dependencies=[Depends(require_bot)])
+@query_budget(1)
+def bot_claim_update(update_id: int, db: Session = Depends(get_db)):
+    return {"claimed": claim_bot_update(db, update_id)}
+
+
+@router.delete("/bot/updates/{update_id}/claim", dependencies=[Depends(require_bot)])
+@query_budget(1)
+def bot_release_update(update_id: int, db: Session = Depends(get_db)):
+    return {"released": release_bot_update(db, update_id)}
 
 
 @router.post("/telegram/register", response_model=schemas.UserResponse)
+@query_budget(4)
 def telegram_register(payload: schemas.UserRegisterTelegramRequest, db: Session = Depends(get_db)):
     user = get_or_create_telegram_user(db, telegram_id=payload.telegram_id, name=payload.name, email=payload.email)
     return user
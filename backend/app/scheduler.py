@@ -1,46 +1,350 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
 from sqlalchemy.orm import Session
 from .database import SessionLocal
 from .config import settings
-from .models import User
-from .services import get_today_task, create_daily_task
-import httpx
+from .services import (
+    iter_user_chunks,
+    create_daily_tasks_bulk,
+    prune_bot_updates,
+    due_user_chunk,
+    has_due_users,
+    schedule_next_delivery,
+    schedule_missing_deliveries,
+)
+from .archive import archive_old_tasks
+from .coordination import PROCESS_ID, ShardClaim, ShardedRun, acquire_lease, prune_runs
+from .exercises_store import ExerciseItem, load_exercises
+from .telegram import DispatchStats, TelegramDispatcher, enqueue_messages
+from .metrics import timed_job
+
+if TYPE_CHECKING:
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+
+logger = logging.getLogger(__name__)
+
+scheduler: "BackgroundScheduler | None" = None
+
+LEADER_LEASE = "scheduler-leader"
+
+
+class ShardLost(Exception):
+    """Аренда шарда истекла, и его забрал другой процесс."""
 
 
-scheduler: BackgroundScheduler | None = None
+@dataclass
+class FanOutStats:
+    users_scanned: int = 0
+    tasks_created: int = 0
+    messages_sent: int = 0
+    messages_failed: int = 0
+    generate_seconds: float = 0.0
+    total_seconds: float = 0.0
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    @property
+    def tasks_per_second(self) -> float:
+        return self.tasks_created / self.generate_seconds if self.generate_seconds else 0.0
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.messages_sent / self.total_seconds if self.total_seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "users_scanned": self.users_scanned,
+            "tasks_created": self.tasks_created,
+            "messages_sent": self.messages_sent,
+            "messages_failed": self.messages_failed,
+            "generate_seconds": round(self.generate_seconds, 3),
+            "total_seconds": round(self.total_seconds, 3),
+            "tasks_per_second": round(self.tasks_per_second, 1),
+            "messages_per_second": round(self.messages_per_second, 1),
+        }
+
+
+DAILY_MESSAGE_TEMPLATE = "Ваше задание на сегодня: {text}"
 
 
 def send_telegram_message(telegram_id: str, text: str):
+    """Ставит сообщение в outbox; доставит его ближайший проход диспетчера."""
     if not settings.telegram_bot_token or not telegram_id:
         return
-    url = f"https://api.telegram.org/bot{settings.telegram_bot_token}/sendMessage"
+    db: Session = SessionLocal()
     try:
-        with httpx.Client(timeout=10) as client:
-            client.post(url, json={"chat_id": telegram_id, "text": text})
-    except Exception:
-        pass
+        enqueue_messages(db, [(telegram_id, text)])
+        db.commit()
+    finally:
+        db.close()
 
 
-def send_daily_tasks():
+def _load_exercises() -> list[ExerciseItem]:
     db: Session = SessionLocal()
     try:
-        users = db.query(User).all()
-        for user in users:
-            task = get_today_task(db, user.id)
-            if not task:
-                task = create_daily_task(db, user)
-                if user.telegram_id:
-                    send_telegram_message(user.telegram_id, f"Ваше задание на сегодня: {task.text}")
+        return load_exercises(db)
     finally:
         db.close()
 
 
+def is_leader() -> bool:
+    """Держит ли процесс аренду лидера (в режиме local — всегда да). Вызов продлевает аренду."""
+    if settings.scheduler_mode != "leader":
+        return True
+    with SessionLocal() as db:
+        return acquire_lease(db, LEADER_LEASE, PROCESS_ID, settings.scheduler_lease_seconds)
+
+
+def daily_run(shards: int | None = None) -> ShardedRun:
+    run_key = f"daily:{datetime.now(timezone.utc).date().isoformat()}"
+    return ShardedRun(SessionLocal, run_key, shards or settings.scheduler_shards, settings.scheduler_lease_seconds)
+
+
+def _generate_chunk(
+    after_id: int,
+    batch_size: int,
+    exercises: list[ExerciseItem],
+    notify: bool,
+    until_id: int | None = None,
+    run: ShardedRun | None = None,
+    claim: ShardClaim | None = None,
+):
+    """Обрабатывает одну пачку пользователей в собственной сессии (вызывается из потока)."""
+    db: Session = SessionLocal()
+    try:
+        users = next(iter_user_chunks(db, batch_size, after_id=after_id, until_id=until_id), [])
+        if not users:
+            return None, 0, []
+        created = create_daily_tasks_bulk(db, users, exercises, DAILY_MESSAGE_TEMPLATE if notify else None)
+        # чекпоинт пишется после commit пачки: если процесс упадёт между ними, повтор пачки
+        # ничего не задублирует — существующие задания отсечёт uq_tasks_user_task_date
+        if run is not None and not run.checkpoint(db, claim, users[-1].id):
+            raise ShardLost()
+        return users[-1].id, len(users), created
+    finally:
+        db.close()
+
+
+def _deliver_chunk(now: datetime, batch_size: int, exercises: list[ExerciseItem], notify: bool,
+                   run: ShardedRun | None = None, claim: ShardClaim | None = None):
+    """Создаёт задания пачке пользователей, чья доставка наступила, и переносит им доставку на завтра."""
+    db: Session = SessionLocal()
+    try:
+        after_id, until_id = (claim.last_user_id, claim.end_id) if claim is not None else (None, None)
+        users = due_user_chunk(db, now, batch_size, after_id, until_id)
+        if not users:
+            return 0, []
+        created = create_daily_tasks_bulk(db, users, exercises, DAILY_MESSAGE_TEMPLATE if notify else None)
+        # пока доставка не перенесена, пользователь остаётся в выборке; повтор после падения безопасен
+        schedule_next_delivery(db, users, now)
+        # прогресс шарда — сам next_delivery_at, чекпоинт только продлевает аренду
+        if run is not None and not run.checkpoint(db, claim, claim.last_user_id):
+            raise ShardLost()
+        return len(users), created
+    finally:
+        db.close()
+
+
+async def _deliver_range(stats: FanOutStats, now: datetime, batch_size: int, exercises: list[ExerciseItem],
+                         notify: bool, run=None, claim=None) -> None:
+    while True:
+        scanned, created = await asyncio.to_thread(_deliver_chunk, now, batch_size, exercises, notify, run, claim)
+        if not scanned:
+            return
+        stats.users_scanned += scanned
+        stats.tasks_created += len(created)
+
+
+async def _generate_range(stats: FanOutStats, after_id: int, until_id: int | None, batch_size: int,
+                          exercises: list[ExerciseItem], notify: bool, run=None, claim=None) -> None:
+    while True:
+        # БД-часть синхронная — уносим её в поток
+        last_id, scanned, created = await asyncio.to_thread(
+            _generate_chunk, after_id, batch_size, exercises, notify, until_id, run, claim
+        )
+        if last_id is None:
+            return
+        after_id = last_id
+        stats.users_scanned += scanned
+        stats.tasks_created += len(created)
+
+
+async def _fan_out(
+    batch_size: int,
+    concurrency: int,
+    run: ShardedRun | None = None,
+    dispatch: bool = True,
+    due_at: datetime | None = None,
+) -> FanOutStats:
+    stats = FanOutStats()
+    exercises = await asyncio.to_thread(_load_exercises)
+    notify = bool(settings.telegram_bot_token)
+    generated = asyncio.Event()
+    delivery_task = None
+    if notify and dispatch:
+        # Диспетчер разбирает outbox параллельно с генерацией следующих пачек.
+        # При нескольких процессах шлёт только лидер: лимит Telegram общий на бота.
+        dispatcher = TelegramDispatcher(SessionLocal, concurrency=concurrency)
+        delivery_task = asyncio.create_task(dispatcher.drain(stop=generated))
+    try:
+        if run is None:
+            if due_at is not None:
+                await _deliver_range(stats, due_at, batch_size, exercises, notify)
+            else:
+                await _generate_range(stats, 0, None, batch_size, exercises, notify)
+        else:
+            while (claim := await asyncio.to_thread(run.claim)) is not None:
+                try:
+                    if due_at is not None:
+                        await _deliver_range(stats, due_at, batch_size, exercises, notify, run, claim)
+                    else:
+                        await _generate_range(stats, claim.last_user_id, claim.end_id, batch_size, exercises, notify, run, claim)
+                except ShardLost:
+                    logger.warning("shard %s of %s was taken over by another worker", claim.shard, claim.run_key)
+                    continue
+                await asyncio.to_thread(run.finish, claim)
+        stats.generate_seconds = time.perf_counter() - stats._started
+    finally:
+        generated.set()
+    if delivery_task is not None:
+        delivery = await delivery_task
+        stats.messages_sent = delivery.sent
+        stats.messages_failed = delivery.failed
+    stats.total_seconds = time.perf_counter() - stats._started
+    return stats
+
+
+def _log_fan_out(stats: FanOutStats) -> None:
+    logger.info(
+        "daily fan-out: %(users_scanned)s users, %(tasks_created)s tasks (%(tasks_per_second)s/s), "
+        "%(messages_sent)s sent / %(messages_failed)s failed (%(messages_per_second)s/s) in %(total_seconds)ss",
+        stats.as_dict(),
+    )
+
+
+def send_daily_tasks(batch_size: int | None = None, concurrency: int | None = None, shards: int | None = None) -> FanOutStats:
+    """Рассылка всем пользователям сразу (ручной запуск, бенчмарки); по расписанию работает deliver_due_tasks."""
+    batch_size = batch_size or settings.scheduler_batch_size
+    concurrency = concurrency or settings.telegram_send_concurrency
+    if settings.scheduler_mode == "leader":
+        # все процессы планируют один и тот же запуск и разбирают его шарды
+        run = daily_run(shards)
+        run.plan()
+        stats = asyncio.run(_fan_out(batch_size, concurrency, run, dispatch=is_leader()))
+    else:
+        stats = asyncio.run(_fan_out(batch_size, concurrency))
+    _log_fan_out(stats)
+    return stats
+
+
+def deliver_due_tasks(now: datetime | None = None, batch_size: int | None = None) -> FanOutStats | None:
+    """Минутный тик: задания получают только пользователи, у которых наступил их местный час доставки.
+
+    Выборка идёт по индексу next_delivery_at, поэтому утренняя нагрузка
+    распределяется по часовым поясам, а не приходит одним всплеском. В режиме
+    leader тик выполняют все процессы: минута, в которую кто-то должен получить
+    задание, делится на шарды по users.id, как и ручная рассылка. Тик только
+    ставит сообщения в outbox — шлёт их один диспетчер лидера (dispatch_outbox).
+    """
+    now = (now or datetime.now(timezone.utc)).replace(second=0, microsecond=0)
+    batch_size = batch_size or settings.scheduler_batch_size
+    leader = is_leader()
+    with SessionLocal() as db:
+        if leader:
+            while schedule_missing_deliveries(db, batch_size):
+                pass
+        # пустые минуты не заводят запуск и шарды
+        if not has_due_users(db, now):
+            return FanOutStats()
+    run = None
+    if settings.scheduler_mode == "leader":
+        run = ShardedRun(SessionLocal, f"due:{now.isoformat()}", settings.scheduler_shards, settings.scheduler_lease_seconds)
+        run.plan()
+    stats = asyncio.run(_fan_out(batch_size, settings.telegram_send_concurrency, run, dispatch=False, due_at=now))
+    if stats.users_scanned:
+        _log_fan_out(stats)
+        if leader:
+            _wake_outbox()
+    return stats
+
+
+def _wake_outbox() -> None:
+    """Запускает проход outbox сразу, не дожидаясь его минутного интервала."""
+    if scheduler is None:
+        return
+    job = scheduler.get_job("dispatch_outbox")
+    if job is not None:
+        job.modify(next_run_time=datetime.now(timezone.utc))
+
+
+def resume_daily_tasks() -> FanOutStats | None:
+    """Дорабатывает шарды сегодняшнего запуска, брошенные упавшими процессами."""
+    if settings.scheduler_mode != "leader":
+        return None
+    run = daily_run()
+    if not run.exists() or not run.pending():
+        return None
+    stats = asyncio.run(
+        _fan_out(settings.scheduler_batch_size, settings.telegram_send_concurrency, run, dispatch=is_leader())
+    )
+    if stats.users_scanned:
+        _log_fan_out(stats)
+    return stats
+
+
+def dispatch_outbox() -> DispatchStats | None:
+    """Единственный отправитель по расписанию: сообщения минутного тика, ретраи после 429/таймаутов и прочее из outbox."""
+    if not settings.telegram_bot_token or not is_leader():
+        return None
+    return asyncio.run(TelegramDispatcher(SessionLocal).drain())
+
+
+def prune_processed_updates() -> int:
+    if not is_leader():
+        return 0
+    older_than = datetime.now(timezone.utc) - timedelta(hours=settings.bot_update_retention_hours)
+    with SessionLocal() as db:
+        return prune_bot_updates(db, older_than)
+
+
+def prune_delivery_runs() -> int:
+    """Чистит запуски минутного тика старше суток: они нужны только в свою минуту."""
+    if not is_leader():
+        return 0
+    with SessionLocal() as db:
+        return prune_runs(db, "due:", datetime.now(timezone.utc) - timedelta(days=1))
+
+
+def archive_tasks_job() -> int:
+    """Переносит старые задания в tasks_archive (TASK_ARCHIVE_AFTER_DAYS > 0)."""
+    if settings.task_archive_after_days <= 0 or not is_leader():
+        return 0
+    with SessionLocal() as db:
+        return archive_old_tasks(db)
+
+
 def init_scheduler():
     global scheduler
-    if scheduler:
+    if scheduler or settings.scheduler_mode == "off":
         return scheduler
-    scheduler = BackgroundScheduler(timezone="Europe/Moscow")
-    scheduler.add_job(send_daily_tasks, CronTrigger(hour=settings.bot_daily_hour, minute=0))
+    # apscheduler грузится только там, где планировщик действительно запускается
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    scheduler = BackgroundScheduler(timezone="UTC")
+    scheduler.add_job(timed_job("deliver_due_tasks", deliver_due_tasks), CronTrigger(minute="*"), max_instances=1, coalesce=True)
+    scheduler.add_job(timed_job("resume_daily_tasks", resume_daily_tasks), IntervalTrigger(minutes=1), max_instances=1, coalesce=True)
+    scheduler.add_job(
+        timed_job("dispatch_outbox", dispatch_outbox), IntervalTrigger(minutes=1), id="dispatch_outbox", max_instances=1, coalesce=True
+    )
+    scheduler.add_job(timed_job("prune_processed_updates", prune_processed_updates), IntervalTrigger(hours=1), max_instances=1, coalesce=True)
+    scheduler.add_job(timed_job("prune_delivery_runs", prune_delivery_runs), IntervalTrigger(hours=1), max_instances=1, coalesce=True)
+    scheduler.add_job(timed_job("archive_tasks", archive_tasks_job), CronTrigger(hour=3, minute=30), max_instances=1, coalesce=True)
     scheduler.start()
     return scheduler
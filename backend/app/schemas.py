@@ -1,7 +1,9 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
 from typing import Optional, List
 from datetime import datetime
 
+from .delivery import is_valid_timezone
+
 
 class UserRegisterRequest(BaseModel):
     name: str
@@ -25,6 +27,32 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 
+class AdminUserResponse(UserResponse):
+    telegram_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    task_count: int = 0
+    completed_count: int = 0
+
+
+class DeliverySettings(BaseModel):
+    timezone: str
+    daily_hour: int = Field(ge=0, le=23)
+
+    @field_validator("timezone")
+    @classmethod
+    def known_timezone(cls, value: str) -> str:
+        if not is_valid_timezone(value):
+            raise ValueError("Unknown timezone")
+        return value
+
+
+class DeliverySettingsResponse(DeliverySettings):
+    next_delivery_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
@@ -45,6 +73,14 @@ class TaskResponse(BaseModel):
         from_attributes = True
 
 
+class ExerciseResponse(BaseModel):
+    id: int
+    text: str
+
+    class Config:
+        from_attributes = True
+
+
 class ProgressResponse(BaseModel):
     total: int
     completed: int
@@ -56,3 +92,52 @@ class ProgressResponse(BaseModel):
 class CompleteTaskResponse(BaseModel):
     success: bool
     task: TaskResponse
+
+
+class UserSelection(BaseModel):
+    """Кому применять массовую операцию: явный список id или фильтры как в /admin/users."""
+
+    user_ids: Optional[List[int]] = Field(default=None, min_length=1, max_length=100000)
+    all_users: bool = False
+    role: Optional[str] = None
+    telegram_linked: Optional[bool] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    q: Optional[str] = Field(default=None, min_length=1, max_length=255)
+
+    @model_validator(mode="after")
+    def not_empty(self):
+        filters = (self.role, self.telegram_linked, self.created_from, self.created_to, self.q)
+        if self.user_ids is None and not self.all_users and all(f is None for f in filters):
+            raise ValueError("Specify user_ids, filters or all_users")
+        return self
+
+
+class BulkGenerateRequest(UserSelection):
+    notify: bool = False
+
+
+class BulkAssignTextRequest(UserSelection):
+    text: str = Field(min_length=1, max_length=1024)
+    notify: bool = False
+    # заменить текст уже выданных, но не выполненных сегодняшних заданий
+    replace_pending: bool = False
+
+
+class BulkCompleteRequest(BaseModel):
+    task_ids: List[int] = Field(min_length=1, max_length=100000)
+
+
+class BulkJobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str
+    total: int
+    processed: int
+    affected: int
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
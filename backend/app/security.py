@@ -3,29 +3,40 @@ from typing import Optional
 
 from fastapi import Depends, HTTPException, status, Request
 from jose import jwt, JWTError
-from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from .config import settings
-from .database import get_db
+from .database import get_db, get_async_db
 from .models import User
+from .user_cache import CachedUser, telegram_identity, user_cache
+from .passwords import hash_password, verify_and_update
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 ALGORITHM = "HS256"
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return hash_password(password)
 
 
 def verify_password(plain_password: str, password_hash: str) -> bool:
-    return pwd_context.verify(plain_password, password_hash)
+    return verify_and_update(plain_password, password_hash)[0]
 
 
-def create_access_token(subject: str, expires_minutes: int | None = None) -> str:
+def create_access_token(
+    subject: str,
+    expires_minutes: int | None = None,
+    user_id: int | None = None,
+    role: str | None = None,
+) -> str:
     expire_minutes = expires_minutes or settings.jwt_expire_minutes
     expire = datetime.now(timezone.utc) + timedelta(minutes=expire_minutes)
     to_encode = {"sub": subject, "exp": expire}
+    if user_id is not None:
+        to_encode["uid"] = user_id
+    if role is not None:
+        to_encode["role"] = role
     return jwt.encode(to_encode, settings.jwt_secret_key, algorithm=ALGORITHM)
 
 
@@ -40,7 +51,7 @@ def get_token_from_request(request: Request) -> Optional[str]:
     return None
 
 
-def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
+def get_token_payload(request: Request) -> dict:
     token = get_token_from_request(request)
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
@@ -51,14 +62,68 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    return payload
 
-    user = db.query(User).filter(User.email == subject).first()
+
+def _user_not_found():
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+
+
+def get_current_user(request: Request, db: Session = Depends(get_db)) -> CachedUser:
+    payload = get_token_payload(request)
+    user_id = payload.get("uid")
+    if user_id is not None:
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            return cached
+        user = db.get(User, user_id)
+    else:
+        # токены, выданные до появления uid
+        user = db.query(User).filter(User.email == payload["sub"]).first()
     if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    return user
+        raise _user_not_found()
+    return user_cache.put(user)
+
+
+def cached_user_by_id(db: Session, user_id: int) -> Optional[CachedUser]:
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+    user = db.get(User, user_id)
+    return user_cache.put(user) if user else None
 
 
-def require_admin(user: User = Depends(get_current_user)) -> User:
+def resolve_telegram_user(db: Session, telegram_id: str) -> Optional[CachedUser]:
+    """Пользователь по telegram_id: из кэшей процесса или одним запросом по уникальному индексу."""
+    user_id = telegram_identity.get(telegram_id)
+    if user_id is not None:
+        cached = user_cache.get(user_id)
+        if cached is not None and cached.telegram_id == telegram_id:
+            return cached
+    user = db.scalars(select(User).where(User.telegram_id == telegram_id)).first()
+    if user is None:
+        return None
+    telegram_identity.put(telegram_id, user.id)
+    return user_cache.put(user)
+
+
+def require_admin(user: CachedUser = Depends(get_current_user)) -> CachedUser:
     if user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
     return user
+
+
+async def get_current_user_async(request: Request, db: AsyncSession = Depends(get_async_db)) -> CachedUser:
+    payload = get_token_payload(request)
+    user_id = payload.get("uid")
+    if user_id is not None:
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            return cached
+        user = await db.get(User, user_id)
+    else:
+        user = (await db.execute(select(User).where(User.email == payload["sub"]))).scalar_one_or_none()
+    if not user:
+        raise _user_not_found()
+    return user_cache.put(user)
+
@@ -1,11 +1,20 @@
-from datetime import datetime, timedelta, timezone
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple, Union
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import Row, case, delete, func, or_, select, tuple_, update
 
-from .models import User, Task, TaskStatus
+from .archive import all_tasks
+from .config import settings
+from .database import dialect_insert
+from .models import User, Task, TaskArchive, TaskStatus, ProcessedUpdate
+from .progress import bump_rollup, progress_from_rollup, progress_from_tasks, utc_day
 from .security import get_password_hash
-from .exercises_store import load_exercises
+from .exercises_store import ExerciseItem, catalog, load_exercises
+from .telegram import enqueue_messages
+from .pagination import encode_cursor
+from .delivery import local_today, next_delivery_at
+from .metrics import TASKS_GENERATED, count
+from .user_cache import telegram_identity
 
 
 DEFAULT_TASKS = [
@@ -17,6 +26,17 @@ DEFAULT_TASKS = [
 ]
 
 
+def task_content(exercise: Union[ExerciseItem, str]) -> dict:
+    """Колонки содержимого задания: ссылка на упражнение каталога или свой текст (админ, пустой каталог)."""
+    if isinstance(exercise, ExerciseItem):
+        return {"exercise_id": exercise.id, "custom_text": None}
+    return {"exercise_id": None, "custom_text": exercise}
+
+
+def exercise_text(exercise: Union[ExerciseItem, str]) -> str:
+    return exercise.text if isinstance(exercise, ExerciseItem) else exercise
+
+
 def ensure_admin(db: Session, admin_email: str, admin_password: str) -> User:
     user = db.query(User).filter(User.email == admin_email).first()
     if user:
@@ -33,9 +53,26 @@ def ensure_admin(db: Session, admin_email: str, admin_password: str) -> User:
     return user
 
 
-def create_user(db: Session, name: str, email: str, password: Optional[str] = None, telegram_id: Optional[str] = None) -> User:
-    user = User(name=name, email=email, telegram_id=telegram_id)
-    if password:
+def create_user(
+    db: Session,
+    name: str,
+    email: str,
+    password: Optional[str] = None,
+    telegram_id: Optional[str] = None,
+    password_hash: Optional[str] = None,
+) -> User:
+    """password_hash — уже посчитанный хэш (async-маршруты считают его, не занимая поток)."""
+    user = User(
+        name=name,
+        email=email,
+        telegram_id=telegram_id,
+        timezone=settings.default_timezone,
+        daily_hour=settings.bot_daily_hour,
+        next_delivery_at=next_delivery_at(settings.default_timezone, settings.bot_daily_hour),
+    )
+    if password_hash:
+        user.password_hash = password_hash
+    elif password:
         user.password_hash = get_password_hash(password)
     db.add(user)
     db.commit()
@@ -44,6 +81,8 @@ def create_user(db: Session, name: str, email: str, password: Optional[str] = No
 
 
 def get_or_create_telegram_user(db: Session, telegram_id: str, name: str, email: str) -> User:
+    # регистрация может перепривязать telegram_id: кэш бота в этом процессе должен перечитать его
+    telegram_identity.invalidate(telegram_id)
     user = db.query(User).filter(User.telegram_id == telegram_id).first()
     if user:
         if user.name != name or user.email != email:
@@ -61,75 +100,407 @@ def get_or_create_telegram_user(db: Session, telegram_id: str, name: str, email:
     return create_user(db, name=name, email=email, telegram_id=telegram_id)
 
 
-def get_today_task(db: Session, user_id: int) -> Optional[Task]:
-    today = datetime.now(timezone.utc).date()
+def get_today_task(db: Session, user) -> Optional[Task]:
+    """Задание на «сегодня» в часовом поясе пользователя (user — User или CachedUser)."""
+    today = local_today(user.timezone)
+    task = db.scalars(select(Task).where(Task.user_id == user.id, Task.task_date == today)).first()
+    if task:
+        catalog.resolve(db, [task])
+    return task
+
+
+def get_or_create_today_task(db: Session, user, text: Optional[str] = None) -> Task:
+    """Сегодняшнее задание пользователя; создаёт его, если ещё нет.
+
+    Параллельные вызовы (веб, бот, рассылка) не плодят дублей: вставка идёт через
+    ON CONFLICT DO NOTHING по (user_id, task_date), проигравший гонку перечитывает строку.
+    """
+    task = get_today_task(db, user)
+    if task:
+        return task
+    user_id = user.id
+    # курсор ротации двигается в той же транзакции; если вставка проиграет гонку, откатится вместе с ней
+    cursor = db.scalar(advance_exercise_cursor(user_id))
+    if text:
+        exercise = text
+    else:
+        exercises = load_exercises(db) or DEFAULT_TASKS
+        exercise = exercises[(cursor - 1) % len(exercises)]
+    now = datetime.now(timezone.utc)
+    task = db.scalars(
+        dialect_insert(db, Task)
+        .values(
+            user_id=user_id, sent_at=now, task_date=local_today(user.timezone, now), status=TaskStatus.pending.value,
+            **task_content(exercise),
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "task_date"])
+        .returning(Task)
+    ).first()
+    if task is None:
+        db.rollback()
+        return get_today_task(db, user)
+    if settings.progress_rollup_enabled:
+        bump_rollup(db, [(user_id, now.date(), 1, 0)])
+    db.commit()
+    count(TASKS_GENERATED, "on_demand")
+    return task
+
+
+def advance_exercise_cursor(user_id: int):
+    """UPDATE users SET exercise_cursor = exercise_cursor + 1 ... RETURNING новое значение.
+
+    Заодно растёт tasks_version: задание создаётся в этой же транзакции.
+    """
     return (
-        db.query(Task)
-        .filter(Task.user_id == user_id)
-        .filter(func.date(Task.sent_at) == today)
-        .order_by(Task.id.desc())
-        .first()
+        update(User)
+        .where(User.id == user_id)
+        .values(exercise_cursor=User.exercise_cursor + 1, tasks_version=User.tasks_version + 1)
+        .returning(User.exercise_cursor)
     )
 
 
+def bump_tasks_version(user_ids):
+    """UPDATE, сбрасывающий ETag и кэш ответов для заданий этих пользователей (выполняется в транзакции изменения)."""
+    return (
+        update(User)
+        .where(User.id.in_(user_ids))
+        .values(tasks_version=User.tasks_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def get_tasks_version(db: Session, user_id: int) -> int:
+    return db.scalar(select(User.tasks_version).where(User.id == user_id)) or 0
+
+
 def create_daily_task(db: Session, user: User, text: Optional[str] = None) -> Task:
-    if not text:
-        exercises = load_exercises() or DEFAULT_TASKS
-        count = db.query(Task).filter(Task.user_id == user.id).count()
-        text = exercises[count % len(exercises)]
-    task = Task(user_id=user.id, text=text)
-    db.add(task)
+    return get_or_create_today_task(db, user, text)
+
+
+def _prefix_match(db: Session, column, prefix: str):
+    """Поиск по префиксу в колонке *_lower, идущий по её индексу.
+
+    Префикс приводится к нижнему регистру так же, как колонка (str.lower), поэтому
+    кириллица совпадает на любой СУБД. Postgres: LIKE 'abc%' по индексу с
+    text_pattern_ops; SQLite не применяет индекс к LIKE, поэтому там — эквивалентный диапазон.
+    """
+    prefix = prefix.lower()
+    if db.get_bind().dialect.name == "sqlite":
+        return column.between(prefix, prefix + "\U0010ffff")
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return column.like(escaped + "%", escape="\\")
+
+
+def user_filters(
+    db: Session,
+    role: Optional[str] = None,
+    telegram_linked: Optional[bool] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    q: Optional[str] = None,
+) -> list:
+    """Условия WHERE по users для фильтров админки (список пользователей, массовые операции)."""
+    conditions = []
+    if role:
+        conditions.append(User.role == role)
+    if telegram_linked is not None:
+        conditions.append(User.telegram_id.is_not(None) if telegram_linked else User.telegram_id.is_(None))
+    if created_from is not None:
+        conditions.append(User.created_at >= created_from)
+    if created_to is not None:
+        conditions.append(User.created_at < created_to)
+    if q:
+        prefix = q.strip()
+        conditions.append(or_(_prefix_match(db, User.email_lower, prefix), _prefix_match(db, User.name_lower, prefix)))
+    return conditions
+
+
+def list_users_page(
+    db: Session,
+    limit: int,
+    after_id: Optional[int] = None,
+    role: Optional[str] = None,
+    telegram_linked: Optional[bool] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    q: Optional[str] = None,
+) -> Tuple[List[dict], Optional[int]]:
+    """Страница пользователей для админки со счётчиками заданий.
+
+    Два запроса на страницу: сами пользователи (keyset по id) и один
+    сгруппированный подсчёт заданий (горячих и архивных) для всех пользователей страницы.
+    Возвращает строки и id, с которого начинать следующую страницу.
+    """
+    query = select(User).where(*user_filters(db, role, telegram_linked, created_from, created_to, q))
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+    users = db.scalars(query.order_by(User.id).limit(limit + 1)).all()
+    next_after = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_after = users[-1].id
+
+    counts = {}
+    if users:
+        ids = [u.id for u in users]
+        # архивные задания тоже в счёт: фильтр по user_id внутри обеих частей UNION
+        tasks = all_tasks(lambda model: [model.user_id.in_(ids)])
+        counts = {
+            row.user_id: row
+            for row in db.execute(
+                select(
+                    tasks.c.user_id,
+                    func.count(tasks.c.id).label("task_count"),
+                    func.count(case((tasks.c.status == TaskStatus.completed.value, 1))).label("completed_count"),
+                ).group_by(tasks.c.user_id)
+            )
+        }
+    rows = []
+    for u in users:
+        c = counts.get(u.id)
+        rows.append({
+            "id": u.id,
+            "name": u.name,
+            "email": u.email,
+            "role": u.role,
+            "telegram_id": u.telegram_id,
+            "created_at": u.created_at,
+            "task_count": c.task_count if c else 0,
+            "completed_count": c.completed_count if c else 0,
+        })
+    return rows, next_after
+
+
+def iter_user_chunks(
+    db: Session, batch_size: int, after_id: int = 0, until_id: Optional[int] = None
+) -> Iterator[List[Row]]:
+    """Keyset-пагинация по users.id: без OFFSET и без загрузки всей таблицы.
+
+    Отдаёт лёгкие строки (id, telegram_id, exercise_cursor, timezone) вместо ORM-объектов —
+    они не протухают после commit и не тянут ленивые загрузки.
+    """
+    last_id = after_id
+    while True:
+        query = select(User.id, User.telegram_id, User.exercise_cursor, User.timezone).where(User.id > last_id)
+        if until_id is not None:
+            query = query.where(User.id <= until_id)
+        users = db.execute(query.order_by(User.id).limit(batch_size)).all()
+        if not users:
+            return
+        yield users
+        last_id = users[-1].id
+
+
+def due_user_chunk(
+    db: Session, now: datetime, batch_size: int, after_id: Optional[int] = None, until_id: Optional[int] = None
+) -> List[Row]:
+    """Пользователи, чья доставка наступила к now: диапазонное чтение по ix_users_next_delivery.
+
+    after_id/until_id ограничивают выборку шардом (after_id, until_id] по users.id.
+    """
+    query = select(User.id, User.telegram_id, User.exercise_cursor, User.timezone, User.daily_hour).where(
+        User.next_delivery_at <= now
+    )
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+    if until_id is not None:
+        query = query.where(User.id <= until_id)
+    return db.execute(query.order_by(User.next_delivery_at, User.id).limit(batch_size)).all()
+
+
+def has_due_users(db: Session, now: datetime) -> bool:
+    return db.scalar(select(User.id).where(User.next_delivery_at <= now).limit(1)) is not None
+
+
+def schedule_next_delivery(db: Session, users: List[Row], now: datetime) -> None:
+    """Переносит доставку на следующий местный daily_hour:00 после now."""
+    db.execute(
+        update(User),
+        [{"id": u.id, "next_delivery_at": next_delivery_at(u.timezone, u.daily_hour, now)} for u in users],
+    )
     db.commit()
-    db.refresh(task)
-    return task
+
+
+def schedule_missing_deliveries(db: Session, batch_size: int) -> int:
+    """Проставляет next_delivery_at пользователям, у которых его ещё нет (созданы до появления колонки)."""
+    users = db.execute(
+        select(User.id, User.timezone, User.daily_hour).where(User.next_delivery_at.is_(None)).limit(batch_size)
+    ).all()
+    if users:
+        schedule_next_delivery(db, users, datetime.now(timezone.utc))
+    return len(users)
+
+
+def update_delivery_settings(db: Session, user_id: int, tz_name: str, daily_hour: int) -> User:
+    user = db.get(User, user_id)
+    user.timezone = tz_name
+    user.daily_hour = daily_hour
+    user.next_delivery_at = next_delivery_at(tz_name, daily_hour)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def create_daily_tasks_bulk(
+    db: Session,
+    users: List[Row],
+    exercises: Optional[List[Union[ExerciseItem, str]]] = None,
+    notify_template: Optional[str] = None,
+    source: str = "scheduler",
+) -> List[Tuple[Row, str]]:
+    """Создаёт сегодняшние задания для пачки пользователей одним INSERT.
+
+    Пользователи, у которых задание на сегодня уже есть, пропускаются.
+    Если задан notify_template, в той же транзакции в telegram_outbox
+    кладутся уведомления для пользователей с привязанным Telegram.
+    Возвращает пары (пользователь, текст) для созданных заданий.
+    """
+    if not users:
+        return []
+    now = datetime.now(timezone.utc)
+    # «сегодня» у каждого своё: пачка может захватить пользователей из разных поясов
+    day_of = {u.id: local_today(u.timezone, now) for u in users}
+
+    has_today = set(
+        db.execute(
+            select(Task.user_id, Task.task_date)
+            .where(Task.user_id.in_(list(day_of)), Task.task_date.in_(set(day_of.values())))
+        ).tuples()
+    )
+    missing = [u for u in users if (u.id, day_of[u.id]) not in has_today]
+    if not missing:
+        return []
+
+    exercises = exercises or load_exercises(db) or DEFAULT_TASKS
+    # упражнение выбирается по курсору из уже прочитанной строки пользователя — без запросов к истории
+    planned = [(u, exercises[u.exercise_cursor % len(exercises)]) for u in missing]
+    # задание могло появиться между проверкой и вставкой (пользователь открыл /today) — такие строки пропускаются
+    inserted = set(
+        db.scalars(
+            dialect_insert(db, Task)
+            .values([
+                {"user_id": u.id, "sent_at": now, "task_date": day_of[u.id], "status": TaskStatus.pending.value,
+                 **task_content(exercise)}
+                for u, exercise in planned
+            ])
+            .on_conflict_do_nothing(index_elements=["user_id", "task_date"])
+            .returning(Task.user_id)
+        )
+    )
+    created = [(u, exercise_text(exercise)) for u, exercise in planned if u.id in inserted]
+    if inserted:
+        db.execute(
+            update(User)
+            .where(User.id.in_(inserted))
+            .values(exercise_cursor=User.exercise_cursor + 1, tasks_version=User.tasks_version + 1),
+            execution_options={"synchronize_session": False},
+        )
+    if settings.progress_rollup_enabled:
+        bump_rollup(db, [(u.id, now.date(), 1, 0) for u, _ in created])
+    if notify_template:
+        enqueue_messages(db, ((u.telegram_id, notify_template.format(text=text)) for u, text in created))
+    db.commit()
+    count(TASKS_GENERATED, source, amount=len(created))
+    return created
 
 
 def mark_task_completed(db: Session, user_id: int, task_id: int) -> Optional[Task]:
     task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
     if not task:
         return None
-    task.status = TaskStatus.completed.value
-    db.commit()
-    db.refresh(task)
+    if task.status != TaskStatus.completed.value:
+        # условный UPDATE: при гонке двух запросов срез увеличится только один раз
+        result = db.execute(
+            update(Task)
+            .where(Task.id == task.id, Task.status != TaskStatus.completed.value)
+            .values(status=TaskStatus.completed.value)
+        )
+        if result.rowcount:
+            db.execute(bump_tasks_version([user_id]))
+            if settings.progress_rollup_enabled:
+                bump_rollup(db, [(user_id, utc_day(task.sent_at), 0, 1)])
+        db.commit()
+        db.refresh(task)
+    catalog.resolve(db, [task])
     return task
 
 
 def get_progress(db: Session, user_id: int):
-    total = db.query(Task).filter(Task.user_id == user_id).count()
-    completed = db.query(Task).filter(Task.user_id == user_id, Task.status == TaskStatus.completed.value).count()
+    if settings.progress_rollup_enabled:
+        return progress_from_rollup(db, user_id)
+    return progress_from_tasks(db, user_id)
 
-    now = datetime.now(timezone.utc)
-    today = now.date()
-    start_week = (now - timedelta(days=now.weekday())).date()
-    start_month = now.replace(day=1).date()
-
-    today_completed = (
-        db.query(Task)
-        .filter(Task.user_id == user_id, Task.status == TaskStatus.completed.value)
-        .filter(func.date(Task.sent_at) == today)
-        .count()
-    )
-    week_completed = (
-        db.query(Task)
-        .filter(Task.user_id == user_id, Task.status == TaskStatus.completed.value)
-        .filter(func.date(Task.sent_at) >= start_week)
-        .count()
-    )
-    month_completed = (
-        db.query(Task)
-        .filter(Task.user_id == user_id, Task.status == TaskStatus.completed.value)
-        .filter(func.date(Task.sent_at) >= start_month)
-        .count()
+
+def task_history_query(
+    user_id: int, limit: Optional[int] = None, cursor: Optional[Tuple[datetime, int]] = None, model=Task
+):
+    """Новые задания сначала; курсор — (sent_at, id) последней строки предыдущей страницы.
+
+    model=TaskArchive читает архив: архивные задания старше любого горячего,
+    поэтому история — горячая таблица, а за ней архив с тем же курсором.
+    """
+    query = select(model).where(model.user_id == user_id)
+    if cursor is not None:
+        query = query.where(tuple_(model.sent_at, model.id) < tuple_(*cursor))
+    query = query.order_by(model.sent_at.desc(), model.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def task_page(tasks: List[Task], limit: int) -> Tuple[List[Task], Optional[str]]:
+    """Запрос выбирает limit + 1 строк: лишняя строка означает, что есть следующая страница."""
+    if len(tasks) <= limit:
+        return tasks, None
+    tasks = tasks[:limit]
+    return tasks, encode_cursor([tasks[-1].sent_at, tasks[-1].id])
+
+
+def list_tasks_for_user(db: Session, user_id: int, limit: Optional[int] = None, cursor: Optional[Tuple[datetime, int]] = None):
+    tasks = list(db.scalars(task_history_query(user_id, limit, cursor)))
+    if limit is None or len(tasks) < limit:
+        tasks += db.scalars(task_history_query(user_id, limit and limit - len(tasks), cursor, TaskArchive))
+    catalog.resolve(db, tasks)
+    return tasks
+
+
+def list_tasks_page(db: Session, user_id: int, limit: int, cursor: Optional[Tuple[datetime, int]] = None):
+    tasks = list(db.scalars(task_history_query(user_id, limit + 1, cursor)))
+    if len(tasks) <= limit:
+        # горячая таблица кончилась — страницу дочитывает архив
+        tasks += db.scalars(task_history_query(user_id, limit + 1 - len(tasks), cursor, TaskArchive))
+    catalog.resolve(db, tasks)
+    return task_page(tasks, limit)
+
+
+def iter_task_history(db: Session, user_id: int, chunk_size: int = 1000) -> Iterator[List[Task]]:
+    """Вся история пачками через серверный курсор; прочитанные объекты выбрасываются из сессии."""
+    for model in (Task, TaskArchive):
+        result = db.scalars(task_history_query(user_id, model=model).execution_options(yield_per=chunk_size))
+        for partition in result.partitions():
+            catalog.resolve(db, partition)
+            yield partition
+            db.expunge_all()
+
+
+def claim_bot_update(db: Session, update_id: int) -> bool:
+    """Атомарно помечает update_id обработанным; False — его уже взял другой процесс бота."""
+    result = db.execute(
+        dialect_insert(db, ProcessedUpdate).values(update_id=update_id).on_conflict_do_nothing(index_elements=["update_id"])
     )
+    db.commit()
+    return result.rowcount == 1
 
-    return {
-        "total": total,
-        "completed": completed,
-        "today_completed": today_completed,
-        "week_completed": week_completed,
-        "month_completed": month_completed,
-    }
 
+def release_bot_update(db: Session, update_id: int) -> bool:
+    """Снимает отметку update_id, если обработка упала: повторную доставку Telegram обработают заново."""
+    result = db.execute(delete(ProcessedUpdate).where(ProcessedUpdate.update_id == update_id))
+    db.commit()
+    return result.rowcount == 1
 
-def list_tasks_for_user(db: Session, user_id: int):
-    return db.query(Task).filter(Task.user_id == user_id).order_by(Task.sent_at.desc()).all()
+
+def prune_bot_updates(db: Session, older_than: datetime) -> int:
+    # Telegram повторяет доставку не дольше суток, старые отметки не нужны
+    result = db.execute(delete(ProcessedUpdate).where(ProcessedUpdate.created_at < older_than))
+    db.commit()
+    return result.rowcount
@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import OutboxMessage, OutboxStatus
+from .metrics import TELEGRAM_SENDS, count
+
+if TYPE_CHECKING:
+    # httpx импортируется при первой отправке, а не на старте каждого воркера
+    import httpx
+
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд сообщение «занято» диспетчером; если он упал — строку подхватит следующий
+CLAIM_LEASE_SECONDS = 120
+
+
+def enqueue_messages(db: Session, messages: Iterable[Tuple[str, str]]) -> int:
+    """Кладёт сообщения (chat_id, text) в outbox без commit — в транзакции вызывающего."""
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"chat_id": chat_id, "text": text, "status": OutboxStatus.pending.value, "attempts": 0, "next_attempt_at": now}
+        for chat_id, text in messages
+        if chat_id
+    ]
+    if rows:
+        db.execute(insert(OutboxMessage), rows)
+    return len(rows)
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, запас не больше capacity.
+
+    Токен резервируется под threading.Lock (запас может уйти в минус), а ждёт
+    вызывающий у себя — поэтому один bucket делят диспетчеры из разных потоков
+    и event loop'ов (задачи планировщика запускают каждый свой asyncio.run).
+    Очередь при этом FIFO в порядке резервирования.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def idle(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens >= self.capacity
+
+    def pause(self, seconds: float) -> None:
+        """Полностью останавливает выдачу токенов (ответ 429 c retry_after)."""
+        with self._lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = now
+
+    def _reserve(self) -> float:
+        """Забирает токен; возвращает, сколько секунд ждать до права им воспользоваться."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    async def acquire(self) -> None:
+        delay = self._reserve()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            # пока ждали, мог прийти 429: пауза касается и уже выданных токенов
+            delay = self.paused_until - time.monotonic()
+
+
+class SendLimits:
+    """Лимиты Telegram на процесс: общий bucket бота и по bucket на чат."""
+
+    def __init__(self, global_rate: float, per_chat_rate: float):
+        self.per_chat_rate = per_chat_rate
+        self.global_bucket = TokenBucket(global_rate)
+        self._chat_buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def chat_bucket(self, chat_id: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, capacity=1)
+            return bucket
+
+    def prune(self) -> None:
+        """Забывает чаты, чьи bucket'ы снова полны."""
+        with self._lock:
+            for chat_id in [c for c, b in self._chat_buckets.items() if b.idle()]:
+                del self._chat_buckets[chat_id]
+
+
+_send_limits: dict[Tuple[float, float], SendLimits] = {}
+_send_limits_lock = threading.Lock()
+
+
+def send_limits(global_rate: float, per_chat_rate: float) -> SendLimits:
+    """Лимиты, общие для всех диспетчеров процесса с такими же ставками.
+
+    Рассылка и outbox-задача работают параллельно, каждая со своим диспетчером;
+    с отдельными bucket'ами вместе они слали бы вдвое быстрее TELEGRAM_GLOBAL_RATE.
+    """
+    with _send_limits_lock:
+        limits = _send_limits.get((global_rate, per_chat_rate))
+        if limits is None:
+            limits = _send_limits[(global_rate, per_chat_rate)] = SendLimits(global_rate, per_chat_rate)
+        return limits
+
+
+@dataclass
+class OutboxItem:
+    id: int
+    chat_id: str
+    text: str
+    attempts: int
+
+
+@dataclass
+class DeliveryResult:
+    id: int
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    retry_after: Optional[float] = None
+
+
+@dataclass
+class DispatchStats:
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    rate_limited: int = 0
+
+
+class TelegramDispatcher:
+    """Разбирает telegram_outbox: пул соединений, лимиты Telegram, ретраи с backoff."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        token: str | None = None,
+        concurrency: int | None = None,
+        global_rate: float | None = None,
+        per_chat_rate: float | None = None,
+        max_attempts: int | None = None,
+        retry_base_seconds: float | None = None,
+        batch_size: int = 500,
+        transport: "httpx.AsyncBaseTransport | None" = None,
+    ):
+        self.session_factory = session_factory
+        self.token = token or settings.telegram_bot_token
+        self.concurrency = concurrency or settings.telegram_send_concurrency
+        self.per_chat_rate = per_chat_rate or settings.telegram_per_chat_rate
+        self.max_attempts = max_attempts or settings.telegram_max_attempts
+        self.retry_base_seconds = settings.telegram_retry_base_seconds if retry_base_seconds is None else retry_base_seconds
+        self.batch_size = batch_size
+        self.transport = transport
+        self.limits = send_limits(global_rate or settings.telegram_global_rate, self.per_chat_rate)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.stats = DispatchStats()
+
+    @property
+    def url(self) -> str:
+        return f"{settings.telegram_api_url}/bot{self.token}/sendMessage"
+
+    def _client(self) -> "httpx.AsyncClient":
+        import httpx
+
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        return httpx.AsyncClient(timeout=10, limits=limits, transport=self.transport)
+
+    def _backoff(self, attempts: int) -> float:
+        base = self.retry_base_seconds * (2 ** (attempts - 1))
+        return min(base, 600.0) * (0.5 + random.random() / 2)
+
+    # --- БД (вызывается из потока) ---
+
+    def _claim(self) -> List[OutboxItem]:
+        """Забирает пачку готовых сообщений одним UPDATE ... RETURNING.
+
+        Условие status/next_attempt_at проверяется в самом UPDATE, поэтому две
+        параллельные выборки не возьмут одну строку и на SQLite, где FOR UPDATE
+        SKIP LOCKED не действует: вторая увидит уже продлённый next_attempt_at.
+        """
+        db = self.session_factory()
+        try:
+            now = datetime.now(timezone.utc)
+            due = (OutboxMessage.status == OutboxStatus.pending.value, OutboxMessage.next_attempt_at <= now)
+            batch = (
+                select(OutboxMessage.id)
+                .where(*due)
+                .order_by(OutboxMessage.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            rows = db.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_(batch), *due)
+                .values(next_attempt_at=now + timedelta(seconds=CLAIM_LEASE_SECONDS))
+                .returning(OutboxMessage.id, OutboxMessage.chat_id, OutboxMessage.text, OutboxMessage.attempts),
+                execution_options={"synchronize_session": False},
+            ).all()
+            db.commit()
+            return [OutboxItem(*row) for row in sorted(rows)]
+        finally:
+            db.close()
+
+    def _record(self, results: List[DeliveryResult]) -> None:
+        db = self.session_factory()
+        try:
+            now = datetime.now(timezone.utc)
+            rows = []
+            for r in results:
+                row = {"id": r.id, "status": r.status, "attempts": r.attempts, "last_error": r.error}
+                if r.status == OutboxStatus.sent.value:
+                    row["sent_at"] = now
+                    row["next_attempt_at"] = now
+                elif r.status == OutboxStatus.pending.value:
+                    row["next_attempt_at"] = now + timedelta(seconds=r.retry_after or self._backoff(r.attempts))
+                else:
+                    row["next_attempt_at"] = now
+                rows.append(row)
+            if rows:
+                db.execute(update(OutboxMessage), rows)
+            db.commit()
+        finally:
+            db.close()
+
+    def _next_due_in(self) -> Optional[float]:
+        db = self.session_factory()
+        try:
+            due = db.scalar(
+                select(func.min(OutboxMessage.next_attempt_at)).where(OutboxMessage.status == OutboxStatus.pending.value)
+            )
+        finally:
+            db.close()
+        if due is None:
+            return None
+        if due.tzinfo is None:
+            due = due.replace(tzinfo=timezone.utc)
+        return max(0.0, (due - datetime.now(timezone.utc)).total_seconds())
+
+    # --- отправка ---
+
+    async def _deliver(self, client: "httpx.AsyncClient", item: OutboxItem) -> DeliveryResult:
+        import httpx
+
+        attempts = item.attempts + 1
+        async with self._semaphore:
+            await self.limits.chat_bucket(item.chat_id).acquire()
+            await self.limits.global_bucket.acquire()
+            try:
+                r = await client.post(self.url, json={"chat_id": item.chat_id, "text": item.text})
+            except httpx.HTTPError as e:
+                return self._retry_or_fail(item, attempts, f"{type(e).__name__}: {e}")
+
+        if r.status_code == 200:
+            self.stats.sent += 1
+            count(TELEGRAM_SENDS, "sent")
+            return DeliveryResult(item.id, OutboxStatus.sent.value, attempts)
+        try:
+            body = r.json()
+        except ValueError:
+            body = {}
+        error = f"{r.status_code}: {body.get('description', r.text)}"[:512]
+        if r.status_code == 429:
+            self.stats.rate_limited += 1
+            count(TELEGRAM_SENDS, "rate_limited")
+            retry_after = float((body.get("parameters") or {}).get("retry_after", 1))
+            # 429 — это флуд-лимит всего бота: притормаживаем всех отправителей
+            self.limits.global_bucket.pause(retry_after)
+            return self._retry_or_fail(item, attempts, error, retry_after=retry_after)
+        if r.status_code >= 500:
+            return self._retry_or_fail(item, attempts, error)
+        # 400/403: чат не найден, бот заблокирован — повтор не поможет
+        self.stats.failed += 1
+        count(TELEGRAM_SENDS, "failed")
+        return DeliveryResult(item.id, OutboxStatus.failed.value, attempts, error)
+
+    def _retry_or_fail(self, item: OutboxItem, attempts: int, error: str, retry_after: float | None = None) -> DeliveryResult:
+        if attempts >= self.max_attempts:
+            self.stats.failed += 1
+            count(TELEGRAM_SENDS, "failed")
+            logger.warning("telegram message %s dropped after %s attempts: %s", item.id, attempts, error)
+            return DeliveryResult(item.id, OutboxStatus.failed.value, attempts, error)
+        self.stats.retried += 1
+        count(TELEGRAM_SENDS, "retry")
+        return DeliveryResult(item.id, OutboxStatus.pending.value, attempts, error, retry_after)
+
+    async def drain(self, stop: asyncio.Event | None = None, linger: float | None = None) -> DispatchStats:
+        """Шлёт сообщения, пока в outbox есть готовые к отправке.
+
+        Если передан stop — ждёт новых сообщений, пока событие не выставлено
+        (так рассылка идёт параллельно с генерацией заданий). Ретраи, до которых
+        осталось не больше linger секунд, дожидаемся; остальные заберёт следующий запуск.
+        """
+        linger = settings.telegram_drain_linger_seconds if linger is None else linger
+        async with self._client() as client:
+            while True:
+                batch = await asyncio.to_thread(self._claim)
+                if batch:
+                    results = await asyncio.gather(*(self._deliver(client, item) for item in batch))
+                    await asyncio.to_thread(self._record, list(results))
+                    self.limits.prune()
+                    continue
+                if stop is not None and not stop.is_set():
+                    try:
+                        await asyncio.wait_for(stop.wait(), timeout=0.2)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                due_in = await asyncio.to_thread(self._next_due_in)
+                if due_in is None or due_in > linger:
+                    return self.stats
+                await asyncio.sleep(due_in)
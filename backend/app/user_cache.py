@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event, inspect
+
+from .config import settings
+from .models import User
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Снимок пользователя для авторизации: не привязан к сессии и не протухает после commit."""
+
+    id: int
+    email: str
+    name: str
+    role: str
+    telegram_id: Optional[str] = None
+    timezone: Optional[str] = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "CachedUser":
+        return cls(
+            id=user.id, email=user.email, name=user.name, role=user.role, telegram_id=user.telegram_id,
+            timezone=user.timezone,
+        )
+
+
+class UserCache:
+    """LRU-кэш пользователей по id с ограничением времени жизни записи."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[int, tuple[float, CachedUser]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[CachedUser]:
+        with self._lock:
+            entry = self._items.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._items[user_id]
+                return None
+            self._items.move_to_end(user_id)
+            return user
+
+    def put(self, user: User) -> CachedUser:
+        cached = CachedUser.from_user(user)
+        if self.maxsize <= 0:
+            return cached
+        with self._lock:
+            self._items[cached.id] = (time.monotonic() + self.ttl, cached)
+            self._items.move_to_end(cached.id)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return cached
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._items.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+class IdentityCache:
+    """telegram_id → users.id для эндпоинтов бота: горячие пользователи резолвятся без запросов."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[str, tuple[float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, telegram_id: str) -> Optional[int]:
+        with self._lock:
+            entry = self._items.get(telegram_id)
+            if entry is None:
+                return None
+            expires_at, user_id = entry
+            if expires_at < time.monotonic():
+                del self._items[telegram_id]
+                return None
+            self._items.move_to_end(telegram_id)
+            return user_id
+
+    def put(self, telegram_id: str, user_id: int) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[telegram_id] = (time.monotonic() + self.ttl, user_id)
+            self._items.move_to_end(telegram_id)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, telegram_id: Optional[str]) -> None:
+        if telegram_id is None:
+            return
+        with self._lock:
+            self._items.pop(telegram_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+user_cache = UserCache(maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl_seconds)
+telegram_identity = IdentityCache(maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl_seconds)
+
+
+# Изменение или удаление пользователя через ORM сбрасывает его запись в кэше этого процесса;
+# другие воркеры увидят изменения не позже чем через USER_CACHE_TTL_SECONDS.
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target: User) -> None:
+    user_cache.invalidate(target.id)
+    # и старый, и новый telegram_id: привязка могла переехать к другому пользователю
+    for telegram_id in [target.telegram_id, *inspect(target).attrs.telegram_id.history.deleted]:
+        telegram_identity.invalidate(telegram_id)
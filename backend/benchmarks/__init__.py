@@ -0,0 +1,8 @@
+"""Бенчмарки backend. Запуск из каталога backend: python -m benchmarks.<модуль>."""
+import os
+
+# Те же значения по умолчанию, что и в тестах: бенчмарки не должны требовать .env
+os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///./bench.db")
+os.environ.setdefault("JWT_SECRET_KEY", "bench_secret")
+os.environ.setdefault("ADMIN_EMAIL", "admin@example.com")
+os.environ.setdefault("ADMIN_PASSWORD", "adminpass")
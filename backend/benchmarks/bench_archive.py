@@ -0,0 +1,91 @@
+"""Горячий путь при растущей истории: /today, прогресс и первая страница истории до и после архивации.
+
+    python -m benchmarks.bench_archive --users 2000 --days 30 365 1095
+
+Для каждой глубины истории — своя временная SQLite: пользователи с заданиями
+за --days дней, дневные срезы прогресса. Замер идёт дважды: когда вся история
+лежит в tasks и после переноса всего старше --keep-days в tasks_archive.
+Во втором прогоне задержки не должны зависеть от глубины истории.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.archive import archive_cutoff, archive_tasks
+from app.config import settings
+from app.database import Base
+from app.models import Task, TaskArchive, User
+from app.progress import rebuild_rollup
+from app.services import get_or_create_today_task, get_progress, list_tasks_page
+from .common import summarize
+from .seed import seed
+
+OPERATIONS = {
+    "today": lambda db, user: get_or_create_today_task(db, user),
+    "progress": lambda db, user: get_progress(db, user.id),
+    "history": lambda db, user: list_tasks_page(db, user.id, 20),
+}
+
+
+def measure(db, users, repeat: int) -> dict:
+    result = {}
+    for name, operation in OPERATIONS.items():
+        samples = []
+        for _ in range(repeat):
+            for user in users:
+                started = time.perf_counter()
+                operation(db, user)
+                samples.append((time.perf_counter() - started) * 1000)
+        result[name] = summarize(samples)
+    return result
+
+
+def report(days: int, phase: str, hot: int, archived: int, timings: dict) -> None:
+    cells = "  ".join(f"{name} p50 {t['p50_ms']:.3f} p95 {t['p95_ms']:.3f}" for name, t in timings.items())
+    print(f"days={days:<5} {phase:<8} hot={hot:<9} archive={archived:<9} {cells}")
+
+
+def run(days: int, args, workdir: str) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{os.path.join(workdir, f'archive_{days}.db')}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with factory() as db:
+        seed(db, args.users, days)
+        rebuild_rollup(db)
+        users = db.scalars(select(User).order_by(User.id).limit(args.sample)).all()
+        # первый вызов создаёт сегодняшнее задание; в замер идут повторные
+        for user in users:
+            get_or_create_today_task(db, user)
+
+        def sizes():
+            return db.scalar(select(func.count(Task.id))), db.scalar(select(func.count(TaskArchive.id)))
+
+        report(days, "hot", *sizes(), measure(db, users, args.repeat))
+        archive_tasks(db, archive_cutoff())
+        report(days, "archived", *sizes(), measure(db, users, args.repeat))
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 365, 1095], help="глубины истории на пользователя")
+    parser.add_argument("--keep-days", type=int, default=30, help="сколько дней остаётся в горячей таблице")
+    parser.add_argument("--sample", type=int, default=50, help="сколько пользователей опрашивать")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # архив требует дневных срезов: без них прогресс считал бы только горячие задания
+    settings.progress_rollup_enabled = True
+    settings.task_archive_after_days = args.keep_days
+    with tempfile.TemporaryDirectory() as workdir:
+        for days in args.days:
+            run(days, args, workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Пропускная способность /api/auth/login при разных размерах пула bcrypt.
+
+    python -m benchmarks.bench_login --pool-sizes 0 1 2 4 --concurrency 32 --duration 10
+
+Для каждого размера поднимается uvicorn с PASSWORD_POOL_WORKERS=N
+(0 — bcrypt в потоке запроса, как раньше). Параллельно с логинами
+меряется дешёвый /api/progress, чтобы было видно, голодает ли он.
+"""
+import argparse
+import asyncio
+import json
+
+from .loadtest import EMAIL, PASSWORD, hammer, login, uvicorn_server
+
+
+async def run_mix(base_url: str, token: str, args) -> dict:
+    logins, progress = await asyncio.gather(
+        hammer(
+            base_url, None, "/api/auth/login", args.concurrency, args.duration,
+            method="POST", json_body={"email": EMAIL, "password": PASSWORD},
+        ),
+        hammer(base_url, token, "/api/progress", 4, args.duration),
+    )
+    return {"login": logins, "progress_during_logins": progress}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--max-pending", type=int, default=32)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.pool_sizes:
+        env = {
+            "PASSWORD_POOL_WORKERS": str(size),
+            "PASSWORD_POOL_MAX_PENDING": str(args.max_pending),
+            "BCRYPT_ROUNDS": str(args.rounds),
+        }
+        with uvicorn_server(args.port, 1, env) as base_url:
+            token = login(base_url)
+            results[f"pool={size}"] = asyncio.run(run_mix(base_url, token, args))
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
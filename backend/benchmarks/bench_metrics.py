@@ -0,0 +1,39 @@
+"""Накладные расходы метрик: те же эндпоинты с METRICS_ENABLED=true и false.
+
+    python -m benchmarks.bench_metrics --concurrency 64 --duration 10
+
+Для каждого режима поднимается uvicorn на общей БД; в результатах — rps и
+перцентили задержки, в конце — потеря rps и прирост p50 в процентах.
+"""
+import argparse
+import json
+
+from .loadtest import ENDPOINTS, run_against, uvicorn_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    results = {}
+    for enabled in ("false", "true"):
+        with uvicorn_server(args.port, args.workers, {"METRICS_ENABLED": enabled}) as base_url:
+            results[f"metrics={enabled}"] = run_against(base_url, args)
+
+    overhead = {}
+    for path in ENDPOINTS:
+        off, on = results["metrics=false"][path], results["metrics=true"][path]
+        overhead[path] = {
+            "rps_loss_pct": round(100 * (1 - on["rps"] / off["rps"]), 2) if off["rps"] else None,
+            "p50_growth_pct": round(100 * (on["p50_ms"] / off["p50_ms"] - 1), 2) if off["p50_ms"] else None,
+        }
+    results["overhead"] = overhead
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
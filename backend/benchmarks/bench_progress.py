@@ -0,0 +1,59 @@
+"""Сравнение двух путей расчёта прогресса: агрегат по tasks и дневные срезы.
+
+    python -m benchmarks.bench_progress --tasks 1000000 --users 1000
+
+По умолчанию БД — ./bench.db (SQLite); для Postgres задайте DATABASE_URL.
+"""
+import argparse
+import time
+
+from sqlalchemy import func, select
+
+from app.database import Base, SessionLocal, engine
+from app.models import User, UserDailyProgress
+from app.progress import progress_from_rollup, progress_from_tasks, rebuild_rollup
+from .common import summarize
+from .seed import seed
+
+
+def timed(fn, db, user_ids, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        for uid in user_ids:
+            started = time.perf_counter()
+            fn(db, uid)
+            samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--sample", type=int, default=50, help="сколько пользователей опрашивать")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        added = seed(db, args.users, max(1, args.tasks // args.users))
+        if added:
+            print(f"seeded {added} users in {time.perf_counter() - started:.1f}s")
+        # срезы строим и для базы, засеянной другим бенчмарком
+        if added or not db.scalar(select(func.count()).select_from(UserDailyProgress)):
+            started = time.perf_counter()
+            rebuild_rollup(db)
+            print(f"rollup rebuilt in {time.perf_counter() - started:.1f}s")
+        user_ids = db.scalars(select(User.id).order_by(User.id).limit(args.sample)).all()
+        for uid in user_ids[:3]:
+            assert progress_from_tasks(db, uid) == progress_from_rollup(db, uid), uid
+        print("tasks aggregate:", timed(progress_from_tasks, db, user_ids, args.repeat))
+        print("daily rollup:   ", timed(progress_from_rollup, db, user_ids, args.repeat))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
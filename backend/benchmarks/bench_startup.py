@@ -0,0 +1,113 @@
+"""Время до первого запроса для N воркеров uvicorn: инициализация в каждом воркере против разового init-db.
+
+    python -m benchmarks.bench_startup --workers 1 2 4 --repeat 3
+
+Режимы:
+  per-worker — прежний старт: каждый воркер сам делает create_all, ensure_admin
+               и каталог (DB_INIT_ON_STARTUP=true), пул открывается первыми запросами;
+  init-db    — схему один раз готовит python -m app.manage init-db, воркеры
+               только прогревают пул (DB_POOL_WARMUP=DB_POOL_SIZE) и каталог.
+Для каждого прогона: время от запуска процесса до первого 200 от /readyz и
+задержки первой волны запросов (по одному на воркер) к /api/tasks.
+БД — DATABASE_URL (по умолчанию ./bench.db).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from sqlalchemy import select
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import User
+from app.security import create_access_token
+from .common import summarize
+
+MODES = {
+    "per-worker": {"DB_INIT_ON_STARTUP": "true", "DB_POOL_WARMUP": "0"},
+    "init-db": {"DB_INIT_ON_STARTUP": "false", "DB_POOL_WARMUP": str(settings.db_pool_size)},
+}
+
+
+def init_db() -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "app.manage", "init-db"], check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def admin_token() -> str:
+    with SessionLocal() as db:
+        admin = db.scalars(select(User).where(User.email == settings.admin_email)).one()
+        return create_access_token(subject=admin.email, user_id=admin.id, role=admin.role)
+
+
+async def first_wave(base_url: str, token: str, size: int) -> list[float]:
+    async def one(client: httpx.AsyncClient) -> float:
+        started = time.perf_counter()
+        r = await client.get("/api/tasks", params={"limit": 20})
+        r.raise_for_status()
+        return (time.perf_counter() - started) * 1000
+
+    # отдельный клиент на запрос: новые TCP-соединения расходятся по воркерам
+    clients = [httpx.AsyncClient(base_url=base_url, headers={"Authorization": f"Bearer {token}"}, timeout=30) for _ in range(size)]
+    try:
+        return await asyncio.gather(*(one(c) for c in clients))
+    finally:
+        await asyncio.gather(*(c.aclose() for c in clients))
+
+
+def start_once(port: int, workers: int, env_overrides: dict, token: str) -> dict:
+    env = {**os.environ, "SCHEDULER_MODE": "off", **env_overrides}
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if httpx.get(f"{base_url}/readyz", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline or proc.poll() is not None:
+                raise RuntimeError("server did not become ready")
+            time.sleep(0.01)
+        ready = time.perf_counter() - started
+        wave = asyncio.run(first_wave(base_url, token, workers))
+        return {"ready_s": ready, "wave": wave}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8770)
+    args = parser.parse_args()
+
+    # схема нужна обоим режимам: сравниваем обычный перезапуск, а не самый первый деплой
+    print(f"init-db: {init_db():.2f}s")
+    token = admin_token()
+    for workers in args.workers:
+        for mode, env in MODES.items():
+            runs = [start_once(args.port, workers, env, token) for _ in range(args.repeat)]
+            ready = statistics.median(r["ready_s"] for r in runs)
+            wave = summarize([ms for r in runs for ms in r["wave"]])
+            print(
+                f"workers={workers} {mode:<10} ready {ready:.2f}s  "
+                f"first requests p50 {wave['p50_ms']:.1f}ms max {wave['p99_ms']:.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
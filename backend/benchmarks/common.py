@@ -0,0 +1,25 @@
+import statistics
+from typing import List
+
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, int(round(q * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+
+def summarize(latencies_ms: List[float], elapsed: float | None = None, errors: int = 0) -> dict:
+    """Сводка по замерам в миллисекундах; если передано elapsed — ещё и запросов в секунду."""
+    samples = sorted(latencies_ms)
+    result = {
+        "count": len(samples),
+        "errors": errors,
+        "mean_ms": round(statistics.mean(samples), 3) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 0.50), 3),
+        "p95_ms": round(percentile(samples, 0.95), 3),
+        "p99_ms": round(percentile(samples, 0.99), 3),
+    }
+    if elapsed:
+        result["rps"] = round(len(samples) / elapsed, 1)
+    return result
@@ -0,0 +1,54 @@
+"""Фейковый Telegram Bot API для бенчмарков, тестов и локальных прогонов рассылки.
+
+В тестах подключается к httpx через ASGITransport; вручную можно поднять так:
+    uvicorn benchmarks.fake_telegram:app --port 8081
+и указать TELEGRAM_API_URL=http://localhost:8081.
+"""
+import asyncio
+import time
+from collections import defaultdict
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+class FakeTelegram:
+    def __init__(self, rate_limit_every: int = 0, retry_after: float = 1, fail_first: int = 0, blocked_chats=(), latency: float = 0):
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.fail_first = fail_first
+        self.blocked_chats = {str(c) for c in blocked_chats}
+        self.latency = latency
+        self.requests = 0
+        self.messages: list[tuple[str, str]] = []
+        self.chat_times: dict[str, list[float]] = defaultdict(list)
+        self.app = Starlette(routes=[Route("/bot{token}/sendMessage", self.send_message, methods=["POST"])])
+
+    async def send_message(self, request: Request):
+        self.requests += 1
+        payload = await request.json()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        chat_id = str(payload["chat_id"])
+        if self.requests <= self.fail_first:
+            return JSONResponse({"ok": False, "error_code": 502, "description": "Bad Gateway"}, status_code=502)
+        if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+            return JSONResponse(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                },
+                status_code=429,
+            )
+        if chat_id in self.blocked_chats:
+            return JSONResponse({"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}, status_code=403)
+        self.messages.append((chat_id, payload["text"]))
+        self.chat_times[chat_id].append(time.monotonic())
+        return JSONResponse({"ok": True, "result": {"message_id": len(self.messages)}})
+
+
+app = FakeTelegram().app
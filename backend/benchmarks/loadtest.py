@@ -0,0 +1,127 @@
+"""Нагрузочный прогон /api/tasks/today и /api/progress в синхронном и асинхронном режимах.
+
+    python -m benchmarks.loadtest --concurrency 64 --duration 15
+    python -m benchmarks.loadtest --url http://localhost:8000   # уже запущенный сервер
+
+Без --url для каждого режима (DB_ASYNC_MODE=false/true) поднимается
+uvicorn на той же БД (DATABASE_URL, по умолчанию ./bench.db).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import httpx
+
+from .common import summarize
+
+ENDPOINTS = ["/api/tasks/today", "/api/progress"]
+EMAIL = "loadtest@example.com"
+PASSWORD = "loadtest-pass"
+
+
+@contextmanager
+def uvicorn_server(port: int, workers: int, env_overrides: dict):
+    env = {**os.environ, **env_overrides}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                httpx.get(f"{base_url}/openapi.json", timeout=1)
+                break
+            except httpx.HTTPError:
+                if time.monotonic() > deadline or proc.poll() is not None:
+                    raise RuntimeError("server did not start")
+                time.sleep(0.2)
+        yield base_url
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def login(base_url: str) -> str:
+    with httpx.Client(base_url=base_url, timeout=30) as client:
+        client.post("/api/users/register", json={"name": "Load", "email": EMAIL, "password": PASSWORD})
+        r = client.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+        r.raise_for_status()
+        return r.json()["access_token"]
+
+
+async def hammer(
+    base_url: str,
+    token: str | list[str] | None,
+    path: str,
+    concurrency: int,
+    duration: float,
+    method: str = "GET",
+    json_body: dict | None = None,
+) -> dict:
+    """concurrency клиентов шлют запросы без пауз в течение duration секунд.
+
+    Если token — список, клиенты ходят от разных пользователей (по кругу).
+    """
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    tokens = token if isinstance(token, list) else [token]
+    auth = [{"Authorization": f"Bearer {t}"} if t else {} for t in tokens]
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await client.request(method, path, json=json_body, headers=auth[0])  # прогрев
+        deadline = time.perf_counter() + duration
+
+        async def worker(n: int):
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                n += concurrency
+                try:
+                    r = await client.request(method, path, json=json_body, headers=auth[n % len(auth)])
+                    statuses[r.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    result = summarize(latencies, elapsed, errors=sum(n for code, n in statuses.items() if code != 200))
+    result["statuses"] = {str(code): n for code, n in statuses.items()}
+    return result
+
+
+def run_against(base_url: str, args) -> dict:
+    token = login(base_url)
+    return {path: asyncio.run(hammer(base_url, token, path, args.concurrency, args.duration)) for path in ENDPOINTS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="адрес уже запущенного backend")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.url:
+        results = {"target": run_against(args.url, args)}
+    else:
+        results = {}
+        for mode in ("sync", "async"):
+            env = {"DB_ASYNC_MODE": "true" if mode == "async" else "false"}
+            with uvicorn_server(args.port, args.workers, env) as base_url:
+                results[mode] = run_against(base_url, args)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
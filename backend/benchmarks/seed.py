@@ -0,0 +1,98 @@
+"""Синтетические пользователи и история заданий для бенчмарков.
+
+    python -m benchmarks.seed --users 100000 --tasks-per-user 30
+
+Пользователи seed{i}@example.com досеиваются до нужного числа, поэтому
+повторный запуск с тем же масштабом ничего не делает, а с большим — дописывает
+недостающих. Свежих заданий нет: их создают /today и рассылка.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+from sqlalchemy import func, insert, select
+
+from app.database import Base, SessionLocal, engine
+from app.delivery import next_delivery_at
+from app.exercises_store import list_exercises
+from app.models import Task, TaskStatus, User
+
+EMAIL_TEMPLATE = "seed{}@example.com"
+ZONES = ["Europe/Moscow", "Europe/Berlin", "Asia/Yekaterinburg", "Asia/Novosibirsk", "America/New_York", "UTC"]
+
+
+@lru_cache(maxsize=None)
+def _next_delivery(zone: str, hour: int) -> datetime:
+    return next_delivery_at(zone, hour)
+
+
+def seeded_users(db) -> int:
+    return db.scalar(select(func.count(User.id)).where(User.email.like("seed%@example.com")))
+
+
+def seed(db, users: int, tasks_per_user: int = 30, telegram_share: float = 0.5, chunk: int = 10000) -> int:
+    """Досеивает пользователей до users; у каждого tasks_per_user заданий за прошлые дни. Возвращает число новых."""
+    start = seeded_users(db)
+    if start >= users:
+        return 0
+    telegram_every = round(1 / telegram_share) if telegram_share else 0
+    # история ссылается на каталог, как задания, созданные рассылкой
+    exercise_ids = [item.id for item in list_exercises(db)]
+    today = datetime.now(timezone.utc).replace(hour=9, minute=0, second=0, microsecond=0)
+    for first in range(start, users, chunk):
+        rows = []
+        for i in range(first, min(first + chunk, users)):
+            zone = ZONES[i % len(ZONES)]
+            hour = 6 + i % 6
+            rows.append({
+                "name": f"Seed {i}",
+                "email": EMAIL_TEMPLATE.format(i),
+                "telegram_id": f"seed-{i}" if telegram_every and i % telegram_every == 0 else None,
+                "role": "user",
+                "timezone": zone,
+                "daily_hour": hour,
+                "next_delivery_at": _next_delivery(zone, hour),
+                "exercise_cursor": tasks_per_user,
+            })
+        db.execute(insert(User.__table__), rows)
+        # RETURNING при executemany в SQLite построчный; сидер пишет один, так что id — последние вставленные
+        user_ids = db.scalars(select(User.id).order_by(User.id.desc()).limit(len(rows))).all()
+        if tasks_per_user:
+            tasks = []
+            for uid in user_ids:
+                # история кончается позавчера: вчерашняя UTC-дата в западных поясах ещё «сегодня»
+                for day in range(2, tasks_per_user + 2):
+                    sent_at = today - timedelta(days=day)
+                    tasks.append({
+                        "user_id": uid,
+                        "exercise_id": exercise_ids[day % len(exercise_ids)],
+                        "sent_at": sent_at,
+                        "task_date": sent_at.date(),
+                        "status": TaskStatus.completed.value if (uid + day) % 3 else TaskStatus.pending.value,
+                    })
+                if len(tasks) >= chunk * 5:
+                    db.execute(insert(Task.__table__), tasks)
+                    tasks.clear()
+            if tasks:
+                db.execute(insert(Task.__table__), tasks)
+        db.commit()
+    return users - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--tasks-per-user", type=int, default=30)
+    parser.add_argument("--telegram-share", type=float, default=0.5, help="доля пользователей с telegram_id")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        started = time.perf_counter()
+        added = seed(db, args.users, args.tasks_per_user, args.telegram_share)
+        print(f"seeded {added} users in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
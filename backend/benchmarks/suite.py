@@ -0,0 +1,234 @@
+"""Сквозной прогон перед деплоем: API под нагрузкой и утренняя рассылка, результаты в JSON.
+
+    python -m benchmarks.suite --users 100000 --output bench.json
+    python -m benchmarks.suite --users 100000 --baseline bench.json   # код возврата 1 при регрессии
+
+Шаги: досеять пользователей и историю (benchmarks.seed), поднять uvicorn
+с метриками и выключенным планировщиком, по очереди нагрузить маршруты /api
+от разных пользователей, затем в этом процессе выполнить send_daily_tasks
+с фейковым Telegram. Для каждого маршрута — rps, p50/p95/p99 и SQL-запросов
+на HTTP-запрос (по счётчикам /metrics); для рассылки — скорость и запросов
+на пользователя.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import delete, event, select
+
+from app import scheduler
+from app.config import settings
+from app.database import Base, SessionLocal, engine
+from app.models import Task, User
+from app.security import create_access_token
+from app.telegram import TelegramDispatcher
+from .fake_telegram import FakeTelegram
+from .loadtest import hammer, uvicorn_server
+from .seed import EMAIL_TEMPLATE, seed, seeded_users
+
+# (маршрут, кто ходит); шаблон маршрута для метрик — путь без query
+API_ENDPOINTS = [
+    ("/api/tasks/today", "user"),
+    ("/api/progress", "user"),
+    ("/api/tasks?limit=20", "user"),
+    ("/api/me/delivery", "user"),
+    ("/api/admin/users?limit=50", "admin"),
+]
+
+# что считается регрессией: метрика и направление (+1 — хуже, когда растёт)
+API_CHECKS = {"rps": -1, "p95_ms": +1, "queries_per_request": +1}
+SCHEDULER_CHECKS = {"tasks_per_second": -1, "messages_per_second": -1, "queries_per_user": +1}
+
+
+def user_tokens(clients: int) -> list[str]:
+    with SessionLocal() as db:
+        users = db.execute(
+            select(User.id, User.email).where(User.email.in_([EMAIL_TEMPLATE.format(i) for i in range(clients)]))
+        ).all()
+    return [create_access_token(subject=u.email, user_id=u.id, role="user") for u in users]
+
+
+def admin_token(base_url: str) -> str:
+    r = httpx.post(f"{base_url}/api/auth/login", json={"email": settings.admin_email, "password": settings.admin_password}, timeout=30)
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+def scrape(base_url: str) -> tuple[float, dict[str, float]]:
+    """Всего SQL-запросов и HTTP-запросов по шаблону маршрута с момента старта сервера."""
+    queries, requests = 0.0, {}
+    for family in text_string_to_metric_families(httpx.get(f"{base_url}/metrics", timeout=10).text):
+        for sample in family.samples:
+            if sample.name == "db_query_duration_seconds_count":
+                queries += sample.value
+            elif sample.name == "http_request_duration_seconds_count":
+                route = sample.labels["route"]
+                requests[route] = requests.get(route, 0.0) + sample.value
+    return queries, requests
+
+
+def run_api(base_url: str, tokens: list[str], args) -> dict:
+    tokens_by_role = {"user": tokens, "admin": [admin_token(base_url)]}
+    results = {}
+    for path, role in API_ENDPOINTS:
+        route = path.split("?", 1)[0]
+        queries_before, requests_before = scrape(base_url)
+        result = asyncio.run(hammer(base_url, tokens_by_role[role], path, args.concurrency, args.duration))
+        queries_after, requests_after = scrape(base_url)
+        handled = requests_after.get(route, 0) - requests_before.get(route, 0)
+        result["queries_per_request"] = round((queries_after - queries_before) / handled, 2) if handled else None
+        results[path] = result
+    return results
+
+
+def run_scheduler(args) -> dict:
+    # задания за последние сутки — от прошлых прогонов и фазы API; рассылка должна создать их заново
+    with SessionLocal() as db:
+        db.execute(delete(Task).where(Task.task_date >= datetime.now(timezone.utc).date() - timedelta(days=1)))
+        db.commit()
+
+    fake = FakeTelegram(latency=args.telegram_latency)
+    settings.telegram_bot_token = "bench-token"
+    settings.scheduler_mode = "local"
+    scheduler.TelegramDispatcher = functools.partial(
+        TelegramDispatcher,
+        global_rate=args.telegram_rate,
+        per_chat_rate=args.telegram_rate,
+        transport=httpx.ASGITransport(app=fake.app),
+    )
+
+    queries = 0
+
+    def count_query(*_):
+        nonlocal queries
+        queries += 1
+
+    event.listen(engine, "before_cursor_execute", count_query)
+    try:
+        stats = scheduler.send_daily_tasks(batch_size=args.batch_size, concurrency=args.telegram_concurrency)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_query)
+    result = stats.as_dict()
+    result["queries"] = queries
+    result["queries_per_user"] = round(queries / stats.users_scanned, 3) if stats.users_scanned else None
+    result["telegram_requests"] = fake.requests
+    return result
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _worse(current, baseline, direction: int, tolerance: float) -> bool:
+    if current is None or not baseline:
+        return False
+    if direction > 0:
+        return current > baseline * (1 + tolerance)
+    return current < baseline * (1 - tolerance)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Регрессии относительно прошлого прогона; число запросов сравнивается без допуска."""
+    found = []
+    for path, current in results.get("api", {}).items():
+        before = baseline.get("api", {}).get(path)
+        if not before:
+            continue
+        for key, direction in API_CHECKS.items():
+            tol = 0.0 if key == "queries_per_request" else tolerance
+            if _worse(current.get(key), before.get(key), direction, tol):
+                found.append(f"{path}: {key} {before.get(key)} -> {current.get(key)}")
+    current, before = results.get("scheduler"), baseline.get("scheduler")
+    if current and before:
+        for key, direction in SCHEDULER_CHECKS.items():
+            tol = 0.0 if key == "queries_per_user" else tolerance
+            if _worse(current.get(key), before.get(key), direction, tol):
+                found.append(f"send_daily_tasks: {key} {before.get(key)} -> {current.get(key)}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000, help="масштаб: от 10 тысяч до миллиона")
+    parser.add_argument("--tasks-per-user", type=int, default=30)
+    parser.add_argument("--clients", type=int, default=1000, help="сколько разных пользователей ходят в API")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="переменные для сервера, например DB_ASYNC_MODE=true")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--telegram-rate", type=float, default=1000.0, help="лимит фейкового Telegram, сообщений/с")
+    parser.add_argument("--telegram-latency", type=float, default=0.02, help="задержка ответа фейкового Telegram, с")
+    parser.add_argument("--telegram-concurrency", type=int, default=50)
+    parser.add_argument("--skip-api", action="store_true")
+    parser.add_argument("--skip-scheduler", action="store_true")
+    parser.add_argument("--output", help="куда записать JSON (по умолчанию — stdout)")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="допустимое ухудшение rps/p95/скорости")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        started = time.perf_counter()
+        added = seed(db, args.users, args.tasks_per_user)
+        seed_seconds = time.perf_counter() - started
+        total_users = seeded_users(db)
+
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "database": engine.dialect.name,
+            "users": total_users,
+            "tasks_per_user": args.tasks_per_user,
+            "seeded_now": added,
+            "seed_seconds": round(seed_seconds, 1),
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "workers": args.workers,
+            "server_env": args.env,
+        }
+    }
+
+    if not args.skip_api:
+        env = {"METRICS_ENABLED": "true", "SCHEDULER_MODE": "off", **dict(item.split("=", 1) for item in args.env)}
+        with tempfile.TemporaryDirectory() as multiproc_dir:
+            if args.workers > 1:
+                # счётчики всех воркеров сводятся в один /metrics
+                env["PROMETHEUS_MULTIPROC_DIR"] = multiproc_dir
+            with uvicorn_server(args.port, args.workers, env) as base_url:
+                results["api"] = run_api(base_url, user_tokens(min(args.clients, total_users)), args)
+    if not args.skip_scheduler:
+        results["scheduler"] = run_scheduler(args)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+        exit_code = 1 if regressions else 0
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,83 @@
 import os
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 # Установим тестовые переменные окружения ДО импорта приложения
 os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
 os.environ.setdefault("JWT_SECRET_KEY", "test_secret")
 os.environ.setdefault("JWT_EXPIRE_MINUTES", "60")
-os.environ.setdefault("ADMIN_EMAIL", "admin@test.local")
+os.environ.setdefault("ADMIN_EMAIL", "admin@example.com")
 os.environ.setdefault("ADMIN_PASSWORD", "adminpass")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# маршрут, превысивший объявленный бюджет SQL-запросов, роняет тест
+os.environ.setdefault("QUERY_BUDGET_MODE", "raise")
 
 from app.main import app  # noqa: E402
 from app.database import Base  # noqa: E402
 from app import database as db_mod  # noqa: E402
+from app import main as main_mod  # noqa: E402
+from app import scheduler as scheduler_mod  # noqa: E402
+from app import routers as routers_mod  # noqa: E402
+from app.models import User  # noqa: E402
+from app.security import create_access_token  # noqa: E402
+from app.services import create_user  # noqa: E402
 
-# Создаём тестовый движок и сессии
+# Создаём тестовый движок и сессии.
+# StaticPool: in-memory SQLite живёт в одном соединении, иначе у каждого потока своя пустая БД.
 engine = create_engine(
-    os.environ["DATABASE_URL"], connect_args={"check_same_thread": False}
+    os.environ["DATABASE_URL"], connect_args={"check_same_thread": False}, poolclass=StaticPool
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Подменим движок и фабрику сессий в модуле database
 db_mod.engine = engine
 db_mod.SessionLocal = TestingSessionLocal
+# main, scheduler и routers импортируют их по имени — подменяем и там
+main_mod.engine = engine
+main_mod.SessionLocal = TestingSessionLocal
+scheduler_mod.SessionLocal = TestingSessionLocal
+routers_mod.SessionLocal = TestingSessionLocal
 
 # Создадим таблицы
 Base.metadata.create_all(bind=engine)
 
 
+@pytest.fixture()
+def db():
+    session = TestingSessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture()
+def sql_statements():
+    """Список SQL, выполненных тестовым движком за время теста."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture()
+def file_session_factory(tmp_path):
+    """Отдельная файловая SQLite-БД для тестов, где с базой работают несколько потоков."""
+    file_engine = create_engine(
+        f"sqlite+pysqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False, "timeout": 30}
+    )
+    Base.metadata.create_all(bind=file_engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=file_engine)
+    file_engine.dispose()
+
+
 @pytest.fixture()
 def client():
     # Переопределяем зависимость get_db
@@ -44,3 +93,24 @@ def client():
         yield c
 
     app.dependency_overrides.clear()
+
+
+def bearer(user) -> dict:
+    return {"Authorization": f"Bearer {create_access_token(subject=user.email, user_id=user.id, role=user.role)}"}
+
+
+@pytest.fixture()
+def auth():
+    """Заголовок Authorization для пользователя: headers=auth(user)."""
+    return bearer
+
+
+@pytest.fixture()
+def admin_headers(db):
+    """Заголовки общего для тестов админа (создаётся при первом обращении)."""
+    admin = db.query(User).filter(User.email == "tests-admin@example.com").first()
+    if admin is None:
+        admin = create_user(db, name="TestsAdmin", email="tests-admin@example.com")
+        admin.role = "admin"
+        db.commit()
+    return bearer(admin)
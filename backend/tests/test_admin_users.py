@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+
+from app.models import Task, TaskStatus, User
+from app.pagination import NEXT_CURSOR_HEADER
+from app.services import create_user
+
+
+def test_admin_user_listing_filters_and_counts(client, db, sql_statements, admin_headers):
+    alice = create_user(db, name="Zoya Alpha", email="zoya.alpha@example.com", telegram_id="tg-zoya")
+    create_user(db, name="Zoya Beta", email="zoya.beta@example.com")
+    create_user(db, name="Other", email="other_zoya@example.com")
+    db.add_all([
+        Task(user_id=alice.id, text="a", status=TaskStatus.completed.value),
+        Task(user_id=alice.id, text="b", sent_at=datetime.now(timezone.utc) - timedelta(days=1)),
+    ])
+    db.commit()
+
+    sql_statements.clear()
+    r = client.get("/api/admin/users", params={"q": "ZOYA"}, headers=admin_headers)
+    assert r.status_code == 200, r.text
+    assert sorted(u["email"] for u in r.json()) == ["zoya.alpha@example.com", "zoya.beta@example.com"]
+    # страница пользователей + один сгруппированный подсчёт, без N+1
+    assert len([s for s in sql_statements if "FROM tasks" in s]) == 1
+
+    r = client.get("/api/admin/users", params={"q": "zoya", "telegram_linked": True}, headers=admin_headers)
+    [row] = r.json()
+    assert row["id"] == alice.id
+    assert (row["task_count"], row["completed_count"]) == (2, 1)
+
+    r = client.get("/api/admin/users", params={"q": "other_"}, headers=admin_headers)
+    assert [u["email"] for u in r.json()] == ["other_zoya@example.com"]
+
+    r = client.get("/api/admin/users", params={"role": "admin"}, headers=admin_headers)
+    assert {u["role"] for u in r.json()} == {"admin"}
+
+
+def test_admin_user_listing_pages_by_cursor(client, db, admin_headers):
+    for i in range(5):
+        create_user(db, name=f"Pager{i}", email=f"pager{i}@example.com")
+
+    seen, cursor = [], None
+    while True:
+        params = {"q": "pager", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        r = client.get("/api/admin/users", params=params, headers=admin_headers)
+        assert r.status_code == 200, r.text
+        seen += [u["email"] for u in r.json()]
+        cursor = r.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+    assert seen == [f"pager{i}@example.com" for i in range(5)]
+
+
+def test_admin_user_search_folds_cyrillic_case(client, db, admin_headers):
+    ivan = create_user(db, name="Иван Петров", email="ivan.cyr@example.com")
+    db.execute(insert(User.__table__), [{"name": "ИВАНОВА Анна", "email": "ivanova.cyr@example.com"}])
+    renamed = create_user(db, name="Пётр", email="petr.cyr@example.com")
+    renamed.name = "Иванко"
+    db.commit()
+
+    for q in ("иван", "ИВАН", "Иван"):
+        r = client.get("/api/admin/users", params={"q": q}, headers=admin_headers)
+        assert r.status_code == 200, r.text
+        assert sorted(u["email"] for u in r.json()) == ["ivan.cyr@example.com", "ivanova.cyr@example.com", "petr.cyr@example.com"]
+    assert ivan.name_lower == "иван петров"
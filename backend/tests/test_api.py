@@ -39,7 +39,7 @@ def test_register_login_and_task_flow(client):
 def test_admin_endpoints(client):
     # Логин встроенного админа
     r = client.post("/api/auth/login", json={
-        "email": "admin@test.local",
+        "email": "admin@example.com",
         "password": "adminpass"
     })
     assert r.status_code == 200, r.text
@@ -58,6 +58,12 @@ def test_admin_endpoints(client):
     assert r.status_code == 200
     after = r.json()
     assert len(after) == len(before) + 1
+    added = after[-1]
+    assert added["text"] == "Тестовое упражнение"
 
-    r = client.delete(f"/api/admin/exercises/{len(after)-1}", headers={"Authorization": f"Bearer {admin_token}"})
+    r = client.delete(f"/api/admin/exercises/{added['id']}", headers={"Authorization": f"Bearer {admin_token}"})
     assert r.status_code == 200
+    assert r.json() == before
+
+    r = client.delete(f"/api/admin/exercises/{added['id']}", headers={"Authorization": f"Bearer {admin_token}"})
+    assert r.status_code == 404
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+
+from app import archive
+from app.archive import archive_old_tasks, archive_tasks
+from app.models import Task, TaskArchive, TaskStatus
+from app.pagination import NEXT_CURSOR_HEADER
+from app.progress import progress_from_rollup, rebuild_rollup
+from app.services import create_user, list_users_page
+
+
+def seed_days(db, user, days):
+    """По заданию на каждый из последних days дней, каждое второе выполнено."""
+    now = datetime.now(timezone.utc).replace(hour=9, minute=0, second=0, microsecond=0)
+    for day in range(1, days + 1):
+        sent_at = now - timedelta(days=day)
+        status = TaskStatus.completed.value if day % 2 else TaskStatus.pending.value
+        db.add(Task(user_id=user.id, text=f"day {day}", sent_at=sent_at, task_date=sent_at.date(), status=status))
+    db.commit()
+
+
+def user_rows(db, model, user):
+    return db.scalar(select(func.count(model.id)).where(model.user_id == user.id))
+
+
+def test_archive_moves_old_rows_in_batches(db):
+    user = create_user(db, name="Arch", email="archive-move@example.com")
+    seed_days(db, user, 10)
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=4)
+
+    assert archive_tasks(db, cutoff, batch_size=2) == 6
+    assert user_rows(db, Task, user) == 4
+    assert user_rows(db, TaskArchive, user) == 6
+    assert archive_tasks(db, cutoff) == 0
+    moved = db.scalars(select(TaskArchive).where(TaskArchive.user_id == user.id)).all()
+    assert all(t.task_date < cutoff for t in moved)
+    assert {t.text for t in moved} == {f"day {d}" for d in range(5, 11)}
+
+
+def test_history_and_counts_span_hot_table_and_archive(client, db, auth):
+    user = create_user(db, name="Arch", email="archive-history@example.com")
+    seed_days(db, user, 7)
+    expected = [f"day {d}" for d in range(1, 8)]
+    archive_tasks(db, datetime.now(timezone.utc).date() - timedelta(days=2))
+
+    seen, cursor = [], None
+    while True:
+        r = client.get("/api/tasks", params={"limit": 3, **({"cursor": cursor} if cursor else {})}, headers=auth(user))
+        assert r.status_code == 200, r.text
+        seen += [t["text"] for t in r.json()]
+        cursor = r.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+    assert seen == expected
+
+    rows, _ = list_users_page(db, limit=1, after_id=user.id - 1)
+    assert (rows[0]["task_count"], rows[0]["completed_count"]) == (7, 4)
+
+
+def test_progress_survives_archiving_via_rollup(db, monkeypatch):
+    monkeypatch.setattr(archive.settings, "progress_rollup_enabled", True)
+    monkeypatch.setattr(archive.settings, "task_archive_after_days", 3)
+    user = create_user(db, name="Arch", email="archive-progress@example.com")
+    seed_days(db, user, 20)
+    rebuild_rollup(db, [user.id])
+    before = progress_from_rollup(db, user.id)
+
+    assert archive_old_tasks(db) > 0
+    assert progress_from_rollup(db, user.id) == before
+    # пересчёт срезов тоже видит архив
+    rebuild_rollup(db, [user.id])
+    assert progress_from_rollup(db, user.id) == before
+
+
+def test_archiver_needs_rollup(db, monkeypatch):
+    monkeypatch.setattr(archive.settings, "progress_rollup_enabled", False)
+    monkeypatch.setattr(archive.settings, "task_archive_after_days", 1)
+    user = create_user(db, name="Arch", email="archive-off@example.com")
+    seed_days(db, user, 5)
+
+    assert archive_old_tasks(db) == 0
+    assert user_rows(db, Task, user) == 5
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app import database
+from app.async_routers import router as async_router
+from app.database import async_database_url, get_async_db
+from app.exercises_store import catalog, list_exercises, load_exercises
+from app.models import Exercise, Task
+from app.security import create_access_token
+from app.services import create_user
+
+
+def test_async_routes_share_behaviour_with_sync(file_session_factory):
+    db = file_session_factory()
+    user = create_user(db, name="Async", email="async@example.com")
+    db.close()
+    url = async_database_url(str(file_session_factory.kw["bind"].url))
+    assert url.startswith("sqlite+aiosqlite://")
+
+    async_engine = create_async_engine(url)
+    AsyncTestingSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncTestingSession() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(async_router)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    headers = {"Authorization": f"Bearer {create_access_token(subject=user.email)}"}
+
+    with TestClient(app) as c:
+        r = c.get("/api/tasks/today", headers=headers)
+        assert r.status_code == 200, r.text
+        task = r.json()
+        assert c.get("/api/tasks/today", headers=headers).json()["id"] == task["id"]
+
+        r = c.post(f"/api/tasks/complete/{task['id']}", headers=headers)
+        assert r.status_code == 200, r.text
+        assert r.json()["task"]["status"] == "completed"
+
+        progress = c.get("/api/progress", headers=headers).json()
+        assert progress["total"] == 1 and progress["today_completed"] == 1
+        assert [t["id"] for t in c.get("/api/tasks", headers=headers).json()] == [task["id"]]
+        assert c.get("/api/progress").status_code == 401
+
+
+def test_async_history_resolves_new_exercise_texts_without_sync_session(file_session_factory, monkeypatch):
+    db = file_session_factory()
+    user = create_user(db, name="AsyncText", email="async-text@example.com")
+    # упражнение появилось в обход кэша этого процесса, как из другого воркера
+    exercise = Exercise(text="Практика из другого воркера")
+    db.add(exercise)
+    db.flush()
+    db.add(Task(user_id=user.id, exercise_id=exercise.id))
+    db.commit()
+    email = user.email
+    db.close()
+    for name in ("_items", "_version", "_checked_at"):
+        monkeypatch.setattr(catalog, name, getattr(catalog, name))
+    # кэш процесса держит каталог основной тестовой БД: начинаем с пустого
+    monkeypatch.setattr(catalog, "_texts", {})
+
+    def no_sync_session():
+        raise AssertionError("sync session opened inside the event loop")
+
+    monkeypatch.setattr(database, "SessionLocal", no_sync_session)
+    async_engine = create_async_engine(async_database_url(str(file_session_factory.kw["bind"].url)))
+    AsyncTestingSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncTestingSession() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(async_router)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    headers = {"Authorization": f"Bearer {create_access_token(subject=email)}"}
+
+    with TestClient(app) as c:
+        r = c.get("/api/tasks", headers=headers)
+        assert r.status_code == 200, r.text
+        assert [t["text"] for t in r.json()] == ["Практика из другого воркера"]
+
+
+def test_concurrent_catalog_refresh_does_not_block_event_loop(file_session_factory, monkeypatch):
+    with file_session_factory() as db:
+        list_exercises(db)
+        db.commit()
+    for name in ("_items", "_texts", "_version", "_checked_at"):
+        monkeypatch.setattr(catalog, name, getattr(catalog, name))
+    catalog.invalidate()
+    async_engine = create_async_engine(async_database_url(str(file_session_factory.kw["bind"].url)))
+
+    async def refresh_twice():
+        try:
+            async with AsyncSession(async_engine) as first, AsyncSession(async_engine) as second:
+                # обе корутины видят устаревший кэш и идут перечитывать его в потоке event loop
+                return await asyncio.gather(first.run_sync(load_exercises), second.run_sync(load_exercises))
+        finally:
+            await async_engine.dispose()
+
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(items=asyncio.run(refresh_twice())), daemon=True)
+    worker.start()
+    worker.join(timeout=10)
+    assert not worker.is_alive(), "event loop is stuck on the catalog lock"
+    assert all(result["items"])
@@ -0,0 +1,117 @@
+from jose import jwt
+
+from app.config import settings
+from app.models import User
+from app.security import ALGORITHM, create_access_token
+from app.user_cache import UserCache, telegram_identity, user_cache
+
+
+def register_and_login(client, email):
+    client.post("/api/users/register", json={"name": "Cache", "email": email, "password": "pass1234"})
+    r = client.post("/api/auth/login", json={"email": email, "password": "pass1234"})
+    assert r.status_code == 200, r.text
+    return r.json()["access_token"]
+
+
+def users_queries(statements):
+    # чтение версии заданий для ETag — не загрузка пользователя
+    return [s for s in statements if "FROM users" in s and not s.startswith("SELECT users.tasks_version")]
+
+
+def test_token_carries_id_and_role(client):
+    token = register_and_login(client, "claims@example.com")
+    payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[ALGORITHM])
+    assert payload["sub"] == "claims@example.com"
+    assert payload["role"] == "user"
+    assert isinstance(payload["uid"], int)
+
+
+def test_authenticated_requests_skip_users_table(client, sql_statements):
+    headers = {"Authorization": f"Bearer {register_and_login(client, 'hot@example.com')}"}
+    user_cache.clear()
+    sql_statements.clear()
+
+    assert client.get("/api/progress", headers=headers).status_code == 200
+    assert len(users_queries(sql_statements)) == 1
+    sql_statements.clear()
+
+    assert client.get("/api/progress", headers=headers).status_code == 200
+    assert users_queries(sql_statements) == []
+
+
+def test_role_change_invalidates_cache(client, db):
+    token = register_and_login(client, "promoted@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/admin/users", headers=headers).status_code == 403
+
+    user = db.query(User).filter(User.email == "promoted@example.com").first()
+    user.role = "admin"
+    db.commit()
+    assert client.get("/api/admin/users", headers=headers).status_code == 200
+
+    db.delete(user)
+    db.commit()
+    assert client.get("/api/admin/users", headers=headers).status_code == 401
+
+
+def test_legacy_token_without_uid_still_works(client):
+    register_and_login(client, "legacy@example.com")
+    token = create_access_token(subject="legacy@example.com")
+    assert client.get("/api/progress", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+
+def test_user_cache_is_bounded():
+    cache = UserCache(maxsize=2, ttl=60)
+    for i in range(1, 4):
+        cache.put(User(id=i, email=f"u{i}@example.com", name="u", role="user"))
+    assert cache.get(1) is None
+    assert cache.get(3).email == "u3@example.com"
+
+    expired = UserCache(maxsize=2, ttl=-1)
+    expired.put(User(id=1, email="e@example.com", name="e", role="user"))
+    assert expired.get(1) is None
+
+
+def bot_today(client, telegram_id):
+    return client.get("/api/bot/today", params={"telegram_id": telegram_id}, headers={"Authorization": "Bearer bot-secret"})
+
+
+def test_bot_resolves_telegram_id_from_identity_cache(client, sql_statements, monkeypatch):
+    monkeypatch.setattr(settings, "bot_internal_token", "bot-secret")
+    r = client.post("/api/telegram/register", json={"telegram_id": "9001", "name": "Tg", "email": "tg-hot@example.com"})
+    assert r.status_code == 200, r.text
+    user_cache.clear()
+    telegram_identity.clear()
+    sql_statements.clear()
+
+    r = bot_today(client, "9001")
+    assert r.status_code == 200, r.text
+    lookups = users_queries(sql_statements)
+    assert len(lookups) == 1 and "users.telegram_id = " in lookups[0]
+    sql_statements.clear()
+
+    r = client.post(
+        f"/api/bot/complete/{r.json()['id']}", params={"telegram_id": "9001"},
+        headers={"Authorization": "Bearer bot-secret"},
+    )
+    assert r.status_code == 200, r.text
+    assert users_queries(sql_statements) == []
+
+    assert bot_today(client, "404404").status_code == 404
+    assert client.get("/api/bot/today", headers={"Authorization": "Bearer bot-secret"}).status_code == 422
+
+
+def test_telegram_relink_invalidates_identity(client, db, monkeypatch):
+    monkeypatch.setattr(settings, "bot_internal_token", "bot-secret")
+    client.post("/api/telegram/register", json={"telegram_id": "9002", "name": "Old", "email": "tg-old@example.com"})
+    old_id = bot_today(client, "9002").json()["user_id"]
+
+    old = db.get(User, old_id)
+    new = User(name="New", email="tg-new@example.com", role="user")
+    old.telegram_id = None
+    db.add(new)
+    db.flush()
+    new.telegram_id = "9002"
+    db.commit()
+
+    assert bot_today(client, "9002").json()["user_id"] == new.id
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta, timezone
+
+from app import routers
+from app.models import ProcessedUpdate
+from app.services import claim_bot_update, prune_bot_updates
+
+
+def test_update_is_claimed_once(client, monkeypatch):
+    monkeypatch.setattr(routers.settings, "bot_internal_token", "bot-secret")
+    headers = {"Authorization": "Bearer bot-secret"}
+
+    assert client.post("/api/bot/updates/1001/claim").status_code == 401
+    first = client.post("/api/bot/updates/1001/claim", headers=headers)
+    second = client.post("/api/bot/updates/1001/claim", headers=headers)
+    assert first.json() == {"claimed": True}
+    assert second.json() == {"claimed": False}
+
+
+def test_released_update_can_be_claimed_again(client, monkeypatch):
+    monkeypatch.setattr(routers.settings, "bot_internal_token", "bot-secret")
+    headers = {"Authorization": "Bearer bot-secret"}
+
+    assert client.post("/api/bot/updates/1002/claim", headers=headers).json() == {"claimed": True}
+    assert client.delete("/api/bot/updates/1002/claim").status_code == 401
+    assert client.delete("/api/bot/updates/1002/claim", headers=headers).json() == {"released": True}
+    assert client.post("/api/bot/updates/1002/claim", headers=headers).json() == {"claimed": True}
+
+
+def test_prune_keeps_recent_claims(db):
+    now = datetime.now(timezone.utc)
+    assert claim_bot_update(db, 1)
+    assert claim_bot_update(db, 2)
+    db.query(ProcessedUpdate).filter(ProcessedUpdate.update_id == 1).update({"created_at": now - timedelta(days=2)})
+    db.commit()
+
+    assert prune_bot_updates(db, now - timedelta(days=1)) == 1
+    assert {u.update_id for u in db.query(ProcessedUpdate)} & {1, 2} == {2}
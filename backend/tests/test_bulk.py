@@ -0,0 +1,68 @@
+from datetime import date
+
+from app.config import settings
+from app.models import Task, TaskStatus
+from app.security import create_access_token
+from app.services import create_user, get_today_task
+
+
+def test_bulk_generate_and_assign_text(client, db, monkeypatch, admin_headers):
+    users = [create_user(db, name=f"Bulk{i}", email=f"bulkgen{i}@example.com") for i in range(5)]
+    monkeypatch.setattr(settings, "bulk_chunk_size", 2)
+
+    # у первого задание уже есть — его пропускаем
+    first = client.post("/api/admin/bulk/generate_today", json={"user_ids": [users[0].id]}, headers=admin_headers).json()
+    assert (first["status"], first["total"], first["affected"]) == ("done", 1, 1)
+
+    r = client.post("/api/admin/bulk/generate_today", json={"q": "bulkgen"}, headers=admin_headers)
+    assert r.status_code == 200, r.text
+    job = r.json()
+    assert (job["status"], job["total"], job["processed"], job["affected"]) == ("done", 5, 5, 4)
+    assert all(get_today_task(db, u) is not None for u in users)
+
+    # свой текст: новых заданий нет, но невыполненные сегодняшние переписываются
+    done_task = get_today_task(db, users[1])
+    done_task.status = TaskStatus.completed.value
+    db.commit()
+    r = client.post(
+        "/api/admin/bulk/assign_text",
+        json={"q": "bulkgen", "text": "Особое задание", "replace_pending": True},
+        headers=admin_headers,
+    )
+    assert r.json()["affected"] == 4
+    db.expire_all()
+    texts = {u.id: get_today_task(db, u).text for u in users}
+    assert texts[users[1].id] != "Особое задание"
+    assert [texts[u.id] for u in users if u.id != users[1].id] == ["Особое задание"] * 4
+
+
+def test_bulk_complete_runs_as_background_job(client, db, monkeypatch, admin_headers):
+    user = create_user(db, name="BulkDone", email="bulkdone@example.com")
+    tasks = [
+        Task(user_id=user.id, text=f"t{i}", task_date=date(2024, 3, i + 1), status=TaskStatus.completed.value if i == 0 else TaskStatus.pending.value)
+        for i in range(5)
+    ]
+    db.add_all(tasks)
+    db.commit()
+    monkeypatch.setattr(settings, "bulk_chunk_size", 2)
+    monkeypatch.setattr(settings, "bulk_inline_limit", 3)
+
+    ids = [t.id for t in tasks] + [tasks[1].id, 10**9]
+    r = client.post("/api/admin/bulk/complete", json={"task_ids": ids}, headers=admin_headers)
+    assert r.status_code == 202, r.text
+    job_id = r.json()["id"]
+
+    # TestClient выполняет фоновые задачи до возврата ответа
+    job = client.get(f"/api/admin/bulk/jobs/{job_id}", headers=admin_headers).json()
+    assert (job["status"], job["total"], job["processed"], job["affected"]) == ("done", 6, 6, 4)
+    db.expire_all()
+    assert {t.status for t in db.query(Task).filter(Task.user_id == user.id)} == {TaskStatus.completed.value}
+
+
+def test_bulk_requires_admin_and_selection(client, db, admin_headers):
+    user = create_user(db, name="NotAdmin", email="bulk-notadmin@example.com")
+    token = create_access_token(subject=user.email, user_id=user.id, role="user")
+    r = client.post("/api/admin/bulk/generate_today", json={"all_users": True}, headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 403
+    r = client.post("/api/admin/bulk/generate_today", json={}, headers=admin_headers)
+    assert r.status_code == 422
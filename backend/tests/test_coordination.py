@@ -0,0 +1,82 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, update
+
+from app import scheduler
+from app.coordination import ShardedRun, acquire_lease, release_lease
+from app.models import SchedulerLease, SchedulerShard, Task
+from app.services import create_user
+
+
+def test_leader_lease_is_exclusive_until_expiry(db):
+    assert acquire_lease(db, "test-leader", "a", 60)
+    assert not acquire_lease(db, "test-leader", "b", 60)
+    assert acquire_lease(db, "test-leader", "a", 60)  # продление своей аренды
+
+    db.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == "test-leader")
+        .values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+    )
+    db.commit()
+    assert acquire_lease(db, "test-leader", "b", 60)
+    release_lease(db, "test-leader", "b")
+    assert acquire_lease(db, "test-leader", "a", 60)
+
+
+def seed_users(session_factory, n):
+    with session_factory() as db:
+        for i in range(n):
+            create_user(db, name=f"Shard{i}", email=f"shard{i}@example.com")
+
+
+def tasks_per_user(session_factory):
+    with session_factory() as db:
+        return db.execute(select(Task.user_id, func.count()).group_by(Task.user_id)).all()
+
+
+def test_crashed_shard_resumes_from_checkpoint(file_session_factory, monkeypatch):
+    monkeypatch.setattr(scheduler, "SessionLocal", file_session_factory)
+    seed_users(file_session_factory, 9)
+
+    crashed = ShardedRun(file_session_factory, "test:resume", shards=3, lease_seconds=60, holder="crashed")
+    crashed.plan()
+    claim = crashed.claim()
+    # успели обработать одного пользователя из шарда и упали
+    scheduler._generate_chunk(claim.last_user_id, 1, ["a", "b"], False, claim.end_id, crashed, claim)
+    with file_session_factory() as db:
+        db.execute(
+            update(SchedulerShard)
+            .where(SchedulerShard.run_key == "test:resume")
+            .values(lease_expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+        )
+        db.commit()
+
+    survivor = ShardedRun(file_session_factory, "test:resume", shards=3, lease_seconds=60, holder="survivor")
+    stats = asyncio.run(scheduler._fan_out(2, 1, survivor))
+
+    assert stats.users_scanned == 8
+    assert survivor.pending() == 0
+    assert sorted(count for _, count in tasks_per_user(file_session_factory)) == [1] * 9
+    # упавший воркер, очнувшись, не может продолжить чужой шард
+    with file_session_factory() as db:
+        assert not crashed.checkpoint(db, claim, claim.last_user_id + 1)
+
+
+def test_workers_split_shards_without_overlap(file_session_factory, monkeypatch):
+    monkeypatch.setattr(scheduler, "SessionLocal", file_session_factory)
+    seed_users(file_session_factory, 40)
+
+    def worker(holder):
+        run = ShardedRun(file_session_factory, "test:parallel", shards=8, lease_seconds=60, holder=holder)
+        run.plan()
+        return asyncio.run(scheduler._fan_out(3, 1, run))
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        results = list(pool.map(worker, ["w1", "w2", "w3"]))
+
+    assert sum(s.users_scanned for s in results) == 40
+    assert sum(s.tasks_created for s in results) == 40
+    assert sorted(count for _, count in tasks_per_user(file_session_factory)) == [1] * 40
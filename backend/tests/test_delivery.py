@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+from app import scheduler
+from app.delivery import next_delivery_at
+from app.models import OutboxMessage, SchedulerRun, SchedulerShard, Task, User
+from app.security import create_access_token
+from app.services import create_user
+
+
+def test_next_delivery_follows_local_hour_and_dst():
+    after = datetime(2024, 3, 10, 7, 0, tzinfo=timezone.utc)  # 10:00 в Москве — сегодняшний час уже прошёл
+    assert next_delivery_at("Europe/Moscow", 9, after) == datetime(2024, 3, 11, 6, 0, tzinfo=timezone.utc)
+    # в Нью-Йорке 10 марта перешли на летнее время: 9:00 EDT = 13:00 UTC
+    assert next_delivery_at("America/New_York", 9, after) == datetime(2024, 3, 10, 13, 0, tzinfo=timezone.utc)
+
+
+def test_tick_delivers_only_the_due_bucket(db):
+    base = datetime(2024, 5, 31, 14, 0, tzinfo=timezone.utc)
+    due_at = {tz: next_delivery_at(tz, 9, base) for tz in ("Asia/Tokyo", "Europe/Berlin", "America/New_York")}
+    users = {}
+    for tz, moment in due_at.items():
+        user = create_user(db, name=tz, email=f"tick-{tz.split('/')[1].lower()}@example.com")
+        user.timezone = tz
+        user.next_delivery_at = moment
+        users[tz] = user
+    db.commit()
+
+    stats = scheduler.deliver_due_tasks(now=due_at["Europe/Berlin"] + timedelta(seconds=30))
+    assert stats.tasks_created == 2  # Токио (00:00 UTC) и Берлин (07:00 UTC), Нью-Йорк ещё не наступил
+    delivered = {u.timezone for u in db.query(User).join(Task).filter(User.id.in_([u.id for u in users.values()]))}
+    assert delivered == {"Asia/Tokyo", "Europe/Berlin"}
+
+    db.expire_all()
+    assert users["Europe/Berlin"].next_delivery_at.replace(tzinfo=timezone.utc) == due_at["Europe/Berlin"] + timedelta(days=1)
+    assert scheduler.deliver_due_tasks(now=due_at["Europe/Berlin"]).users_scanned == 0
+
+
+def test_tick_only_enqueues_and_splits_due_users_into_shards(db, monkeypatch):
+    monkeypatch.setattr(scheduler.settings, "telegram_bot_token", "test-token")
+    monkeypatch.setattr(scheduler.settings, "scheduler_shards", 3)
+    monkeypatch.setattr(scheduler, "TelegramDispatcher", None)  # шлёт только dispatch_outbox
+    now = datetime(2024, 5, 1, 6, 0, tzinfo=timezone.utc)  # раньше заданий соседнего теста
+    quiet = now - timedelta(minutes=1)
+    assert scheduler.deliver_due_tasks(now=quiet).users_scanned == 0
+    assert db.get(SchedulerRun, f"due:{quiet.isoformat()}") is None
+
+    users = [create_user(db, name=f"Shard{i}", email=f"tick-shard{i}@example.com", telegram_id=f"77100{i}") for i in range(6)]
+    for user in users:
+        user.next_delivery_at = now
+    db.commit()
+
+    stats = scheduler.deliver_due_tasks(now=now)
+    assert (stats.tasks_created, stats.messages_sent) == (6, 0)
+    chats = db.query(OutboxMessage.chat_id).filter(OutboxMessage.chat_id.in_([u.telegram_id for u in users])).all()
+    assert sorted(c for c, in chats) == sorted(u.telegram_id for u in users)
+    run_key = f"due:{now.isoformat()}"
+    shards = db.query(SchedulerShard).filter(SchedulerShard.run_key == run_key).all()
+    assert len(shards) == 3 and all(s.done for s in shards)
+
+    db.query(SchedulerRun).filter(SchedulerRun.run_key == run_key).update({"created_at": now - timedelta(days=2)})
+    db.commit()
+    assert scheduler.prune_delivery_runs() >= 1
+    assert db.query(SchedulerShard).filter(SchedulerShard.run_key == run_key).count() == 0
+
+
+def test_delivery_settings_endpoint(client, db):
+    user = create_user(db, name="Tz", email="tz@example.com")
+    headers = {"Authorization": f"Bearer {create_access_token(subject=user.email, user_id=user.id, role=user.role)}"}
+
+    r = client.put("/api/me/delivery", json={"timezone": "Mars/Olympus", "daily_hour": 9}, headers=headers)
+    assert r.status_code == 422
+    r = client.put("/api/me/delivery", json={"timezone": "Asia/Vladivostok", "daily_hour": 7}, headers=headers)
+    assert r.status_code == 200, r.text
+    assert r.json()["timezone"] == "Asia/Vladivostok"
+    assert client.get("/api/me/delivery", headers=headers).json()["daily_hour"] == 7
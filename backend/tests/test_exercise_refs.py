@@ -0,0 +1,82 @@
+from datetime import date, timedelta
+
+from sqlalchemy import insert, select
+
+from app.exercises_store import catalog, list_exercises
+from app.manage import backfill_task_exercises
+from app.models import Exercise, Task, User
+from app.services import create_user
+
+
+def get_or_create(db, email, role="user"):
+    user = db.query(User).filter(User.email == email).first() or create_user(db, name=email.split("@")[0], email=email)
+    user.role = role
+    db.commit()
+    return user
+
+
+def test_generated_task_references_catalog(client, db, auth):
+    user = get_or_create(db, "ref-today@example.com")
+    r = client.get("/api/tasks/today", headers=auth(user))
+    assert r.status_code == 200, r.text
+
+    task = db.get(Task, r.json()["id"])
+    assert task.custom_text is None
+    assert r.json()["text"] == db.get(Exercise, task.exercise_id).text
+
+
+def test_removed_exercise_leaves_rotation_but_keeps_history_text(client, db, auth):
+    admin = get_or_create(db, "ref-admin@example.com", role="admin")
+    user = get_or_create(db, "ref-history@example.com")
+    items = client.post("/api/admin/exercises", params={"text": "Практика на удаление"}, headers=auth(admin)).json()
+    exercise_id = next(e["id"] for e in items if e["text"] == "Практика на удаление")
+    task = Task(user_id=user.id, exercise_id=exercise_id)
+    db.add(task)
+    db.commit()
+
+    r = client.delete(f"/api/admin/exercises/{exercise_id}", headers=auth(admin))
+    assert r.status_code == 200
+    assert exercise_id not in [e["id"] for e in r.json()]
+    assert exercise_id not in [e.id for e in list_exercises(db)]
+    assert client.delete(f"/api/admin/exercises/{exercise_id}", headers=auth(admin)).status_code == 404
+
+    history = client.get("/api/tasks", headers=auth(user)).json()
+    assert [t["text"] for t in history if t["id"] == task.id] == ["Практика на удаление"]
+
+
+def test_backfill_replaces_text_copies_with_references(db):
+    user = get_or_create(db, "ref-backfill@example.com")
+    current = list_exercises(db)[0]
+    rows = [current.text] * 3 + ["Старая удалённая практика"] * 3 + ["Задание от админа"]
+    db.execute(insert(Task.__table__), [
+        {"user_id": user.id, "text": text, "task_date": date(2021, 1, 1) + timedelta(days=i)} for i, text in enumerate(rows)
+    ])
+    db.commit()
+
+    backfill_task_exercises(db, chunk_size=2, archive_min_tasks=3)
+
+    tasks = db.scalars(select(Task).where(Task.user_id == user.id).order_by(Task.id)).all()
+    assert [t.text for t in tasks] == rows
+    assert {t.exercise_id for t in tasks[:3]} == {current.id}
+    archived = db.get(Exercise, tasks[3].exercise_id)
+    assert archived.archived_at is not None and archived.id not in [e.id for e in list_exercises(db)]
+    assert all(t.custom_text is None for t in tasks[:6])
+    assert (tasks[6].exercise_id, tasks[6].custom_text) == (None, "Задание от админа")
+    assert catalog.text_of(archived.id) == "Старая удалённая практика"
+
+
+def test_seeding_catalog_leaves_callers_transaction_open(file_session_factory, monkeypatch):
+    for name in ("_items", "_texts", "_version", "_checked_at"):
+        monkeypatch.setattr(catalog, name, getattr(catalog, name))
+    catalog.invalidate()
+    db = file_session_factory()
+    user = create_user(db, name="Seed", email="seed-cursor@example.com")
+    user.exercise_cursor = 41
+    db.flush()
+
+    # каталога в новой БД нет: чтение засеивает его, но не коммитит чужой UPDATE
+    assert list_exercises(db)
+    db.rollback()
+    assert db.scalar(select(User.exercise_cursor).where(User.id == user.id)) == 0
+    assert db.scalar(select(Exercise.id).limit(1)) is None
+    db.close()
@@ -0,0 +1,31 @@
+from app.exercises_store import ExerciseCatalog, add_exercise, catalog, remove_exercise
+
+
+def test_catalog_reads_from_memory_until_version_changes(db):
+    worker_a = ExerciseCatalog(check_interval=0)
+    worker_b = ExerciseCatalog(check_interval=3600)
+    before = worker_a.items(db)
+    assert before == worker_b.items(db)
+
+    worker_a.add(db, "Упражнение от другого воркера")
+    # воркер B в пределах интервала проверки отдаёт кэш и в базу не ходит
+    assert worker_b.items(db) == before
+    worker_b.invalidate()
+    assert [e.text for e in worker_b.items(db)][-1] == "Упражнение от другого воркера"
+
+    added = worker_b.items(db)[-1]
+    worker_b.remove(db, added.id)
+    assert worker_a.items(db) == before
+
+
+def test_ids_are_stable_after_removal(db):
+    items = add_exercise(db, "Первое")
+    first = items[-1]
+    items = add_exercise(db, "Второе")
+    second = items[-1]
+
+    remaining = remove_exercise(db, first.id)
+    assert second in remaining and first not in remaining
+    assert remove_exercise(db, first.id) is None
+    remove_exercise(db, second.id)
+    assert catalog.version is not None
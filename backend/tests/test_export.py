@@ -0,0 +1,63 @@
+import csv
+import io
+from datetime import date
+
+import pytest
+
+from app.models import Task, TaskStatus, User
+from app.services import create_user
+
+
+@pytest.fixture()
+def seeded(db, admin_headers):
+    if db.query(User).filter(User.email == "exp0@example.com").first():
+        return admin_headers
+    users = [create_user(db, name=f"Exp{i}", email=f"exp{i}@example.com") for i in range(2)]
+    for i in range(6):
+        db.add(Task(
+            user_id=users[i % 2].id,
+            text="exp-breath" if i < 4 else "exp-walk",
+            task_date=date(2023, 2, 1 + i),
+            status=TaskStatus.completed.value if i in (0, 1, 4) else TaskStatus.pending.value,
+        ))
+    db.commit()
+    return admin_headers
+
+
+def read_csv(response):
+    return list(csv.DictReader(io.StringIO(response.text)))
+
+
+def test_csv_exports(client, seeded):
+    headers = seeded
+    period = {"since": "2023-02-01", "until": "2023-03-01"}
+
+    r = client.get("/api/admin/export/tasks", params=period, headers=headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    rows = read_csv(r)
+    assert [row["task_date"] for row in rows] == [f"2023-02-0{i}" for i in range(1, 7)]
+    assert rows[0]["email"] == "exp0@example.com"
+
+    rows = {row["exercise"]: row for row in read_csv(client.get("/api/admin/export/exercises", params=period, headers=headers))}
+    assert (rows["exp-breath"]["tasks"], rows["exp-breath"]["completed"], float(rows["exp-breath"]["completion_rate"])) == ("4", "2", 0.5)
+    assert (rows["exp-walk"]["users"], float(rows["exp-walk"]["completion_rate"])) == ("2", 0.5)
+
+    rows = {row["email"]: row for row in read_csv(client.get("/api/admin/export/users", params=period, headers=headers))}
+    assert (rows["exp0@example.com"]["task_count"], rows["exp0@example.com"]["completed_count"]) == ("3", "2")
+    assert rows["tests-admin@example.com"]["task_count"] == "0"
+
+
+def test_parquet_export(client, seeded):
+    pq = pytest.importorskip("pyarrow.parquet")
+    headers = seeded
+    r = client.get("/api/admin/export/tasks", params={"format": "parquet", "since": "2023-02-01", "until": "2023-03-01"}, headers=headers)
+    assert r.status_code == 200
+    table = pq.read_table(io.BytesIO(r.content))
+    assert table.num_rows == 6
+    assert table.column("text").to_pylist()[-1] == "exp-walk"
+
+
+def test_export_rejects_unknown_dataset(client, admin_headers):
+    assert client.get("/api/admin/export/secrets", headers=admin_headers).status_code == 404
+    assert client.get("/api/admin/export/tasks", params={"format": "xlsx"}, headers=admin_headers).status_code == 400
@@ -0,0 +1,58 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from app.models import Task
+from app.pagination import NEXT_CURSOR_HEADER
+from app.services import create_user
+
+
+def seed_tasks(db, user, n):
+    base = datetime(2024, 1, 1, 9, tzinfo=timezone.utc)
+    # по два задания на одну и ту же секунду — проверяем разрешение ничьих по id
+    # (дни заданий разные: больше одного задания на день не бывает)
+    for i in range(n):
+        sent_at = base + timedelta(days=i // 2)
+        db.add(Task(user_id=user.id, text=f"t{i}", sent_at=sent_at, task_date=base.date() + timedelta(days=i)))
+    db.commit()
+
+
+def test_cursor_pagination_walks_history_once(client, db, auth):
+    user = create_user(db, name="Hist", email="hist@example.com")
+    seed_tasks(db, user, 7)
+    expected = [t.id for t in db.query(Task).filter(Task.user_id == user.id).order_by(Task.sent_at.desc(), Task.id.desc())]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        r = client.get("/api/tasks", params=params, headers=auth(user))
+        assert r.status_code == 200, r.text
+        assert len(r.json()) <= 3
+        seen += [t["id"] for t in r.json()]
+        pages += 1
+        cursor = r.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+    assert seen == expected
+    assert pages == 3
+
+
+def test_invalid_cursor_is_rejected(client, db, auth):
+    user = create_user(db, name="Bad", email="badcursor@example.com")
+    r = client.get("/api/tasks", params={"cursor": "not-a-cursor"}, headers=auth(user))
+    assert r.status_code == 400
+
+
+def test_admin_ndjson_export_streams_all_rows(client, db, auth):
+    user = create_user(db, name="Export", email="export@example.com")
+    seed_tasks(db, user, 5)
+    admin = create_user(db, name="Adm", email="adm-export@example.com")
+    admin.role = "admin"
+    db.commit()
+
+    r = client.get(f"/api/admin/users/{user.id}/tasks/export", headers=auth(admin))
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [row["text"] for row in rows] == [f"t{i}" for i in (4, 3, 2, 1, 0)]
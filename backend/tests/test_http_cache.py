@@ -0,0 +1,68 @@
+from datetime import date
+
+from app.models import Task, User
+from app.pagination import NEXT_CURSOR_HEADER
+from app.services import create_user
+
+
+def tasks_queries(statements):
+    return [s for s in statements if "FROM tasks" in s or "FROM user_daily_progress" in s]
+
+
+def test_repeat_polls_get_304_without_task_queries(client, db, sql_statements, auth):
+    user = create_user(db, name="Etag", email="etag@example.com")
+    headers = auth(user)
+
+    today = client.get("/api/tasks/today", headers=headers)
+    progress = client.get("/api/progress", headers=headers)
+    assert progress.headers["cache-control"] == "private, no-cache"
+
+    sql_statements.clear()
+    r = client.get("/api/progress", headers={**headers, "If-None-Match": progress.headers["etag"]})
+    assert r.status_code == 304
+    assert tasks_queries(sql_statements) == []
+
+    # без If-None-Match тело отдаётся из кэша процесса, тоже без запросов к заданиям
+    sql_statements.clear()
+    r = client.get("/api/progress", headers=headers)
+    assert r.status_code == 200 and r.json() == progress.json()
+    assert tasks_queries(sql_statements) == []
+
+    # выполнение задания меняет версию: старый ETag больше не подходит
+    client.post(f"/api/tasks/complete/{today.json()['id']}", headers=headers)
+    r = client.get("/api/progress", headers={**headers, "If-None-Match": progress.headers["etag"]})
+    assert r.status_code == 200
+    assert r.json()["completed"] == progress.json()["completed"] + 1
+    r = client.get("/api/tasks/today", headers={**headers, "If-None-Match": today.headers["etag"]})
+    assert r.status_code == 200 and r.json()["status"] == "completed"
+
+
+def test_history_page_keeps_cursor_header_from_cache(client, db, sql_statements, auth):
+    user = create_user(db, name="EtagHist", email="etag-hist@example.com")
+    db.add_all([Task(user_id=user.id, text=f"h{i}", task_date=date(2022, 1, 1 + i)) for i in range(3)])
+    db.commit()
+    headers = auth(user)
+
+    first = client.get("/api/tasks", params={"limit": 2}, headers=headers)
+    sql_statements.clear()
+    again = client.get("/api/tasks", params={"limit": 2}, headers=headers)
+    assert tasks_queries(sql_statements) == []
+    assert again.json() == first.json()
+    assert again.headers[NEXT_CURSOR_HEADER] == first.headers[NEXT_CURSOR_HEADER]
+    assert again.headers["etag"] == first.headers["etag"]
+    assert client.get("/api/tasks", params={"limit": 1}, headers=headers).headers["etag"] != first.headers["etag"]
+
+
+def test_exercise_catalog_etag_follows_catalog_version(client, db, auth):
+    admin = db.query(User).filter(User.email == "etag-admin@example.com").first() or create_user(db, name="EtagAdmin", email="etag-admin@example.com")
+    admin.role = "admin"
+    db.commit()
+    headers = auth(admin)
+
+    r = client.get("/api/admin/exercises", headers=headers)
+    assert client.get("/api/admin/exercises", headers={**headers, "If-None-Match": r.headers["etag"]}).status_code == 304
+
+    client.post("/api/admin/exercises", params={"text": "Новая практика"}, headers=headers)
+    changed = client.get("/api/admin/exercises", headers={**headers, "If-None-Match": r.headers["etag"]})
+    assert changed.status_code == 200
+    assert "Новая практика" in [e["text"] for e in changed.json()]
@@ -0,0 +1,35 @@
+from prometheus_client import REGISTRY
+
+from app import metrics
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_metrics_endpoint_reports_hot_paths(client):
+    hashed = sample("password_hash_duration_seconds_count", operation="hash")
+    generated = sample("tasks_generated_total", source="on_demand")
+    selects = sample("db_query_duration_seconds_count", operation="SELECT")
+
+    client.post("/api/users/register", json={"name": "Metr", "email": "metrics@example.com", "password": "secret"})
+    token = client.post("/api/auth/login", json={"email": "metrics@example.com", "password": "secret"}).json()["access_token"]
+    assert client.get("/api/tasks/today", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/tasks/today",status="200"}' in r.text
+    assert 'db_pool_connections{state="checked_out"}' in r.text
+    assert sample("password_hash_duration_seconds_count", operation="hash") == hashed + 1
+    assert sample("tasks_generated_total", source="on_demand") == generated + 1
+    assert sample("db_query_duration_seconds_count", operation="SELECT") > selects
+
+
+def test_disabled_metrics_are_noops(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    before = sample("telegram_send_total", result="sent")
+    metrics.count(metrics.TELEGRAM_SENDS, "sent")
+    with metrics.timed(metrics.SCHEDULER_JOB_SECONDS, "noop"):
+        pass
+    assert sample("telegram_send_total", result="sent") == before
+    assert sample("scheduler_job_duration_seconds_count", job="noop") == 0
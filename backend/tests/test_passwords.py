@@ -0,0 +1,60 @@
+import pytest
+
+from app import passwords
+from app.models import User
+from app.passwords import PasswordPool, PasswordPoolBusy
+
+
+def test_pool_rejects_work_when_queue_is_full():
+    pool = PasswordPool(workers=1, max_pending=1)
+    try:
+        first = pool.submit(passwords._hash, "slow", 12)
+        with pytest.raises(PasswordPoolBusy):
+            pool.submit(passwords._hash, "second", 4)
+        assert first.result().startswith("$2b$12$")
+        # слот освобождается после завершения
+        assert pool.run(passwords._verify_and_update, "second", pool.run(passwords._hash, "second", 4), 4)[0]
+    finally:
+        pool.shutdown()
+
+
+def test_login_returns_503_when_pool_is_busy(client, monkeypatch):
+    client.post("/api/users/register", json={"name": "Busy", "email": "busy@example.com", "password": "pass1234"})
+
+    class BusyPool:
+        def run(self, fn, *args):
+            raise PasswordPoolBusy()
+
+        async def run_async(self, fn, *args):
+            raise PasswordPoolBusy()
+
+    monkeypatch.setattr(passwords, "password_pool", BusyPool())
+    r = client.post("/api/auth/login", json={"email": "busy@example.com", "password": "pass1234"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+
+
+def test_login_rehashes_when_cost_changes(client, db):
+    old_hash = passwords._hash("pass1234", 5)
+    db.add(User(name="Rehash", email="rehash@example.com", password_hash=old_hash))
+    db.commit()
+
+    r = client.post("/api/auth/login", json={"email": "rehash@example.com", "password": "pass1234"})
+    assert r.status_code == 200, r.text
+
+    db.expire_all()
+    new_hash = db.query(User).filter(User.email == "rehash@example.com").one().password_hash
+    assert new_hash != old_hash
+    assert new_hash.startswith(f"$2b${passwords.settings.bcrypt_rounds:02d}$")
+
+
+def test_auth_routes_await_bcrypt_instead_of_blocking_a_thread(client, monkeypatch):
+    def blocking_run(fn, *args):
+        raise AssertionError("bcrypt must not hold a request thread")
+
+    monkeypatch.setattr(passwords.password_pool, "run", blocking_run)
+    r = client.post("/api/users/register", json={"name": "Awaits", "email": "awaits@example.com", "password": "pass1234"})
+    assert r.status_code == 200, r.text
+    r = client.post("/api/auth/login", json={"email": "awaits@example.com", "password": "pass1234"})
+    assert r.status_code == 200, r.text
+    assert client.post("/api/auth/login", json={"email": "awaits@example.com", "password": "wrong"}).status_code == 401
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta, timezone
+
+from app import services
+from app.models import Task, TaskStatus
+from app.progress import progress_from_rollup, progress_from_tasks, rebuild_rollup
+from app.services import create_daily_task, create_user, mark_task_completed
+
+
+def seed_history(db, user, now):
+    # задания за последние 40 дней, выполнено каждое второе
+    for days_ago in range(40):
+        status = TaskStatus.completed.value if days_ago % 2 == 0 else TaskStatus.pending.value
+        db.add(Task(user_id=user.id, text="t", sent_at=now - timedelta(days=days_ago), status=status))
+    db.commit()
+
+
+def test_single_query_progress_matches_rollup(db):
+    user = create_user(db, name="Prog", email="prog@example.com")
+    now = datetime.now(timezone.utc).replace(hour=12)
+    seed_history(db, user, now)
+    rebuild_rollup(db, [user.id])
+
+    from_tasks = progress_from_tasks(db, user.id, now)
+    assert from_tasks["total"] == 40
+    assert from_tasks["completed"] == 20
+    assert from_tasks["today_completed"] == 1
+    assert from_tasks == progress_from_rollup(db, user.id, now)
+
+
+def test_rollup_is_updated_incrementally(db, monkeypatch):
+    monkeypatch.setattr(services.settings, "progress_rollup_enabled", True)
+    user = create_user(db, name="Roll", email="roll@example.com")
+
+    task = create_daily_task(db, user)
+    assert services.get_progress(db, user.id)["total"] == 1
+
+    mark_task_completed(db, user.id, task.id)
+    mark_task_completed(db, user.id, task.id)  # повторная отметка не удваивает счётчик
+    progress = services.get_progress(db, user.id)
+    assert progress["completed"] == 1
+    assert progress["today_completed"] == 1
+    assert progress == progress_from_tasks(db, user.id)
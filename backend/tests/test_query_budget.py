@@ -0,0 +1,113 @@
+import os
+
+import pytest
+from fastapi import BackgroundTasks, Depends, FastAPI
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import async_routers, health, query_budget, routers
+from app.database import Base, get_db
+from app.models import Task, User
+from app.query_budget import QueryBudgetExceeded, QueryBudgetMiddleware, budget_of, record
+from app.security import create_access_token
+from app.user_cache import telegram_identity, user_cache
+
+
+def budget_app(budget: int) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/two-queries")
+    @query_budget.query_budget(budget)
+    def two_queries(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+        db.execute(select(User.id).limit(1)).all()
+        db.execute(select(Task.id).limit(1)).all()
+        # фоновая работа после ответа в бюджет не входит
+        background_tasks.add_task(lambda: [db.execute(select(User.id).limit(1)).all() for _ in range(3)])
+        return {"ok": True}
+
+    @app.get("/undeclared")
+    def undeclared():
+        return {"ok": True}
+
+    app.add_middleware(QueryBudgetMiddleware, mode="raise")
+    return app
+
+
+def test_every_api_route_declares_a_budget():
+    routes = [r for r in routers.router.routes + async_routers.router.routes + health.router.routes if isinstance(r, APIRoute)]
+    missing = [f"{sorted(r.methods)} {r.path}" for r in routes if budget_of(r.endpoint) is None]
+    assert missing == []
+
+
+def test_route_over_budget_fails():
+    with TestClient(budget_app(2)) as client:
+        assert client.get("/two-queries").status_code == 200
+        with pytest.raises(QueryBudgetExceeded, match="not declared"):
+            client.get("/undeclared")
+
+    with TestClient(budget_app(1)) as client, pytest.raises(QueryBudgetExceeded, match="2 queries, budget 1"):
+        client.get("/two-queries")
+
+
+def test_record_collects_queries_rows_and_time(db):
+    with record() as log:
+        db.execute(select(User.id).limit(1)).all()
+        db.execute(text("UPDATE users SET name = name WHERE id = -1"))
+    db.rollback()
+    assert log.count == 2
+    assert log.queries[1].rows == 0
+    assert log.seconds >= 0
+
+
+@pytest.mark.skipif(not os.environ.get("QUERY_PLAN_DATABASE_URL"), reason="нужен Postgres в QUERY_PLAN_DATABASE_URL")
+def test_no_seq_scans_on_big_tables_at_seeded_scale(monkeypatch):
+    """EXPLAIN каждого SELECT на засеянной базе: Seq Scan по tasks/users — только где маршрут его разрешил."""
+    from benchmarks.seed import EMAIL_TEMPLATE, seed
+
+    engine = create_engine(os.environ["QUERY_PLAN_DATABASE_URL"])
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with factory() as db:
+        seed(db, users=20000, tasks_per_user=30)
+        user = db.scalars(select(User).where(User.email == EMAIL_TEMPLATE.format(0))).one()
+        admin = db.scalars(select(User).where(User.role == "admin")).first()
+        if admin is None:
+            admin = User(name="Admin", email="plans-admin@example.com", role="admin")
+            db.add(admin)
+            db.commit()
+        telegram_id = db.scalar(select(User.telegram_id).where(User.telegram_id.is_not(None)).limit(1))
+        user_id, admin_token = user.id, create_access_token(subject=admin.email, user_id=admin.id, role="admin")
+        user_token = create_access_token(subject=user.email, user_id=user.id, role=user.role)
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql("ANALYZE")
+
+    def override_get_db():
+        session = factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app = FastAPI()
+    app.include_router(routers.router)
+    app.add_middleware(QueryBudgetMiddleware, mode="raise")
+    app.dependency_overrides[get_db] = override_get_db
+    monkeypatch.setattr(routers, "SessionLocal", factory)
+    monkeypatch.setattr(routers.settings, "bot_internal_token", "bot-secret")
+    monkeypatch.setattr(query_budget, "_explain", True)
+    # кэши процесса держат пользователей тестовой SQLite с теми же id
+    user_cache.clear()
+    telegram_identity.clear()
+
+    user_headers = {"Authorization": f"Bearer {user_token}"}
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    with TestClient(app) as client:
+        for path in ("/api/tasks/today", "/api/tasks", "/api/progress", "/api/me/delivery"):
+            assert client.get(path, headers=user_headers).status_code == 200, path
+        for path in ("/api/admin/users", "/api/admin/users?telegram_linked=true", f"/api/admin/users/{user_id}/tasks"):
+            assert client.get(path, headers=admin_headers).status_code == 200, path
+        r = client.get("/api/bot/today", params={"telegram_id": telegram_id}, headers={"Authorization": "Bearer bot-secret"})
+        assert r.status_code == 200
+    engine.dispose()
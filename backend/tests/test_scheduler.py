@@ -0,0 +1,52 @@
+import functools
+
+import httpx
+
+from app import scheduler
+from app.telegram import TelegramDispatcher
+from app.models import Task, User
+from app.services import create_user, get_today_task
+from benchmarks.fake_telegram import FakeTelegram
+
+
+def test_send_daily_tasks_is_idempotent(db):
+    users = [create_user(db, name=f"Sched{i}", email=f"sched{i}@example.com") for i in range(7)]
+
+    stats = scheduler.send_daily_tasks(batch_size=3)
+    assert stats.tasks_created >= len(users)
+    assert stats.users_scanned == db.query(User).count()
+
+    for u in users:
+        assert get_today_task(db, u) is not None
+        assert db.query(Task).filter(Task.user_id == u.id).count() == 1
+
+    # повторный запуск ничего не создаёт
+    again = scheduler.send_daily_tasks(batch_size=3)
+    assert again.tasks_created == 0
+
+
+def test_send_daily_tasks_delivers_through_outbox(file_session_factory, monkeypatch):
+    fake = FakeTelegram(rate_limit_every=4, retry_after=0.1)
+    db = file_session_factory()
+    tg_users = [
+        create_user(db, name=f"Tg{i}", email=f"tg-sched{i}@example.com", telegram_id=str(555000 + i)) for i in range(6)
+    ]
+    create_user(db, name="NoTg", email="notg-sched@example.com")
+
+    monkeypatch.setattr(scheduler, "SessionLocal", file_session_factory)
+    monkeypatch.setattr(scheduler.settings, "telegram_bot_token", "test-token")
+    monkeypatch.setattr(
+        scheduler,
+        "TelegramDispatcher",
+        functools.partial(
+            TelegramDispatcher, retry_base_seconds=0.01, transport=httpx.ASGITransport(app=fake.app)
+        ),
+    )
+
+    stats = scheduler.send_daily_tasks(batch_size=2, concurrency=3)
+    assert stats.tasks_created == 7
+    assert stats.messages_sent == len(tg_users)
+    assert stats.messages_failed == 0
+    expected = {(u.telegram_id, f"Ваше задание на сегодня: {get_today_task(db, u).text}") for u in tg_users}
+    assert set(fake.messages) == expected
+    db.close()
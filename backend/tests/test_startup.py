@@ -0,0 +1,60 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app import database as db_mod
+from app import health
+from app import main as main_mod
+from app.database import warm_pool
+from app.main import app
+from app.manage import init_db
+from app.models import Exercise, User
+
+
+def test_health_and_readiness_probes(client, monkeypatch):
+    assert client.get("/healthz").json() == {"status": "ok"}
+    assert client.get("/readyz").json() == {"status": "ready"}
+
+    # остановка воркера: балансировщик должен перестать слать трафик
+    monkeypatch.setattr(health, "_ready", False)
+    assert client.get("/readyz").status_code == 503
+    assert client.get("/healthz").status_code == 200
+
+
+def test_workers_skip_schema_until_init_db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'fresh.db'}", connect_args={"check_same_thread": False})
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(main_mod.settings, "db_init_on_startup", False)
+    monkeypatch.setattr(main_mod.settings, "db_pool_warmup", 2)
+    monkeypatch.setattr(main_mod, "engine", engine)
+    monkeypatch.setattr(main_mod, "SessionLocal", factory)
+
+    def override_get_db():
+        with factory() as db:
+            yield db
+
+    app.dependency_overrides[db_mod.get_db] = override_get_db
+    try:
+        with TestClient(app) as client:
+            # воркер поднялся на пустой базе, пул прогрет, но трафик ему ещё рано
+            assert engine.pool.checkedin() == 2
+            assert client.get("/readyz").status_code == 503
+
+            init_db(engine, factory)
+            init_db(engine, factory)
+            assert client.get("/readyz").status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+
+    with factory() as db:
+        assert db.scalars(select(User.email).where(User.role == "admin")).all() == [main_mod.settings.admin_email]
+        assert db.scalar(select(Exercise.id).limit(1)) is not None
+    engine.dispose()
+
+
+def test_warm_pool_is_capped_by_pool_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_mod.settings, "db_pool_size", 3)
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'pool.db'}", pool_size=3)
+    assert warm_pool(engine, 10) == 3
+    assert engine.pool.checkedin() == 3
+    engine.dispose()
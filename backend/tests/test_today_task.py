@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app import routers
+from app.database import get_db
+from app.exercises_store import load_exercises
+from app.models import Task, User
+from app.security import create_access_token
+from app.services import create_daily_tasks_bulk, create_user, get_or_create_today_task, iter_user_chunks
+
+
+def test_parallel_today_requests_create_one_task(file_session_factory, monkeypatch):
+    monkeypatch.setattr(routers.settings, "bot_internal_token", "bot-secret")
+    db = file_session_factory()
+    user = create_user(db, name="Race", email="race@example.com", telegram_id="777")
+    user_headers = {"Authorization": f"Bearer {create_access_token(subject=user.email, user_id=user.id, role=user.role)}"}
+    bot_headers = {"Authorization": "Bearer bot-secret"}
+
+    def override_get_db():
+        session = file_session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app = FastAPI()
+    app.include_router(routers.router)
+    app.dependency_overrides[get_db] = override_get_db
+
+    def fire(i: int):
+        if i % 50 == 0:
+            # утренняя рассылка в тот же момент
+            with file_session_factory() as session:
+                for chunk in iter_user_chunks(session, 100):
+                    create_daily_tasks_bulk(session, chunk)
+            return None
+        if i % 2:
+            r = client.get("/api/tasks/today", headers=user_headers)
+        else:
+            r = client.get("/api/bot/today", params={"telegram_id": "777"}, headers=bot_headers)
+        assert r.status_code == 200, r.text
+        return r.json()["id"]
+
+    with TestClient(app) as client, ThreadPoolExecutor(max_workers=32) as pool:
+        ids = {task_id for task_id in pool.map(fire, range(300)) if task_id is not None}
+
+    assert db.query(Task).filter(Task.user_id == user.id).count() == 1
+    assert ids == {db.query(Task.id).filter(Task.user_id == user.id).scalar()}
+    db.close()
+
+
+def test_rotation_uses_cursor_instead_of_history_count(db, sql_statements):
+    exercises = load_exercises(db)
+    single = create_user(db, name="Rot", email="rotation@example.com")
+    single.exercise_cursor = 2
+    bulk_users = [create_user(db, name=f"Rot{i}", email=f"rotation{i}@example.com") for i in range(2)]
+    bulk_users[1].exercise_cursor = len(exercises) + 1
+    db.commit()
+
+    sql_statements.clear()
+    task = get_or_create_today_task(db, single)
+    chunk = db.execute(
+        select(User.id, User.telegram_id, User.exercise_cursor, User.timezone).where(User.id.in_([u.id for u in bulk_users]))
+    ).all()
+    created = create_daily_tasks_bulk(db, chunk, exercises)
+    assert not [s for s in sql_statements if "count(" in s.lower()]
+
+    assert (task.exercise_id, task.custom_text, task.text) == (exercises[2].id, None, exercises[2].text)
+    assert [text for _, text in created] == [exercises[0].text, exercises[1].text]
+    db.expire_all()
+    assert [u.exercise_cursor for u in [single, *bulk_users]] == [3, 1, len(exercises) + 2]
@@ -0,0 +1,151 @@
+import time
+
+import httpx
+
+from .metrics import ENABLED as METRICS_ENABLED, BACKEND_REQUEST_SECONDS, TODAY_CACHE, count
+
+
+class BackendClient:
+  """Долгоживущий клиент backend: один пул keep-alive соединений на весь процесс бота.
+
+  Ответы /today кэшируются на пользователя на короткое время и сбрасываются
+  после /done, чтобы серия одинаковых команд не ходила в backend.
+
+  Пользователь передаётся по Telegram id; users.id из ответов запоминается
+  (зеркало кэша backend), и дальше запросы идут по нему. Регистрация сбрасывает
+  запомненное, устаревший id после 404 — тоже.
+  """
+
+  def __init__(self, base_url: str, internal_token: str | None = None, today_ttl: float = 30.0,
+               max_connections: int = 50, cache_size: int = 10000, identity_ttl: float = 3600.0):
+    self.base_url = base_url
+    self.headers = {"Authorization": f"Bearer {internal_token}"} if internal_token else {}
+    self.today_ttl = today_ttl
+    self.identity_ttl = identity_ttl
+    self.max_connections = max_connections
+    self.cache_size = cache_size
+    self._client: httpx.AsyncClient | None = None
+    self._today: dict[str, tuple[float, dict]] = {}
+    self._identity: dict[str, tuple[float, int]] = {}
+
+  async def start(self):
+    if self._client is None:
+      limits = httpx.Limits(
+        max_connections=self.max_connections,
+        max_keepalive_connections=self.max_connections,
+        keepalive_expiry=60,
+      )
+      self._client = httpx.AsyncClient(base_url=self.base_url, headers=self.headers, timeout=15, limits=limits)
+
+  async def close(self):
+    if self._client is not None:
+      await self._client.aclose()
+      self._client = None
+
+  @property
+  def client(self) -> httpx.AsyncClient:
+    if self._client is None:
+      raise RuntimeError("BackendClient.start() was not called")
+    return self._client
+
+  async def _request(self, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """Запрос к backend; endpoint — короткое имя для метрики, без id в пути."""
+    started = time.perf_counter()
+    status = "error"
+    try:
+      r = await self.client.request(method, url, **kwargs)
+      status = str(r.status_code)
+      return r
+    finally:
+      if METRICS_ENABLED:
+        BACKEND_REQUEST_SECONDS.labels(endpoint, status).observe(time.perf_counter() - started)
+
+  @staticmethod
+  def _get_fresh(cache: dict, key: str):
+    entry = cache.get(key)
+    if entry is None:
+      return None
+    expires_at, value = entry
+    if expires_at < time.monotonic():
+      cache.pop(key, None)
+      return None
+    return value
+
+  def _put_bounded(self, cache: dict, key: str, value, ttl: float):
+    if len(cache) >= self.cache_size:
+      now = time.monotonic()
+      for k in [k for k, (exp, _) in cache.items() if exp < now]:
+        del cache[k]
+      while len(cache) >= self.cache_size:
+        cache.pop(next(iter(cache)))
+    cache[key] = (time.monotonic() + ttl, value)
+
+  def forget_today(self, telegram_id):
+    self._today.pop(str(telegram_id), None)
+
+  def forget_identity(self, telegram_id):
+    self._identity.pop(str(telegram_id), None)
+
+  @staticmethod
+  def _user_missing(r: httpx.Response) -> bool:
+    """404 про пользователя; тело не JSON (404 прокси, не backend) — тоже промах кэша id."""
+    try:
+      body = r.json()
+    except ValueError:
+      return True
+    return not isinstance(body, dict) or body.get("detail") == "User not found"
+
+  async def _user_request(self, endpoint: str, method: str, url: str, telegram_id: str) -> httpx.Response:
+    """Запрос от имени пользователя: по запомненному users.id, иначе по Telegram id."""
+    user_id = self._get_fresh(self._identity, telegram_id)
+    if user_id is not None:
+      r = await self._request(endpoint, method, url, params={"user_id": user_id})
+      if not (r.status_code == 404 and self._user_missing(r)):
+        return r
+      self.forget_identity(telegram_id)
+    r = await self._request(endpoint, method, url, params={"telegram_id": telegram_id})
+    if r.is_success and self.identity_ttl > 0:
+      self._put_bounded(self._identity, telegram_id, r.json()["user_id"], self.identity_ttl)
+    return r
+
+  async def get_today(self, telegram_id) -> dict:
+    telegram_id = str(telegram_id)
+    cached = self._get_fresh(self._today, telegram_id)
+    if cached is not None:
+      count(TODAY_CACHE, "hit")
+      return cached
+    count(TODAY_CACHE, "miss")
+    r = await self._user_request("today", "GET", "/api/bot/today", telegram_id)
+    r.raise_for_status()
+    data = r.json()
+    if self.today_ttl > 0:
+      self._put_bounded(self._today, telegram_id, data, self.today_ttl)
+    return data
+
+  async def complete_task(self, telegram_id, task_id: int) -> dict:
+    telegram_id = str(telegram_id)
+    try:
+      r = await self._user_request("complete", "POST", f"/api/bot/complete/{task_id}", telegram_id)
+      r.raise_for_status()
+      return r.json()
+    finally:
+      self.forget_today(telegram_id)
+
+  async def claim_update(self, update_id: int) -> bool:
+    r = await self._request("claim_update", "POST", f"/api/bot/updates/{update_id}/claim")
+    r.raise_for_status()
+    return r.json()["claimed"]
+
+  async def release_update(self, update_id: int):
+    r = await self._request("release_update", "DELETE", f"/api/bot/updates/{update_id}/claim")
+    r.raise_for_status()
+
+  async def register_telegram(self, telegram_id: str, name: str, email: str):
+    # привязка могла перейти к другому пользователю backend
+    self.forget_identity(telegram_id)
+    self.forget_today(telegram_id)
+    await self._request("register", "POST", "/api/telegram/register", json={
+      "telegram_id": telegram_id,
+      "name": name,
+      "email": email
+    })
@@ -3,39 +3,49 @@ import os
 from aiogram import Bot, Dispatcher, F
 from aiogram.filters import Command
 from aiogram.types import Message
-import httpx
+
+from aiohttp import web
+
+from . import metrics
+from .api import BackendClient
+from .webhook import UpdateDeduplicator, UpdateWorkerPool, create_app
 
 API_URL = os.getenv("NEXT_PUBLIC_API_URL", "http://backend:8000")
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 BOT_INTERNAL_TOKEN = os.getenv("BOT_INTERNAL_TOKEN")
+BOT_TODAY_CACHE_TTL = float(os.getenv("BOT_TODAY_CACHE_TTL", "30"))
+BOT_IDENTITY_CACHE_TTL = float(os.getenv("BOT_IDENTITY_CACHE_TTL", "3600"))
+BOT_HTTP_MAX_CONNECTIONS = int(os.getenv("BOT_HTTP_MAX_CONNECTIONS", "50"))
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+BOT_WEBHOOK_URL = os.getenv("BOT_WEBHOOK_URL")
+BOT_WEBHOOK_PATH = os.getenv("BOT_WEBHOOK_PATH", "/telegram/webhook")
+BOT_WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET")
+BOT_WEBHOOK_PORT = int(os.getenv("BOT_WEBHOOK_PORT", "8080"))
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "16"))
+BOT_QUEUE_SIZE = int(os.getenv("BOT_QUEUE_SIZE", "1000"))
 
 bot = Bot(TOKEN)
 dp = Dispatcher()
+api = BackendClient(
+  API_URL, BOT_INTERNAL_TOKEN, today_ttl=BOT_TODAY_CACHE_TTL, max_connections=BOT_HTTP_MAX_CONNECTIONS,
+  identity_ttl=BOT_IDENTITY_CACHE_TTL,
+)
+# один пул соединений на процесс: открываем при старте диспетчера, закрываем при остановке
+dp.startup.register(api.start)
+dp.shutdown.register(api.close)
+metrics.install(dp, bot)
 
 
-async def api_get_today(user_id: int):
-  headers = {"Authorization": f"Bearer {BOT_INTERNAL_TOKEN}"} if BOT_INTERNAL_TOKEN else {}
-  async with httpx.AsyncClient(base_url=API_URL, headers=headers, timeout=15) as client:
-    r = await client.get("/api/bot/today", params={"user_id": user_id})
-    r.raise_for_status()
-    return r.json()
+async def api_get_today(telegram_id: str):
+  return await api.get_today(telegram_id)
 
 
-async def api_complete_task(user_id: int, task_id: int):
-  headers = {"Authorization": f"Bearer {BOT_INTERNAL_TOKEN}"} if BOT_INTERNAL_TOKEN else {}
-  async with httpx.AsyncClient(base_url=API_URL, headers=headers, timeout=15) as client:
-    r = await client.post(f"/api/bot/complete/{task_id}", params={"user_id": user_id})
-    r.raise_for_status()
-    return r.json()
+async def api_complete_task(telegram_id: str, task_id: int):
+  return await api.complete_task(telegram_id, task_id)
 
 
 async def api_register_telegram(telegram_id: str, name: str, email: str):
-  async with httpx.AsyncClient(base_url=API_URL, timeout=15) as client:
-    await client.post("/api/telegram/register", json={
-      "telegram_id": telegram_id,
-      "name": name,
-      "email": email
-    })
+  await api.register_telegram(telegram_id, name, email)
 
 
 @dp.message(Command("start"))
@@ -65,7 +75,7 @@ async def cmd_help(message: Message):
 @dp.message(Command("today"))
 async def cmd_today(message: Message):
   try:
-    data = await api_get_today(message.from_user.id)
+    data = await api_get_today(str(message.from_user.id))
     await message.answer(f"Сегодня: {data['text']} (id={data['id']})")
   except Exception:
     await message.answer("Не удалось получить задание")
@@ -79,7 +89,7 @@ async def cmd_done(message: Message):
     return
   task_id = int(parts[1])
   try:
-    await api_complete_task(message.from_user.id, task_id)
+    await api_complete_task(str(message.from_user.id), task_id)
     await message.answer("Отмечено как выполнено")
   except Exception:
     await message.answer("Не удалось отметить")
@@ -90,9 +100,43 @@ async def cmd_progress(message: Message):
   await message.answer("Прогресс лучше смотреть в веб-кабинете: http://localhost:3000")
 
 
+def webhook_app() -> web.Application:
+  # общая отметка update_id в backend нужна, когда реплик бота несколько
+  claim, release = (api.claim_update, api.release_update) if BOT_INTERNAL_TOKEN else (None, None)
+  pool = UpdateWorkerPool(
+    lambda update: dp.feed_update(bot, update),
+    workers=BOT_WORKERS,
+    queue_size=BOT_QUEUE_SIZE,
+    dedup=UpdateDeduplicator(claim=claim, release=release),
+  )
+  app = create_app(pool, bot, BOT_WEBHOOK_PATH, BOT_WEBHOOK_SECRET)
+  metrics.add_route(app)
+
+  async def on_startup(app: web.Application):
+    await dp.emit_startup(bot=bot)
+    if BOT_WEBHOOK_URL:
+      await bot.set_webhook(
+        BOT_WEBHOOK_URL + BOT_WEBHOOK_PATH,
+        secret_token=BOT_WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+      )
+
+  async def on_cleanup(app: web.Application):
+    await dp.emit_shutdown(bot=bot)
+    await bot.session.close()
+
+  app.on_startup.append(on_startup)
+  app.on_cleanup.append(on_cleanup)
+  return app
+
+
 async def main():
+  metrics.serve()
   await dp.start_polling(bot)
 
 
 if __name__ == "__main__":
-  asyncio.run(main())
+  if BOT_MODE == "webhook":
+    web.run_app(webhook_app(), port=BOT_WEBHOOK_PORT)
+  else:
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""Метрики Prometheus процесса бота: апдейты, запросы к backend, кэш /today, очередь, Bot API.
+
+BOT_METRICS_ENABLED=false выключает сбор (хелперы становятся пустыми) и /metrics.
+В webhook-режиме /metrics отдаёт тот же aiohttp-сервер, в polling — отдельный
+порт BOT_METRICS_PORT.
+"""
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest, start_http_server
+
+ENABLED = os.getenv("BOT_METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+PORT = int(os.getenv("BOT_METRICS_PORT", "9100"))
+
+UPDATES = Counter("bot_updates_total", "Апдейты Telegram", ["result"])
+UPDATE_SECONDS = Histogram("bot_update_duration_seconds", "Время обработки апдейта хендлерами")
+BACKEND_REQUEST_SECONDS = Histogram(
+  "bot_backend_request_duration_seconds", "Запросы бота к backend", ["endpoint", "status"]
+)
+TODAY_CACHE = Counter("bot_today_cache_total", "Обращения к кэшу /today", ["result"])
+QUEUE_DEPTH = Gauge("bot_queue_depth", "Апдейты, ожидающие воркеров (webhook-режим)")
+TELEGRAM_REQUEST_SECONDS = Histogram(
+  "bot_telegram_request_duration_seconds", "Вызовы Bot API", ["method", "result"]
+)
+
+_NOOP = nullcontext()
+
+
+def count(metric, *labels: str, amount: float = 1) -> None:
+  if ENABLED and amount:
+    (metric.labels(*labels) if labels else metric).inc(amount)
+
+
+@contextmanager
+def _timed(metric, labels):
+  started = time.perf_counter()
+  try:
+    yield
+  finally:
+    (metric.labels(*labels) if labels else metric).observe(time.perf_counter() - started)
+
+
+def timed(metric, *labels: str):
+  return _timed(metric, labels) if ENABLED else _NOOP
+
+
+async def update_middleware(handler, event, data):
+  """Внешний middleware dp.update: длительность и исход каждого апдейта, в обоих режимах."""
+  if not ENABLED:
+    return await handler(event, data)
+  started = time.perf_counter()
+  result = "processed"
+  try:
+    return await handler(event, data)
+  except Exception:
+    result = "failed"
+    raise
+  finally:
+    UPDATE_SECONDS.observe(time.perf_counter() - started)
+    UPDATES.labels(result).inc()
+
+
+class TelegramRequestMetrics(BaseRequestMiddleware):
+  """Middleware сессии aiogram: каждый вызов Bot API с исходом ok / rate_limited / error."""
+
+  async def __call__(self, make_request, bot, method):
+    started = time.perf_counter()
+    result = "ok"
+    try:
+      return await make_request(bot, method)
+    except TelegramRetryAfter:
+      result = "rate_limited"
+      raise
+    except Exception:
+      result = "error"
+      raise
+    finally:
+      TELEGRAM_REQUEST_SECONDS.labels(method.__api_method__, result).observe(time.perf_counter() - started)
+
+
+def install(dp, bot) -> None:
+  if ENABLED:
+    dp.update.outer_middleware(update_middleware)
+    bot.session.middleware(TelegramRequestMetrics())
+
+
+def add_route(app: web.Application) -> None:
+  if ENABLED:
+    async def metrics_endpoint(request: web.Request):
+      return web.Response(body=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+    app.router.add_get("/metrics", metrics_endpoint)
+
+
+def serve(port: int = PORT) -> None:
+  """Отдельный HTTP-сервер /metrics для polling-режима."""
+  if ENABLED:
+    start_http_server(port)
@@ -0,0 +1,147 @@
+"""Webhook-режим бота: aiohttp-эндпоинт кладёт апдейты в ограниченные очереди, их разбирает пул воркеров.
+
+Апдейты одного чата всегда попадают к одному воркеру (шард по chat_id), поэтому
+порядок сообщений в чате сохраняется, а разные чаты обрабатываются параллельно.
+Повторы одного update_id (ретраи Telegram, несколько реплик за балансировщиком)
+отсекаются локальным LRU и, если задан claim, общей отметкой в backend.
+Если обработчик упал, обе отметки снимаются: повторная доставка того же
+update_id будет обработана, а не отброшена как дубль.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.types import Update
+from aiohttp import web
+
+from .metrics import ENABLED as METRICS_ENABLED, QUEUE_DEPTH, UPDATES, count
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class UpdateDeduplicator:
+  def __init__(self, size: int = 10000, claim: Callable[[int], Awaitable[bool]] | None = None,
+               release: Callable[[int], Awaitable[None]] | None = None):
+    self.size = size
+    self.claim = claim
+    self.release = release
+    self._seen: OrderedDict[int, None] = OrderedDict()
+
+  async def first_seen(self, update_id: int) -> bool:
+    if update_id in self._seen:
+      return False
+    self._seen[update_id] = None
+    if len(self._seen) > self.size:
+      self._seen.popitem(last=False)
+    if self.claim is None:
+      return True
+    try:
+      return await self.claim(update_id)
+    except Exception:
+      # backend недоступен: лучше обработать апдейт ещё раз, чем потерять его
+      logger.warning("update %s: claim failed, processing anyway", update_id, exc_info=True)
+      return True
+
+  async def forget(self, update_id: int):
+    """Снимает отметку апдейта, обработка которого не удалась."""
+    self._seen.pop(update_id, None)
+    if self.release is None:
+      return
+    try:
+      await self.release(update_id)
+    except Exception:
+      # отметка в backend останется до чистки; повтор на другой реплике будет отброшен
+      logger.warning("update %s: release failed", update_id, exc_info=True)
+
+
+def chat_key(update: Update) -> int:
+  """Ключ шардирования: чат, из которого пришёл апдейт (или пользователь для inline/callback)."""
+  event = update.event
+  chat = getattr(event, "chat", None) or getattr(getattr(event, "message", None), "chat", None)
+  if chat is not None:
+    return chat.id
+  user = getattr(event, "from_user", None)
+  if user is not None:
+    return user.id
+  return update.update_id
+
+
+class UpdateWorkerPool:
+  def __init__(self, handle: Callable[[Update], Awaitable[None]], workers: int = 8, queue_size: int = 1000,
+               dedup: UpdateDeduplicator | None = None):
+    self.handle = handle
+    self.dedup = dedup or UpdateDeduplicator()
+    per_worker = max(1, queue_size // workers)
+    self._queues = [asyncio.Queue(maxsize=per_worker) for _ in range(workers)]
+    self._tasks: list[asyncio.Task] = []
+
+  def depth(self) -> int:
+    return sum(q.qsize() for q in self._queues)
+
+  def submit(self, update: Update) -> bool:
+    """Кладёт апдейт в очередь его чата; False — очередь полна, Telegram повторит доставку."""
+    queue = self._queues[chat_key(update) % len(self._queues)]
+    try:
+      queue.put_nowait(update)
+    except asyncio.QueueFull:
+      count(UPDATES, "rejected")
+      return False
+    return True
+
+  async def _worker(self, queue: asyncio.Queue):
+    while True:
+      update = await queue.get()
+      try:
+        if await self.dedup.first_seen(update.update_id):
+          try:
+            await self.handle(update)
+          except Exception:
+            await self.dedup.forget(update.update_id)
+            raise
+        else:
+          count(UPDATES, "duplicate")
+      except Exception:
+        logger.exception("update %s failed", update.update_id)
+      finally:
+        queue.task_done()
+
+  def start(self):
+    if not self._tasks:
+      if METRICS_ENABLED:
+        QUEUE_DEPTH.set_function(self.depth)
+      self._tasks = [asyncio.create_task(self._worker(q)) for q in self._queues]
+
+  async def stop(self):
+    # дорабатываем то, что уже принято (Telegram получил 200 и повторять не будет)
+    for queue in self._queues:
+      await queue.join()
+    for task in self._tasks:
+      task.cancel()
+    await asyncio.gather(*self._tasks, return_exceptions=True)
+    self._tasks = []
+
+
+def create_app(pool: UpdateWorkerPool, bot: Bot, path: str, secret: str | None = None) -> web.Application:
+  async def receive(request: web.Request):
+    if secret and request.headers.get(SECRET_HEADER) != secret:
+      return web.Response(status=401)
+    update = Update.model_validate(await request.json(), context={"bot": bot})
+    if not pool.submit(update):
+      return web.Response(status=503)
+    return web.Response()
+
+  async def on_startup(app: web.Application):
+    pool.start()
+
+  async def on_shutdown(app: web.Application):
+    await pool.stop()
+
+  app = web.Application()
+  app.router.add_post(path, receive)
+  app.on_startup.append(on_startup)
+  app.on_shutdown.append(on_shutdown)
+  return app
@@ -0,0 +1,89 @@
+"""Задержка запросов бота к backend: клиент на каждый вызов против общего пула и кэша /today.
+
+Запуск из каталога bot/: python -m benchmarks.bench_api_client [--users 50] [--rounds 20]
+Backend подменяется локальной aiohttp-заглушкой, поэтому замеряется только транспорт.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from aiohttp import web
+
+from app.api import BackendClient
+
+HOST = "127.0.0.1"
+
+
+def stub_app() -> web.Application:
+  async def today(request: web.Request):
+    # в заглушке users.id совпадает с Telegram id
+    user_id = int(request.query.get("user_id") or request.query["telegram_id"])
+    return web.json_response({"id": user_id, "text": "Сделай паузу и подыши.", "status": "sent", "user_id": user_id})
+
+  async def complete(request: web.Request):
+    user_id = int(request.query.get("user_id") or request.query["telegram_id"])
+    return web.json_response({"success": True, "user_id": user_id})
+
+  app = web.Application()
+  app.router.add_get("/api/bot/today", today)
+  app.router.add_post("/api/bot/complete/{task_id}", complete)
+  return app
+
+
+async def per_call_client(base_url: str, user_id: int):
+  # прежнее поведение бота: новый клиент, TCP-соединение и TLS-контекст на каждый вызов
+  async with httpx.AsyncClient(base_url=base_url, timeout=15) as client:
+    r = await client.get("/api/bot/today", params={"user_id": user_id})
+    r.raise_for_status()
+    return r.json()
+
+
+async def measure(name: str, call, users: int, rounds: int):
+  latencies: list[float] = []
+
+  async def one_user(user_id: int):
+    for _ in range(rounds):
+      started = time.perf_counter()
+      await call(user_id)
+      latencies.append((time.perf_counter() - started) * 1000)
+
+  started = time.perf_counter()
+  await asyncio.gather(*(one_user(u) for u in range(1, users + 1)))
+  elapsed = time.perf_counter() - started
+  latencies.sort()
+  p95 = latencies[int(len(latencies) * 0.95) - 1]
+  print(f"{name:<22} req={len(latencies):>6} rps={len(latencies) / elapsed:>8.0f} "
+        f"p50={statistics.median(latencies):6.2f}ms p95={p95:6.2f}ms")
+
+
+async def main(users: int, rounds: int):
+  runner = web.AppRunner(stub_app(), access_log=None)
+  await runner.setup()
+  site = web.TCPSite(runner, HOST, 0)
+  await site.start()
+  port = site._server.sockets[0].getsockname()[1]
+  base_url = f"http://{HOST}:{port}"
+  try:
+    await measure("client per call", lambda u: per_call_client(base_url, u), users, rounds)
+
+    shared = BackendClient(base_url, today_ttl=0, max_connections=users)
+    await shared.start()
+    await measure("shared pool", shared.get_today, users, rounds)
+    await shared.close()
+
+    cached = BackendClient(base_url, today_ttl=30, max_connections=users)
+    await cached.start()
+    await measure("shared pool + cache", cached.get_today, users, rounds)
+    await cached.close()
+  finally:
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--users", type=int, default=50)
+  parser.add_argument("--rounds", type=int, default=20)
+  args = parser.parse_args()
+  asyncio.run(main(args.users, args.rounds))
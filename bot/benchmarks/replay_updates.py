@@ -0,0 +1,164 @@
+"""Пропускная способность webhook-режима: воспроизводит записанные апдейты через пул воркеров.
+
+Запуск из каталога bot/: python -m benchmarks.replay_updates [--chats 200] [--workers 1 16]
+Backend и Bot API подменяются одной локальной aiohttp-заглушкой с задержкой ответа.
+Каждый апдейт доставляется дважды, как при ретраях Telegram: обработан должен быть один раз,
+а /done внутри чата должны прийти в backend в исходном порядке.
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:BENCHMARK")
+os.environ.setdefault("BOT_INTERNAL_TOKEN", "benchmark")
+
+import aiohttp  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from app import bot as bot_module  # noqa: E402
+
+HOST = "127.0.0.1"
+RECORDED = Path(__file__).with_name("recorded_updates.json")
+
+
+class Stub:
+  def __init__(self, latency: float):
+    self.latency = latency
+    self.sent = 0
+    self.done: dict[int, list[int]] = defaultdict(list)
+    self.claimed: set[int] = set()
+    self.all_sent = asyncio.Event()
+    self.expected = 0
+
+  def app(self) -> web.Application:
+    async def today(request: web.Request):
+      await asyncio.sleep(self.latency)
+      user_id = int(request.query.get("user_id") or request.query["telegram_id"])
+      return web.json_response({"id": 1, "text": "Подыши 5 минут", "status": "pending", "user_id": user_id})
+
+    async def complete(request: web.Request):
+      await asyncio.sleep(self.latency)
+      # в заглушке users.id совпадает с Telegram id
+      user_id = int(request.query.get("user_id") or request.query["telegram_id"])
+      self.done[user_id].append(int(request.match_info["task_id"]))
+      return web.json_response({"success": True, "user_id": user_id})
+
+    async def register(request: web.Request):
+      await asyncio.sleep(self.latency)
+      return web.json_response({})
+
+    async def claim(request: web.Request):
+      update_id = int(request.match_info["update_id"])
+      claimed = update_id not in self.claimed
+      self.claimed.add(update_id)
+      return web.json_response({"claimed": claimed})
+
+    async def bot_api(request: web.Request):
+      form = await request.post()
+      await asyncio.sleep(self.latency / 2)
+      self.sent += 1
+      if self.sent >= self.expected:
+        self.all_sent.set()
+      chat_id = int(form["chat_id"])
+      return web.json_response({"ok": True, "result": {
+        "message_id": self.sent, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": form["text"],
+      }})
+
+    app = web.Application()
+    app.router.add_get("/api/bot/today", today)
+    app.router.add_post("/api/bot/complete/{task_id}", complete)
+    app.router.add_post("/api/telegram/register", register)
+    app.router.add_post("/api/bot/updates/{update_id}/claim", claim)
+    app.router.add_post("/bot{token}/{method}", bot_api)
+    return app
+
+
+def conversations(chats: int) -> list[list[dict]]:
+  recorded = json.loads(RECORDED.read_text())
+  result = []
+  for c in range(chats):
+    chat_id = 700000 + c
+    updates = []
+    for i, item in enumerate(recorded):
+      update = copy.deepcopy(item)
+      update["update_id"] = c * len(recorded) + i + 1
+      update["message"]["chat"]["id"] = chat_id
+      update["message"]["from"]["id"] = chat_id
+      updates.append(update)
+    result.append(updates)
+  return result
+
+
+async def serve(app: web.Application) -> tuple[web.AppRunner, str]:
+  runner = web.AppRunner(app, access_log=None)
+  await runner.setup()
+  site = web.TCPSite(runner, HOST, 0)
+  await site.start()
+  port = site._server.sockets[0].getsockname()[1]
+  return runner, f"http://{HOST}:{port}"
+
+
+async def replay(workers: int, chats: int, senders: int, latency: float, queue_size: int):
+  stub = Stub(latency)
+  stub_runner, stub_url = await serve(stub.app())
+  bot_module.api.base_url = stub_url
+  bot_module.api.today_ttl = 0
+  bot_module.bot.session.api = TelegramAPIServer.from_base(stub_url)
+  bot_module.BOT_WORKERS = workers
+  bot_module.BOT_QUEUE_SIZE = queue_size
+  webhook_runner, webhook_url = await serve(bot_module.webhook_app())
+
+  convs = conversations(chats)
+  stub.expected = sum(len(c) for c in convs)
+  url = webhook_url + bot_module.BOT_WEBHOOK_PATH
+  rejected = 0
+
+  async def sender(batch: list[list[dict]]):
+    nonlocal rejected
+    async with aiohttp.ClientSession() as session:
+      for updates in batch:
+        for update in updates:
+          for _ in range(2):  # повторная доставка того же update_id
+            while True:
+              async with session.post(url, json=update) as r:
+                if r.status == 200:
+                  break
+              # очередь полна: Telegram повторил бы доставку позже
+              rejected += 1
+              await asyncio.sleep(0.05)
+
+  started = time.perf_counter()
+  await asyncio.gather(*(sender(convs[i::senders]) for i in range(senders)))
+  await asyncio.wait_for(stub.all_sent.wait(), timeout=300)
+  elapsed = time.perf_counter() - started
+  await asyncio.sleep(latency * 2)
+
+  ordered = all(stub.done[700000 + c] == [11, 12, 13] for c in range(chats))
+  print(f"workers={workers:<3} updates={stub.expected:>6} rps={stub.expected / elapsed:>8.0f} "
+        f"answers={stub.sent} rejected={rejected} per_chat_order={'ok' if ordered else 'BROKEN'}")
+
+  await webhook_runner.cleanup()
+  await stub_runner.cleanup()
+  bot_module.bot.session = type(bot_module.bot.session)()
+
+
+async def main(args):
+  for workers in args.workers:
+    await replay(workers, args.chats, args.senders, args.latency, args.queue_size)
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--chats", type=int, default=200)
+  parser.add_argument("--senders", type=int, default=40)
+  parser.add_argument("--workers", type=int, nargs="+", default=[1, 16])
+  parser.add_argument("--latency", type=float, default=0.02)
+  parser.add_argument("--queue-size", type=int, default=1000)
+  args = parser.parse_args()
+  asyncio.run(main(args))
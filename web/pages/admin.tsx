@@ -6,9 +6,13 @@ const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 export default function Admin() {
   const [token, setToken] = useState<string | null>(null);
   const [users, setUsers] = useState<any[]>([]);
+  const [usersCursor, setUsersCursor] = useState<string | null>(null);
+  // запрос, по которому выдан usersCursor: следующие страницы берутся по нему, а не по полю поиска
+  const [usersQuery, setUsersQuery] = useState("");
+  const [search, setSearch] = useState("");
   const [selectedUserId, setSelectedUserId] = useState<number | null>(null);
   const [tasks, setTasks] = useState<any[]>([]);
-  const [exercises, setExercises] = useState<string[]>([]);
+  const [exercises, setExercises] = useState<{ id: number; text: string }[]>([]);
   const [newExercise, setNewExercise] = useState("");
   const [msg, setMsg] = useState("");
 
@@ -19,13 +23,20 @@ export default function Admin() {
     if (t) setToken(t);
   }, []);
 
-  const loadUsers = async () => {
+  const loadUsers = async (cursor: string | null = null) => {
     try {
-      const { data } = await axios.get(`${API_URL}/api/admin/users`, {
+      const query = cursor ? usersQuery : search;
+      const params: Record<string, string> = {};
+      if (query) params.q = query;
+      if (cursor) params.cursor = cursor;
+      const { data, headers } = await axios.get(`${API_URL}/api/admin/users`, {
+        params,
         withCredentials: true,
         headers: authHeaders,
       });
-      setUsers(data);
+      setUsers((prev) => (cursor ? [...prev, ...data] : data));
+      setUsersQuery(query);
+      setUsersCursor(headers["x-next-cursor"] || null);
     } catch (e: any) {
       setMsg("Ошибка загрузки пользователей");
     }
@@ -61,10 +72,10 @@ export default function Admin() {
     }
   };
 
-  const removeExercise = async (index: number) => {
+  const removeExercise = async (exerciseId: number) => {
     try {
       const { data } = await axios.delete(
-        `${API_URL}/api/admin/exercises/${index}`,
+        `${API_URL}/api/admin/exercises/${exerciseId}`,
         {
           withCredentials: true,
           headers: authHeaders,
@@ -124,14 +135,22 @@ export default function Admin() {
         <button onClick={addExercise}>Добавить</button>
       </div>
       <ol>
-        {exercises.map((e, i) => (
-          <li key={i}>
-            {e} <button onClick={() => removeExercise(i)}>Удалить</button>
+        {exercises.map((e) => (
+          <li key={e.id}>
+            {e.text} <button onClick={() => removeExercise(e.id)}>Удалить</button>
           </li>
         ))}
       </ol>
 
       <h2>Пользователи</h2>
+      <div style={{ display: "flex", gap: 8 }}>
+        <input
+          placeholder="Имя или e-mail"
+          value={search}
+          onChange={(e) => setSearch(e.target.value)}
+        />
+        <button onClick={() => loadUsers()}>Найти</button>
+      </div>
       <div>
         {users.map((u) => (
           <div
@@ -139,7 +158,7 @@ export default function Admin() {
             style={{ borderBottom: "1px solid #eee", padding: 8 }}
           >
             <div>
-              {u.name} ({u.email}) — роль: {u.role}
+              {u.name} ({u.email}) — роль: {u.role}, заданий: {u.task_count}, выполнено: {u.completed_count}
               <button
                 style={{ marginLeft: 8 }}
                 onClick={() => {
@@ -158,6 +177,7 @@ export default function Admin() {
             </div>
           </div>
         ))}
+        {usersCursor && <button onClick={() => loadUsers(usersCursor)}>Показать ещё</button>}
       </div>
 
       {selectedUserId && (
@@ -6,6 +6,7 @@ const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 export default function History() {
   const [token, setToken] = useState<string | null>(null);
   const [items, setItems] = useState<any[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [msg, setMsg] = useState("");
 
   useEffect(() => {
@@ -13,15 +14,23 @@ export default function History() {
     if (t) setToken(t);
   }, []);
 
-  useEffect(() => {
-    if (!token) return;
+  const loadPage = (cursor: string | null) => {
     axios
       .get(`${API_URL}/api/tasks`, {
+        params: cursor ? { cursor } : {},
         withCredentials: true,
         headers: token ? { Authorization: `Bearer ${token}` } : {},
       })
-      .then((r) => setItems(r.data))
+      .then((r) => {
+        setItems((prev) => (cursor ? [...prev, ...r.data] : r.data));
+        setNextCursor(r.headers["x-next-cursor"] || null);
+      })
       .catch(() => setMsg("Ошибка загрузки"));
+  };
+
+  useEffect(() => {
+    if (!token) return;
+    loadPage(null);
   }, [token]);
 
   return (
@@ -36,6 +45,7 @@ export default function History() {
           <div>Статус: {t.status}</div>
         </div>
       ))}
+      {nextCursor && <button onClick={() => loadPage(nextCursor)}>Показать ещё</button>}
     </div>
   );
 }